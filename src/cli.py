@@ -0,0 +1,197 @@
+"""Command-line entry point: `python -m src <command>` (the `keto` CLI).
+
+Each command imports its implementation inside its handler, so `--help` starts
+instantly and the CSV commands never load torch, sentence-transformers or the
+provider SDKs.
+"""
+import argparse
+import sys
+
+BLOCKS_PATH = "src/data/dataset_raw/allBlocks.csv"
+
+def _scan(args):
+    from src.utils.analyze_blocks_line_by_line import main
+    main(args.blocks, args.output)
+
+def _score(args):
+    from src.evaluation.process_blocks import process_blocks_in_chunks
+    from src.utils.pipeline_profiler import profiler_from_args
+    process_blocks_in_chunks(args.chunk_size, (args.min_score, args.max_score), args.workers,
+                             blocks_path=args.blocks, output_path=args.output,
+                             profiler=profiler_from_args(args))
+
+def _sample(args):
+    from src.utils.select_representative_projects import main
+    main(args.blocks, args.analysis, args.output, args.num_projects)
+
+def _build_dataset(args):
+    from src.evaluation.build_evaluation_dataset import (DEFAULT_SPLITS, OUTPUT_PATH, PROJECTS_PATH,
+                                                         build_evaluation_dataset, parse_splits)
+    splits = None
+    if args.split == "default":
+        splits = DEFAULT_SPLITS
+    elif args.split:
+        splits = parse_splits(args.split)
+    output = args.output or ("src/data/evaluation_splits" if splits else OUTPUT_PATH)
+    build_evaluation_dataset(output, args.blocks, args.projects or PROJECTS_PATH, args.num_projects,
+                             splits, args.chunk_size)
+
+def _finetune(args):
+    from src.utils.fine_tuning_improvements import create_improved_fine_tuning_job
+    create_improved_fine_tuning_job()
+
+def _evaluate(args):
+    if args.runner == "semantic":
+        from src.evaluation.semantic_evaluation import main
+        main(stream=args.stream)
+    elif args.runner == "matrix":
+        import pandas as pd
+        from src.evaluation.evaluation_matrix import load_config, run_matrix
+        summary = run_matrix(load_config(args.config))
+        with pd.option_context("display.max_columns", None, "display.width", 200):
+            print(summary.to_string(index=False))
+    elif args.runner == "adaptive":
+        from src.evaluation.adaptive_evaluation import print_summary, run_from_args
+        from src.evaluation.evaluation_matrix import load_config
+        print_summary(run_from_args(load_config(args.config), args))
+    elif args.runner == "multi-provider":
+        from src.evaluation.multi_provider_evaluation import main
+        main(stream=args.stream)
+    else:
+        from src.evaluation.run_model_evaluation import main
+        main()
+
+def _mock_server(args):
+    from src.evaluation.mock_server import serve
+    serve(args)
+
+def _warehouse(args):
+    import pandas as pd
+    from src.evaluation.results_warehouse import DEFAULT_PATTERNS, ResultsWarehouse
+    with ResultsWarehouse(args.db) as warehouse, pd.option_context("display.max_columns", None, "display.width", 200):
+        if args.action == "ingest":
+            print(f"Ingested {len(warehouse.ingest(args.patterns or DEFAULT_PATTERNS))} new run(s)")
+        elif args.action == "watch":
+            warehouse.watch(args.patterns or DEFAULT_PATTERNS, args.interval)
+        elif args.action == "runs":
+            print(warehouse.runs().to_string(index=False))
+        elif not args.metric:
+            raise SystemExit(f"warehouse {args.action} needs --metric")
+        elif args.action == "compare":
+            print(warehouse.compare(args.metric, args.model).to_string(float_format=lambda v: f"{v:.4f}"))
+        elif args.model:
+            print(warehouse.prompt_regressions(args.metric, args.model[0], args.threshold).to_string(index=False))
+        else:
+            print(warehouse.regressions(args.metric, args.threshold).to_string(index=False))
+
+def _report(args):
+    if args.kind == "blocks":
+        from src.utils.report_generator import block_report_sections, generate_report, model_comparison_section
+        output = args.output or "block_analysis_results.md"
+        sections = block_report_sections(args.input or "block_analysis_results.json", args.compare)
+        sections += [model_comparison_section(metric, args.warehouse) for metric in args.metric]
+        rendered = generate_report(output, sections, "Block Analysis Results")
+        print(f"Report saved to {output} ({rendered} of {len(sections)} sections regenerated)")
+    else:
+        import pandas as pd
+        from src.utils.call_metrics import CALL_METRICS_PATH, summarize_call_metrics
+        summary = summarize_call_metrics(args.input or CALL_METRICS_PATH)
+        with pd.option_context("display.max_columns", None, "display.width", 200):
+            print(summary.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        if args.output:
+            summary.to_csv(args.output, index=False)
+            print(f"Summary saved to {args.output}")
+
+def build_parser():
+    from src.evaluation.adaptive_evaluation import add_adaptive_arguments
+    from src.utils.pipeline_profiler import add_profiler_arguments
+    parser = argparse.ArgumentParser(prog="keto", description="Scratch dataset analysis, fine-tuning and evaluation.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    scan = commands.add_parser("scan", help="Count block types and project structures in allBlocks.csv")
+    scan.add_argument("--blocks", default=BLOCKS_PATH)
+    scan.add_argument("--output", default="block_analysis_results.json")
+    scan.set_defaults(handler=_scan)
+
+    score = commands.add_parser("score", help="Score projects and keep the medium-complexity band")
+    score.add_argument("--blocks", default=BLOCKS_PATH)
+    score.add_argument("--output", default="src/data/medium_complexity_projects.csv")
+    score.add_argument("--chunk-size", type=int, default=10000)
+    score.add_argument("--min-score", type=float, default=100)
+    score.add_argument("--max-score", type=float, default=200)
+    score.add_argument("--workers", type=int, default=None)
+    add_profiler_arguments(score)
+    score.set_defaults(handler=_score)
+
+    sample = commands.add_parser("sample", help="Select representative projects from a scan")
+    sample.add_argument("--blocks", default=BLOCKS_PATH)
+    sample.add_argument("--analysis", default="block_analysis_results.json")
+    sample.add_argument("--output", default="representative_projects.json")
+    sample.add_argument("--num-projects", type=int, default=1000)
+    sample.set_defaults(handler=_sample)
+
+    build = commands.add_parser("build-dataset", help="Build the evaluation dataset in one scan")
+    build.add_argument("--blocks", default=BLOCKS_PATH)
+    build.add_argument("--projects", default=None, help="Scored projects CSV (default: the score output)")
+    build.add_argument("--output", default=None)
+    build.add_argument("--num-projects", type=int, default=None)
+    build.add_argument("--split", nargs="?", const="default", default=None,
+                       help="Split deterministically (default 80/10/10), e.g. train=0.8,validation=0.1,test=0.1")
+    build.add_argument("--chunk-size", type=int, default=100000)
+    build.set_defaults(handler=_build_dataset)
+
+    finetune = commands.add_parser("finetune", help="Upload standardized_training_data.jsonl and start fine-tuning jobs")
+    finetune.set_defaults(handler=_finetune)
+
+    evaluate = commands.add_parser("evaluate", help="Evaluate models against the evaluation data")
+    evaluate.add_argument("runner", nargs="?", default="semantic", choices=["semantic", "multi-provider", "models", "matrix", "adaptive"])
+    evaluate.add_argument("--stream", action="store_true", help="Stream completions; format-prompted runs stop at the first format error")
+    evaluate.add_argument("--config", default="src/evaluation/matrix_config.example.json",
+                          help="Models x prompts x datasets config for the matrix and adaptive runners")
+    adaptive = evaluate.add_argument_group("adaptive runner")
+    add_adaptive_arguments(adaptive)
+    evaluate.set_defaults(handler=_evaluate)
+
+    mock = commands.add_parser("mock-server", help="Serve mock OpenAI/Anthropic endpoints for offline evaluation")
+    mock.add_argument("--host", default="127.0.0.1")
+    mock.add_argument("--port", type=int, default=8765)
+    mock.add_argument("--dataset", action="append", default=[], help="Prompt/completion JSONL to answer from (repeatable)")
+    mock.add_argument("--latency", default=None, help="0.3, uniform:LOW,HIGH, normal:MEAN,SD or lognormal:MEDIAN,SIGMA")
+    mock.add_argument("--tokens-per-second", type=float, default=None)
+    mock.add_argument("--error-rate", type=float, default=0.0)
+    mock.add_argument("--rate-limit-rate", type=float, default=0.0)
+    mock.add_argument("--retry-after", type=float, default=1.0)
+    mock.add_argument("--rpm", type=int, default=None)
+    mock.add_argument("--corrupt-rate", type=float, default=0.0)
+    mock.add_argument("--seed", type=int, default=0)
+    mock.set_defaults(handler=_mock_server)
+
+    warehouse = commands.add_parser("warehouse", help="Collect evaluation results into SQLite and compare runs")
+    warehouse.add_argument("action", choices=["ingest", "watch", "runs", "compare", "regressions"])
+    warehouse.add_argument("patterns", nargs="*", help="Result files to ingest (default: all known locations)")
+    warehouse.add_argument("--db", default="results_warehouse.sqlite")
+    warehouse.add_argument("--metric", default=None)
+    warehouse.add_argument("--model", action="append", default=None)
+    warehouse.add_argument("--threshold", type=float, default=0.0)
+    warehouse.add_argument("--interval", type=float, default=10.0)
+    warehouse.set_defaults(handler=_warehouse)
+
+    report = commands.add_parser("report", help="Render analysis results or summarize call metrics")
+    report.add_argument("kind", nargs="?", default="blocks", choices=["blocks", "calls"])
+    report.add_argument("--input", default=None)
+    report.add_argument("--output", default=None)
+    report.add_argument("--compare", nargs="*", default=[], help="Blocks: older analyses to compare, oldest first")
+    report.add_argument("--metric", action="append", default=[],
+                        help="Blocks: add a model comparison table for this metric from the results warehouse")
+    report.add_argument("--warehouse", default=None, help="Results warehouse database for --metric")
+    report.set_defaults(handler=_report)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""Adaptive evaluation: sample examples in growing looks until the metrics are tight enough.
+
+Every model sees the same shuffled examples. The sample grows geometrically
+from `min_examples` to the full set over at most `max_looks` looks, and at each
+look bootstrap confidence intervals are computed for each model's metrics and
+for the paired difference between models. Sampling stops when every interval
+is narrower than `ci_width`, or when every model pair is decided (the
+difference interval excludes zero or is itself narrower than `ci_width`), or
+when the examples run out.
+
+Checking a 95% interval at every look is optional stopping: two identical
+models would be declared different far more often than 5% of the time. The
+error rate is spent across the planned looks, either evenly (Bonferroni, the
+conservative form of a Pocock design) or with the O'Brien-Fleming spending
+function, which keeps early looks strict and most of the error for the last.
+Each look's interval uses the level it was given, so keeping the number of
+looks small keeps the intervals, and the bootstrap, affordable. A zero-width
+interval, e.g. every example scoring 0, says nothing about the spread and
+never stops the run.
+"""
+import itertools
+import math
+import random
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_METRICS = ("semantic_similarity", "format_ok")
+
+SPENDING = ("bonferroni", "obrien-fleming")
+
+# Resamples per interval: enough for about ten draws in each tail, within these bounds
+MIN_RESAMPLES = 2000
+MAX_RESAMPLES = 10000
+
+def _t_quantile(z: float, df: int) -> float:
+    """Student t quantile matching normal quantile `z` (Cornish-Fisher expansion)."""
+    g1 = (z ** 3 + z) / 4
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    return z + g1 / df + g2 / df ** 2 + g3 / df ** 3
+
+def expanded_tail(confidence: float, n: int) -> float:
+    """Tail probability for an expanded percentile interval (Hesterberg).
+
+    The plain percentile bootstrap is too narrow for small samples, most of all
+    in the far tails the per-look levels use; widening it to the t quantile with
+    n - 1 degrees of freedom and the sqrt(n / (n - 1)) variance correction keeps
+    its coverage.
+    """
+    alpha = 1 - confidence
+    if n < 2 or alpha <= 0:
+        return alpha / 2
+    normal = NormalDist()
+    t = _t_quantile(normal.inv_cdf(1 - alpha / 2), n - 1)
+    return normal.cdf(-math.sqrt(n / (n - 1)) * t)
+
+def bootstrap_ci(values: Sequence[float], n_resamples: Optional[int] = None, confidence: float = 0.95,
+                 seed: int = 0) -> Tuple[float, float, float]:
+    """Return (mean, low, high) of an expanded percentile bootstrap interval for the mean.
+
+    By default enough resamples are drawn to put about ten in each tail, so the
+    narrower tails of a per-look interval are not a single draw, up to
+    MAX_RESAMPLES.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return float('nan'), float('nan'), float('nan')
+    tail = expanded_tail(confidence, len(values))
+    if n_resamples is None:
+        n_resamples = min(MAX_RESAMPLES, max(MIN_RESAMPLES, math.ceil(10 / max(tail, 1e-9))))
+    rng = np.random.default_rng(seed)
+    step = max(1, 2_000_000 // len(values))  # bound the index matrix to ~16 MB per draw
+    samples = np.concatenate([
+        values[rng.integers(0, len(values), size=(min(step, n_resamples - start), len(values)))].mean(axis=1)
+        for start in range(0, n_resamples, step)])
+    low, high = np.percentile(samples, [tail * 100, 100 - tail * 100])
+    return float(values.mean()), float(low), float(high)
+
+def paired_difference_ci(a: Sequence[float], b: Sequence[float], **kwargs) -> Tuple[float, float, float]:
+    """Bootstrap interval for mean(a - b) over examples both models answered."""
+    return bootstrap_ci(np.asarray(a, dtype=float) - np.asarray(b, dtype=float), **kwargs)
+
+def look_schedule(n_examples: int, min_examples: int, batch_size: int = 10, max_looks: int = 6) -> List[int]:
+    """Sample sizes of the looks: geometric from `min_examples` to `n_examples`, in multiples of `batch_size`."""
+    if n_examples <= 0:
+        return []
+    first = min(n_examples, max(min_examples, batch_size, 1))
+    if max_looks <= 1 or first >= n_examples:
+        return [n_examples]
+    growth = (n_examples / first) ** (1 / (max_looks - 1))
+    sizes = []
+    for look in range(max_looks):
+        size = min(n_examples, math.ceil(first * growth ** look / batch_size) * batch_size)
+        if not sizes or size > sizes[-1]:
+            sizes.append(size)
+    if sizes[-1] != n_examples:
+        sizes.append(n_examples)
+    return sizes
+
+def look_confidences(sizes: Sequence[int], confidence: float = 0.95, spending: str = "bonferroni") -> List[float]:
+    """Confidence level of each look, so the error over all looks is at most 1 - `confidence`.
+
+    Each look gets the error its spending function allots to it; by the union
+    bound the chance that any look errs stays within the total.
+    """
+    alpha = 1 - confidence
+    if spending == "bonferroni":
+        return [1 - alpha / len(sizes)] * len(sizes)
+    if spending != "obrien-fleming":
+        raise ValueError(f"Unknown alpha spending '{spending}', expected one of {SPENDING}")
+    normal = NormalDist()
+    z = normal.inv_cdf(1 - alpha / 2)
+    spent = [2 - 2 * normal.cdf(z / math.sqrt(size / sizes[-1])) for size in sizes]
+    return [1 - (current - previous) for previous, current in zip([0.0] + spent[:-1], spent)]
+
+def _decided(low: float, high: float, ci_width: float) -> bool:
+    """An interval that excludes zero or is narrow enough, and is not degenerate."""
+    width = high - low
+    return width > 0 and (low > 0 or high < 0 or width <= ci_width)
+
+def _metric_values(rows: List[Optional[Dict[str, float]]], metric: str) -> np.ndarray:
+    return np.array([float(row[metric]) if row is not None else np.nan for row in rows])
+
+def run_adaptive(evaluators: Dict[str, Callable[[Dict[str, str]], Dict[str, float]]],
+                 examples: Sequence[Dict[str, str]],
+                 metrics: Sequence[str] = DEFAULT_METRICS,
+                 batch_size: int = 10, min_examples: int = 20, max_examples: Optional[int] = None,
+                 ci_width: float = 0.1, stop_on_difference: bool = True,
+                 concurrency: int = 8, seed: int = 0, confidence: float = 0.95,
+                 max_looks: int = 6, spending: str = "bonferroni") -> Dict[str, object]:
+    """Evaluate `evaluators` (name -> fn(example) -> metrics) adaptively.
+
+    A failed evaluation counts as missing for that example; differences use only
+    examples that both models answered. The first metric in `metrics` decides
+    model-vs-model separation. `confidence` is the overall level; each look,
+    and the summary returned from the look that stopped the run, uses the level
+    `spending` gives that look.
+    """
+    order = list(examples)
+    random.Random(seed).shuffle(order)
+    limit = min(len(order), max_examples or len(order))
+    sizes = look_schedule(limit, min_examples, batch_size, max_looks)
+    levels = look_confidences(sizes, confidence, spending) if sizes else []
+    rows: Dict[str, List[Optional[Dict[str, float]]]] = {name: [] for name in evaluators}
+    history = []
+    stopped_because = "examples exhausted"
+    summary = summarize(rows, metrics, confidence, seed)
+    used, level = 0, confidence
+
+    def safe(fn, example):
+        try:
+            return fn(example)
+        except Exception as e:
+            print(f"Evaluation failed: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for size, level in zip(sizes, levels):
+            batch = order[used:size]
+            futures = {name: [executor.submit(safe, fn, example) for example in batch]
+                       for name, fn in evaluators.items()}
+            for name, batch_futures in futures.items():
+                rows[name].extend(future.result() for future in batch_futures)
+            used = size
+
+            summary = summarize(rows, metrics, level, seed)
+            history.append({"examples": used, "confidence": level,
+                            **{name: {m: summary["models"][name][m][1:] for m in metrics} for name in evaluators}})
+            widths = [high - low for model in summary["models"].values() for _, low, high in model.values()]
+            print(f"{used} examples: widest CI {max(widths, default=float('nan')):.3f} at {level:.2%}")
+            if widths and all(0 < width <= ci_width for width in widths):
+                stopped_because = f"all CIs narrower than {ci_width}"
+                break
+            differences = summary["differences"]
+            if stop_on_difference and differences and all(
+                    _decided(low, high, ci_width) for _, low, high in differences.values()):
+                stopped_because = "every model pair decided"
+                break
+
+    summary.update({"examples_used": used, "stopped_because": stopped_because, "history": history,
+                    "confidence": confidence, "spending": spending, "looks": sizes, "look_confidence": level})
+    return summary
+
+def summarize(rows: Dict[str, List[Optional[Dict[str, float]]]], metrics: Sequence[str],
+              confidence: float = 0.95, seed: int = 0) -> Dict[str, object]:
+    """Bootstrap CIs per model and metric, and paired differences on the first metric."""
+    models = {}
+    for name, model_rows in rows.items():
+        models[name] = {}
+        for metric in metrics:
+            values = _metric_values(model_rows, metric)
+            models[name][metric] = bootstrap_ci(values[~np.isnan(values)], confidence=confidence, seed=seed)
+    differences = {}
+    for a, b in itertools.combinations(rows, 2):
+        values_a, values_b = _metric_values(rows[a], metrics[0]), _metric_values(rows[b], metrics[0])
+        both = ~np.isnan(values_a) & ~np.isnan(values_b)
+        differences[f"{a} - {b}"] = paired_difference_ci(values_a[both], values_b[both],
+                                                         confidence=confidence, seed=seed)
+    return {"models": models, "differences": differences}
+
+def matrix_evaluator(model: Dict[str, str], prompt: str, sampling: Optional[Dict[str, object]] = None,
+                     limiter=None, retry_policy=None):
+    """Build an evaluator for one model entry of an evaluation-matrix config."""
+    from src.evaluation.evaluation_matrix import DEFAULT_SAMPLING, request_completion, score_response
+    from src.utils.retry_policy import DEFAULT_RETRY_POLICY
+
+    retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+
+    sampling = {**DEFAULT_SAMPLING, **(sampling or {})}
+    model_id = model.get("model", model["name"])
+
+    def request(example):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return request_completion(model["provider"], model_id, prompt, example["prompt"], sampling)
+        finally:
+            if limiter is not None:
+                limiter.release()
+
+    def evaluate(example):
+        response = retry_policy.call(request, example)
+        scores = score_response(response, example["completion"])
+        scores["format_ok"] = float(scores["format_ok"])
+        return scores
+
+    return evaluate
+
+def add_adaptive_arguments(parser) -> None:
+    """Add the adaptive-run options to an argparse parser."""
+    parser.add_argument("--metric", action="append", default=None,
+                        help="Metric to track (repeatable; the first decides model comparisons)")
+    parser.add_argument("--ci-width", type=float, default=0.1,
+                        help="Stop once every bootstrap CI is this narrow")
+    parser.add_argument("--batch-size", type=int, default=10, help="Look sizes are multiples of this")
+    parser.add_argument("--min-examples", type=int, default=20, help="Sample size of the first look")
+    parser.add_argument("--max-examples", type=int, default=None)
+    parser.add_argument("--max-looks", type=int, default=6, help="Looks spread geometrically up to the sample size")
+    parser.add_argument("--spending", default="bonferroni", choices=SPENDING,
+                        help="How the 5%% error rate is split across the looks")
+    parser.add_argument("--no-early-difference", action="store_true",
+                        help="Only stop on CI width, not when models are separated")
+
+def run_from_args(config: Dict[str, object], args) -> Dict[str, object]:
+    """Run the config's models on its first prompt and dataset, with per-provider rate limits."""
+    from src.evaluation.evaluation_matrix import build_limiters, load_dataset
+
+    limiters = build_limiters(config)
+    sampling = (config.get("sampling") or [{}])[0]
+    evaluators = {model["name"]: matrix_evaluator(model, config["prompts"][0], sampling,
+                                                  limiters[model["provider"]])
+                  for model in config["models"]}
+    dataset = {**config["datasets"][0], "limit": None}
+    return run_adaptive(evaluators, load_dataset(dataset), args.metric or DEFAULT_METRICS,
+                        batch_size=args.batch_size, min_examples=args.min_examples,
+                        max_examples=args.max_examples, ci_width=args.ci_width,
+                        stop_on_difference=not args.no_early_difference,
+                        concurrency=config.get("concurrency", 8), max_looks=args.max_looks,
+                        spending=args.spending)
+
+def print_summary(summary: Dict[str, object]) -> None:
+    print(f"\nStopped after {summary['examples_used']} examples: {summary['stopped_because']}")
+    if "look_confidence" in summary:
+        print(f"Intervals at {summary['look_confidence']:.2%} ({summary['confidence']:.0%} overall, "
+              f"{summary['spending']} over looks at {summary['looks']} examples)")
+    for name, model_metrics in summary["models"].items():
+        cells = ", ".join(f"{metric} {mean:.3f} [{low:.3f}, {high:.3f}]"
+                          for metric, (mean, low, high) in model_metrics.items())
+        print(f"{name}: {cells}")
+    for pair, (mean, low, high) in summary["differences"].items():
+        print(f"{pair}: {mean:+.3f} [{low:+.3f}, {high:+.3f}]")
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from src.evaluation.evaluation_matrix import load_config
+
+    parser = argparse.ArgumentParser(description="Evaluate models until their metrics are statistically tight.")
+    parser.add_argument("config", help="Evaluation-matrix config; its models, first prompt and first dataset are used")
+    add_adaptive_arguments(parser)
+    parser.add_argument("--output", default=None, help="Save the summary as JSON")
+    args = parser.parse_args()
+
+    summary = run_from_args(load_config(args.config), args)
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Summary saved to {args.output}")
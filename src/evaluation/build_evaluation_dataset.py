@@ -0,0 +1,211 @@
+import bisect
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+from tqdm import tqdm
+
+from src.evaluation.evaluate_projects_v2 import prepare_project_data
+from src.utils.scratch_csv import iter_scratch_csv, new_read_stats, report_read_stats
+
+BLOCKS_PATH = "src/data/dataset_raw/allBlocks.csv"
+PROJECTS_PATH = "src/data/medium_complexity_projects.csv"
+OUTPUT_PATH = "src/data/evaluation_data.jsonl"
+
+DEFAULT_SPLITS = (("train", 0.8), ("validation", 0.1), ("test", 0.1))
+
+def load_project_ids(projects_path=PROJECTS_PATH, num_projects: Optional[int] = None) -> Set[str]:
+    """Load project ids from medium_complexity_projects.csv, highest score first."""
+    projects_df = pd.read_csv(projects_path, dtype={"ProjectId": str})
+    projects_df = projects_df.sort_values("ComplexityScore", ascending=False)
+    if num_projects is not None:
+        projects_df = projects_df.head(num_projects)
+    return set(projects_df["ProjectId"])
+
+def parse_splits(spec: str) -> Tuple[Tuple[str, float], ...]:
+    """Parse 'train=0.8,validation=0.1,test=0.1' into normalized split weights."""
+    splits = []
+    for part in spec.split(","):
+        name, weight = part.split("=")
+        splits.append((name.strip(), float(weight)))
+    total = sum(weight for _, weight in splits)
+    return tuple((name, weight / total) for name, weight in splits)
+
+def assign_split(project_id: str, splits) -> str:
+    """Deterministically assign a project to a split by hashing its id."""
+    digest = hashlib.sha1(str(project_id).encode("utf-8")).digest()
+    position = int.from_bytes(digest[:8], "big") / 2 ** 64
+    cumulative = 0.0
+    for name, weight in splits:
+        cumulative += weight
+        if position < cumulative:
+            return name
+    return splits[-1][0]
+
+class _SplitWriter:
+    """Appends JSONL records to one file, or to one file per split."""
+
+    def __init__(self, output_path, splits=None):
+        self.splits = splits
+        self.counts: Dict[str, int] = {}
+        self.paths: Dict[str, Path] = {}
+        self.files = {}
+        # Split and line of each project's record, so a record can be withdrawn
+        self.lines: Dict[str, Tuple[str, int]] = {}
+        output_path = Path(output_path)
+        if splits:
+            output_path.mkdir(parents=True, exist_ok=True)
+            for name, _ in splits:
+                self.paths[name] = output_path / f"{name}.jsonl"
+        else:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            self.paths["all"] = output_path
+        for name, path in self.paths.items():
+            self.files[name] = open(path, "w")
+            self.counts[name] = 0
+
+    def write(self, project_id: str, record: Dict[str, object]) -> None:
+        name = assign_split(project_id, self.splits) if self.splits else "all"
+        self.files[name].write(json.dumps(record) + "\n")
+        self.lines[project_id] = (name, self.counts[name])
+        self.counts[name] += 1
+
+    def withdraw(self, project_ids: Set[str]) -> None:
+        """Remove the records already written for `project_ids`."""
+        dropped: Dict[str, Set[int]] = {}
+        for pid in project_ids:
+            if pid in self.lines:
+                name, line = self.lines.pop(pid)
+                dropped.setdefault(name, set()).add(line)
+        for name, lines in dropped.items():
+            self.files[name].close()
+            path = self.paths[name]
+            kept = path.with_suffix(".tmp")
+            with open(path) as source, open(kept, "w") as target:
+                for number, record in enumerate(source):
+                    if number not in lines:
+                        target.write(record)
+            os.replace(kept, path)
+            self.files[name] = open(path, "a")
+            self.counts[name] -= len(lines)
+            # Later records moved up by the number of removed lines before them
+            removed = sorted(lines)
+            for pid, (split, line) in self.lines.items():
+                if split == name:
+                    self.lines[pid] = (split, line - bisect.bisect_left(removed, line))
+
+    def close(self) -> None:
+        for handle in self.files.values():
+            handle.close()
+
+def _collect_rows(blocks_path, project_ids: Set[str], chunk_size: int) -> Dict[str, List[Dict[str, object]]]:
+    """All rows of `project_ids`, wherever they appear in the file."""
+    rows: Dict[str, List[Dict[str, object]]] = {}
+    for chunk in iter_scratch_csv(blocks_path, kind="allBlocks_linked", chunk_size=chunk_size):
+        matched = chunk[chunk["ProjectId"].isin(project_ids)]
+        for pid, project_chunk in matched.groupby("ProjectId", sort=False, observed=True):
+            rows.setdefault(pid, []).extend(project_chunk.to_dict("records"))
+    return rows
+
+def build_evaluation_dataset(output_path=OUTPUT_PATH, blocks_path=BLOCKS_PATH,
+                             projects_path=PROJECTS_PATH, num_projects: Optional[int] = None,
+                             splits=None, chunk_size: int = 100000) -> Dict[str, int]:
+    """Build evaluation records for the selected projects in a single scan.
+
+    allBlocks.csv is grouped by project, so a project's record is written as soon
+    as a chunk arrives without any of its rows. Projects whose rows turn up again
+    later have their records withdrawn and rebuilt from a second, pid-keyed pass.
+    With `splits`, `output_path` is a directory receiving one JSONL file per split.
+    Returns records written per split.
+    """
+    project_ids = load_project_ids(projects_path, num_projects)
+    print(f"Building evaluation data for {len(project_ids):,} projects...")
+
+    writer = _SplitWriter(output_path, splits)
+    buffers: Dict[str, List[Dict[str, object]]] = {}
+    written: Set[str] = set()
+    failed: Set[str] = set()
+    reappeared: Set[str] = set()
+    stats = new_read_stats(blocks_path)
+
+    def flush(pid, blocks):
+        try:
+            project_data = prepare_project_data(pid, blocks)
+        except Exception as e:
+            print(f"\nError processing project {pid}: {str(e)}")
+            project_data = None
+        if project_data:
+            writer.write(pid, project_data)
+            written.add(pid)
+        else:
+            failed.add(pid)
+
+    try:
+        progress = tqdm(total=os.path.getsize(blocks_path), unit="B", unit_scale=True, desc="Reading blocks")
+        for chunk in iter_scratch_csv(blocks_path, kind="allBlocks_linked", chunk_size=chunk_size, stats=stats):
+            progress.update(stats["bytes_read"] - progress.n)
+            matched = chunk[chunk["ProjectId"].isin(project_ids)]
+            chunk_pids = set()
+            for pid, project_chunk in matched.groupby("ProjectId", sort=False, observed=True):
+                if pid in written or pid in failed:
+                    reappeared.add(pid)
+                    continue
+                chunk_pids.add(pid)
+                buffers.setdefault(pid, []).extend(project_chunk.to_dict("records"))
+            for pid in [pid for pid in buffers if pid not in chunk_pids]:
+                flush(pid, buffers.pop(pid))
+        for pid in list(buffers):
+            flush(pid, buffers.pop(pid))
+        progress.close()
+
+        if reappeared:
+            print(f"{len(reappeared):,} projects had rows after their record was written; rebuilding them...")
+            writer.withdraw(reappeared)
+            written -= reappeared
+            failed -= reappeared
+            for pid, blocks in _collect_rows(blocks_path, reappeared, chunk_size).items():
+                flush(pid, blocks)
+    finally:
+        writer.close()
+
+    report_read_stats(stats)
+    missing = len(project_ids) - len(written) - len(failed)
+    print(f"Wrote {len(written):,} projects ({', '.join(f'{k}: {v:,}' for k, v in writer.counts.items())})")
+    if missing:
+        print(f"{missing:,} selected projects had no rows in {blocks_path}")
+    if failed:
+        print(f"{len(failed):,} projects could not be prepared")
+    return writer.counts
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the evaluation dataset from medium_complexity_projects.csv.")
+    parser.add_argument("--output", default=None,
+                        help=f"Output JSONL file, or directory when splitting (default: {OUTPUT_PATH})")
+    parser.add_argument("--blocks", default=BLOCKS_PATH)
+    parser.add_argument("--projects", default=PROJECTS_PATH)
+    parser.add_argument("--num-projects", type=int, default=None, help="Limit to the top N projects by score")
+    parser.add_argument("--split", nargs="?", const="default", default=None,
+                        help="Split deterministically (default 80/10/10), e.g. train=0.8,validation=0.1,test=0.1")
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    args = parser.parse_args()
+
+    splits = None
+    if args.split == "default":
+        splits = DEFAULT_SPLITS
+    elif args.split:
+        splits = parse_splits(args.split)
+    output = args.output or ("src/data/evaluation_splits" if splits else OUTPUT_PATH)
+    try:
+        build_evaluation_dataset(output, args.blocks, args.projects, args.num_projects,
+                                 splits, args.chunk_size)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,68 @@
+import os
+
+# Clients are created on first use so importing an evaluator stays cheap and
+# works without API keys; each distinct configuration is built once per process.
+# The SDKs' own retries are off: callers retry through src.utils.retry_policy,
+# which would otherwise multiply with them.
+_clients = {}
+
+# None means the SDK default endpoint
+DEFAULT_BASE_URLS = {
+    'openai': None,
+    'anthropic': None,
+    'deepseek': 'https://api.deepseek.com/v1',
+}
+
+def provider_base_url(provider):
+    """Endpoint for `provider`: <PROVIDER>_BASE_URL, else MODEL_BASE_URL, else the default.
+
+    MODEL_BASE_URL points every provider at one server, such as the local mock
+    in src/evaluation/mock_server.py; the Anthropic SDK adds /v1 itself.
+    """
+    explicit = os.environ.get(f'{provider.upper()}_BASE_URL')
+    if explicit:
+        return explicit
+    shared = os.environ.get('MODEL_BASE_URL')
+    if shared:
+        return shared.rstrip('/') + ('' if provider == 'anthropic' else '/v1')
+    return DEFAULT_BASE_URLS[provider]
+
+def _placeholder_key():
+    # The SDKs refuse to start without a key; a local server does not check it
+    return 'local' if os.environ.get('MODEL_BASE_URL') else None
+
+def get_openai_client(**kwargs):
+    """Shared OpenAI client using the OAI_key/OAI_organization_id variables when set."""
+    key = ('openai', tuple(sorted(kwargs.items())))
+    if key not in _clients:
+        from openai import OpenAI
+
+        options = {
+            'api_key': os.environ.get('OAI_key') or _placeholder_key(),
+            'organization': os.environ.get('OAI_organization_id') or None,
+            'base_url': provider_base_url('openai'),
+            'max_retries': 0,
+        }
+        options.update(kwargs)
+        _clients[key] = OpenAI(**options)
+    return _clients[key]
+
+def get_anthropic_client(**kwargs):
+    """Shared Anthropic client using the anthropic_api variable when set."""
+    key = ('anthropic', tuple(sorted(kwargs.items())))
+    if key not in _clients:
+        from anthropic import Anthropic
+
+        options = {
+            'api_key': os.environ.get('anthropic_api') or _placeholder_key(),
+            'base_url': provider_base_url('anthropic'),
+            'max_retries': 0,
+        }
+        options.update(kwargs)
+        _clients[key] = Anthropic(**options)
+    return _clients[key]
+
+def get_deepseek_client():
+    """Shared OpenAI-compatible client for DeepSeek, using the deepseek_api variable."""
+    return get_openai_client(api_key=os.environ.get('deepseek_api') or _placeholder_key(), organization=None,
+                             base_url=provider_base_url('deepseek'))
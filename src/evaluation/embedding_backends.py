@@ -0,0 +1,269 @@
+"""Sentence embeddings for semantic similarity, with a torch and an ONNX backend.
+
+Both backends produce the mean-pooled, L2-normalized all-MiniLM-L6-v2
+embeddings that sentence-transformers does:
+
+- "torch": sentence-transformers on PyTorch (the reference).
+- "onnx": an exported, int8-quantized copy of the same model run with
+  onnxruntime and the `tokenizers` library, tuned for CPU. Those two are in
+  requirements-onnx.txt; it needs no torch, transformers or
+  sentence-transformers (those are in requirements-torch.txt).
+
+  Export the model once, on a machine with both files installed:
+
+      python -m src.evaluation.embedding_backends export
+
+The ONNX backend sorts texts by token count and packs each batch up to
+`max_tokens_per_batch` padded tokens, so short texts run in large batches and
+long texts in small ones, with little padding. Intra-op threads default to the
+physical core count. `get_embedder()` picks the backend from the
+EMBEDDING_BACKEND variable (auto, torch or onnx; auto prefers an exported ONNX
+model and falls back to torch without one or without onnxruntime) and loads
+each backend once per process. The two backends score slightly differently,
+so `embedding_info()` names the active one for results metadata. `benchmark` compares the throughput of the backends and how closely
+their similarity scores agree.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+HF_MODEL_NAME = f'sentence-transformers/{MODEL_NAME}'
+ONNX_DIR = os.environ.get('EMBEDDING_ONNX_DIR', f'models/{MODEL_NAME}-onnx-int8')
+
+def physical_cores() -> int:
+    try:
+        import psutil
+        return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    except ImportError:
+        return os.cpu_count() or 1
+
+class TorchEmbedder:
+    """sentence-transformers on PyTorch; the reference implementation."""
+
+    name = 'torch'
+
+    def __init__(self, model_name: str = MODEL_NAME, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.batch_size = batch_size
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return self.model.encode(list(texts), batch_size=self.batch_size, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+class OnnxEmbedder:
+    """Exported int8 MiniLM on onnxruntime with length-bucketed dynamic batches."""
+
+    name = 'onnx'
+
+    def __init__(self, model_dir: Optional[str] = None, threads: Optional[int] = None,
+                 max_tokens_per_batch: int = 16384, max_length: int = 256):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(f"The onnx embedding backend needs {e.name}: "
+                              "pip install -r requirements-onnx.txt, or set EMBEDDING_BACKEND=torch") from e
+
+        model_dir = model_dir or ONNX_DIR
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_length)
+        self.max_tokens_per_batch = max_tokens_per_batch
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or int(os.environ.get('EMBEDDING_THREADS', 0)) or physical_cores()
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(os.path.join(model_dir, 'model.onnx'), options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _batches(self, lengths: List[int]) -> List[List[int]]:
+        """Indices grouped so each batch's padded size stays under the token budget."""
+        order = sorted(range(len(lengths)), key=lengths.__getitem__)
+        batches, current = [], []
+        for index in order:
+            # Sorted ascending, so this text sets the padded length of the batch
+            if current and (len(current) + 1) * lengths[index] > self.max_tokens_per_batch:
+                batches.append(current)
+                current = []
+            current.append(index)
+        if current:
+            batches.append(current)
+        return batches
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(list(texts))
+        lengths = [len(e.ids) for e in encodings]
+        output = None
+        for batch in self._batches(lengths):
+            width = max(lengths[i] for i in batch)
+            feeds = {name: np.zeros((len(batch), width), dtype=np.int64)
+                     for name in ('input_ids', 'attention_mask', 'token_type_ids')}
+            for row, index in enumerate(batch):
+                encoding = encodings[index]
+                feeds['input_ids'][row, :lengths[index]] = encoding.ids
+                feeds['attention_mask'][row, :lengths[index]] = encoding.attention_mask
+                feeds['token_type_ids'][row, :lengths[index]] = encoding.type_ids
+            hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+            mask = feeds['attention_mask'][:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            if output is None:
+                output = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            output[batch] = pooled
+        return output if output is not None else np.empty((0, 0), dtype=np.float32)
+
+def onnx_available(model_dir: Optional[str] = None) -> bool:
+    if not os.path.exists(os.path.join(model_dir or ONNX_DIR, 'model.onnx')):
+        return False
+    try:
+        import onnxruntime  # noqa: F401
+        import tokenizers  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+_embedders: Dict[str, object] = {}
+_lock = threading.Lock()
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    """'torch' or 'onnx' for `backend`, EMBEDDING_BACKEND or 'auto'."""
+    backend = backend or os.environ.get('EMBEDDING_BACKEND', 'auto')
+    if backend == 'auto':
+        backend = 'onnx' if onnx_available() else 'torch'
+    return backend
+
+def embedding_info(backend: Optional[str] = None) -> Dict[str, str]:
+    """Backend and model that `backend` resolves to, for results metadata."""
+    backend = resolve_backend(backend)
+    info = {'embedding_backend': backend, 'embedding_model': MODEL_NAME}
+    if backend == 'onnx':
+        info['embedding_model_dir'] = ONNX_DIR
+    return info
+
+def get_embedder(backend: Optional[str] = None):
+    """Shared embedder for `backend` ('torch', 'onnx', or 'auto' from EMBEDDING_BACKEND)."""
+    backend = resolve_backend(backend)
+    with _lock:
+        if backend not in _embedders:
+            if backend == 'onnx':
+                _embedders[backend] = OnnxEmbedder()
+            elif backend == 'torch':
+                _embedders[backend] = TorchEmbedder()
+            else:
+                raise ValueError(f"Unknown embedding backend: {backend}")
+        return _embedders[backend]
+
+def pairwise_similarity(first: Sequence[str], second: Sequence[str], backend: Optional[str] = None) -> np.ndarray:
+    """Cosine similarity of first[i] and second[i], encoding all texts in one pass."""
+    embeddings = get_embedder(backend).encode(list(first) + list(second))
+    return (embeddings[:len(first)] * embeddings[len(first):]).sum(axis=1)
+
+def semantic_similarity(a: str, b: str, backend: Optional[str] = None) -> float:
+    return float(pairwise_similarity([a], [b], backend)[0])
+
+def export_onnx(output_dir: str = ONNX_DIR, model_name: str = HF_MODEL_NAME, quantize: bool = True,
+                opset: int = 14) -> str:
+    """Export the transformer to ONNX (int8 dynamic quantization by default) with its tokenizer."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    names = ['input_ids', 'attention_mask', 'token_type_ids']
+    sample = tokenizer(['An example sentence.'], return_tensors='pt')
+    dynamic = {name: {0: 'batch', 1: 'sequence'} for name in names + ['last_hidden_state']}
+    fp32_path = os.path.join(output_dir, 'model_fp32.onnx')
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[name] for name in names), fp32_path, input_names=names,
+                          output_names=['last_hidden_state'], dynamic_axes=dynamic, opset_version=opset)
+    tokenizer.save_pretrained(output_dir)
+    model_path = os.path.join(output_dir, 'model.onnx')
+    if quantize:
+        quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+    else:
+        os.replace(fp32_path, model_path)
+    print(f"Exported {model_name} to {model_path} ({os.path.getsize(model_path) / 1e6:.1f} MB)")
+    return model_path
+
+def _ranks(values: np.ndarray) -> np.ndarray:
+    ranks = np.empty(len(values))
+    ranks[np.argsort(values)] = np.arange(len(values))
+    return ranks
+
+def load_texts(path: str, limit: Optional[int] = None) -> List[str]:
+    """Completions (or prompts) from a prompt/completion JSONL file."""
+    texts = []
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                texts.append(item.get('completion') or item.get('prompt', ''))
+                if limit and len(texts) >= limit:
+                    break
+    return texts
+
+def benchmark(texts: Sequence[str], backends: Sequence[str] = ('torch', 'onnx'), repeat: int = 3) -> Dict[str, object]:
+    """Load time, throughput and (against the first backend) similarity agreement."""
+    texts = list(texts)
+    # Pair each text with its neighbour, a mix of similar and dissimilar completions
+    first, second = texts[:-1], texts[1:]
+    results, scores = {}, {}
+    for backend in backends:
+        start = time.perf_counter()
+        embedder = get_embedder(backend)
+        load_seconds = time.perf_counter() - start
+        embedder.encode(texts[:8])  # warm-up
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            embedder.encode(texts)
+            timings.append(time.perf_counter() - start)
+        scores[backend] = pairwise_similarity(first, second, backend)
+        results[backend] = {'load_seconds': load_seconds, 'texts_per_second': len(texts) / min(timings)}
+
+    reference = backends[0]
+    for backend in backends[1:]:
+        a, b = scores[reference], scores[backend]
+        results[backend].update({
+            'pearson': float(np.corrcoef(a, b)[0, 1]),
+            'spearman': float(np.corrcoef(_ranks(a), _ranks(b))[0, 1]),
+            'max_abs_difference': float(np.abs(a - b).max()),
+            'mean_abs_difference': float(np.abs(a - b).mean()),
+        })
+    return results
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export and benchmark the sentence-embedding backends.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help='Export all-MiniLM-L6-v2 to (int8) ONNX')
+    export.add_argument('--output', default=ONNX_DIR)
+    export.add_argument('--no-quantize', action='store_true')
+    bench = commands.add_parser('benchmark', help='Compare throughput and score agreement of the backends')
+    bench.add_argument('--data', default='src/data/evaluation_data.jsonl')
+    bench.add_argument('--limit', type=int, default=1000)
+    bench.add_argument('--backend', action='append', default=None,
+                       help='Backend to run (repeatable; the first is the reference)')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_onnx(args.output, quantize=not args.no_quantize)
+    else:
+        texts = load_texts(args.data, args.limit)
+        for backend, stats in benchmark(texts, args.backend or ('torch', 'onnx')).items():
+            print(f"{backend}: " + ', '.join(f"{key} {value:.4g}" for key, value in stats.items()))
@@ -1,12 +1,11 @@
 import json
-import openai
-from openai import OpenAI
 import numpy as np
 from sklearn.metrics import accuracy_score, mean_squared_error
 import os
 
-# Set up the OpenAI client
-client = OpenAI()
+from src.evaluation.clients import get_openai_client
+from src.utils.prompt_templates import build_messages
+from src.utils.retry_policy import DEFAULT_RETRY_POLICY
 
 # Load the test dataset
 def load_test_data(file_path):
@@ -19,12 +18,11 @@ def prepare_example(project):
 
 # Generate a response using the fine-tuned model
 def generate_response(prompt, model_name):
-    response = client.chat.completions.create(
+    client = get_openai_client()
+    response = DEFAULT_RETRY_POLICY.call(
+        client.chat.completions.create,
         model=model_name,
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that understands Scratch projects and can describe their structure."},
-            {"role": "user", "content": prompt}
-        ],
+        messages=build_messages('scratch_structure', prompt),
         max_tokens=150
     )
     return response.choices[0].message.content
@@ -67,9 +65,6 @@ def evaluate_model(test_data, model_name):
 
 # Main execution
 if __name__ == "__main__":
-    # Set the API key
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-
     # Load test data
     test_data = load_test_data('sampled_projects.json')[:10]  # Using a small subset for quick evaluation
 
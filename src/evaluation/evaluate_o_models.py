@@ -1,15 +1,16 @@
 # Import required libraries
 import os
 import json
-from openai import OpenAI
 from datetime import datetime
 import time
 
+from src.evaluation.clients import get_openai_client
+from src.utils.completion_format import check_format
+from src.utils.prompt_templates import build_messages
+from src.utils.retry_policy import DEFAULT_RETRY_POLICY
+
 def evaluate_o_models():
-    client = OpenAI(
-        api_key=os.environ['OAI_key'],
-        organization=os.environ['OAI_organization_id']
-    )
+    client = get_openai_client()
     
     # Load test data (5 samples)
     with open('standardized_training_data.jsonl', 'r') as f:
@@ -47,17 +48,9 @@ def process_single_test(client, model, test_item):
         return {'error': str(e)}
 
 def get_model_response(client, model, test_item):
-    messages = [
-        {
-            'role': 'system',
-            'content': 'Format: " blocks:\nsprite: Name1\nsprite: Name2"'
-        },
-        {
-            'role': 'user',
-            'content': test_item['prompt']
-        }
-    ]
-    completion = client.chat.completions.create(
+    messages = build_messages('o_series_format', test_item['prompt'])
+    completion = DEFAULT_RETRY_POLICY.call(
+        client.chat.completions.create,
         model=model,
         messages=messages,
         temperature=0
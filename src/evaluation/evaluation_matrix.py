@@ -0,0 +1,286 @@
+"""Config-driven evaluation over models x prompts x datasets x sampling settings.
+
+Every (cell, example) pair goes into one shared thread pool, interleaved across
+cells, so all providers are kept busy at once. Rate limiters are shared per
+provider, retries draw on one run-wide retry budget, identical requests are
+answered once from a shared response cache, and the scored rows are reduced to
+one table with a row per cell.
+
+Example config: src/evaluation/matrix_config.example.json
+"""
+import hashlib
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+from tqdm import tqdm
+
+from src.evaluation.clients import get_anthropic_client, get_deepseek_client, get_openai_client
+from src.evaluation.semantic_evaluation import evaluate_response
+from src.utils.call_metrics import CallMetrics
+from src.utils.completion_format import check_format
+from src.utils.prompt_templates import build_messages, get_system_prompt
+from src.utils.rate_limiter import RateLimiter
+from src.utils.retry_policy import RetryBudget, RetryPolicy
+
+DEFAULT_SAMPLING = {"temperature": 0, "max_tokens": 300}
+
+METRIC_COLUMNS = ["exact_match", "semantic_similarity", "partial_match", "order_similarity"]
+
+class ResponseCache:
+    """Thread-safe JSONL cache of completions keyed by request content."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.entries: Dict[str, str] = {}
+        self.hits = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry["response"]
+
+    @staticmethod
+    def key(provider: str, model: str, messages: List[Dict[str, str]], sampling: Dict[str, object]) -> str:
+        payload = json.dumps([provider, model, messages, sampling], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            response = self.entries.get(key)
+            if response is not None:
+                self.hits += 1
+            return response
+
+    def put(self, key: str, response: str) -> None:
+        with self._lock:
+            self.entries[key] = response
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps({"key": key, "response": response}) + "\n")
+
+def load_config(path: str) -> Dict[str, object]:
+    with open(path, "r") as f:
+        config = json.load(f)
+    for section in ("models", "prompts", "datasets"):
+        if not config.get(section):
+            raise ValueError(f"Matrix config {path} needs a non-empty '{section}' list")
+    return config
+
+def load_dataset(spec: Dict[str, object]) -> List[Dict[str, str]]:
+    """Load prompt/completion pairs from JSONL or JSON, optionally sampled with a seed."""
+    path = spec["path"]
+    with open(path, "r") as f:
+        if path.endswith(".jsonl"):
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = json.load(f)
+    limit = spec.get("limit")
+    if limit and limit < len(items):
+        if "seed" in spec:
+            items = random.Random(spec["seed"]).sample(items, limit)
+        else:
+            items = items[:limit]
+    return items
+
+def request_completion(provider: str, model: str, prompt_task: str, user_content: str,
+                       sampling: Dict[str, object], call=None) -> str:
+    """Send one request to `provider` and return the completion text."""
+    if provider == "anthropic":
+        message = get_anthropic_client().messages.create(
+            model=model, system=get_system_prompt(prompt_task),
+            messages=[{"role": "user", "content": user_content}], **sampling)
+        if call is not None:
+            call.set_usage(message.usage)
+        return message.content[0].text
+
+    if provider == "deepseek":
+        client = get_deepseek_client()
+    elif provider == "openai":
+        client = get_openai_client()
+    else:
+        raise ValueError(f"Unsupported model provider: {provider}")
+    completion = client.chat.completions.create(
+        model=model, messages=build_messages(prompt_task, user_content), **sampling)
+    if call is not None:
+        call.set_usage(completion.usage)
+    return completion.choices[0].message.content
+
+def dataset_labels(specs: List[Dict[str, object]]) -> List[str]:
+    """A distinct label per dataset: its `name`, else the file name, else the path when file names clash."""
+    basenames = [os.path.basename(spec["path"]) for spec in specs]
+    labels = [spec.get("name") or (basename if basenames.count(basename) == 1 else spec["path"])
+              for spec, basename in zip(specs, basenames)]
+    for label in set(labels):
+        clashing = [spec for spec, other in zip(specs, labels) if other == label]
+        if any(spec != clashing[0] for spec in clashing):
+            raise ValueError(f"Datasets share the label '{label}'; give each a distinct 'name'")
+    return labels
+
+def build_limiters(config: Dict[str, object]) -> Dict[str, RateLimiter]:
+    """One shared RateLimiter per provider in the config, from its `providers` section."""
+    providers = config.get("providers", {})
+    return {
+        name: RateLimiter(providers.get(name, {}).get("requests_per_minute"),
+                          providers.get(name, {}).get("max_concurrency"))
+        for name in {model["provider"] for model in config["models"]}
+    }
+
+def build_cells(config: Dict[str, object]) -> List[Dict[str, object]]:
+    """Expand the config into the cross product of models, prompts, datasets and sampling."""
+    sampling_options = config.get("sampling") or [DEFAULT_SAMPLING]
+    labels = dataset_labels(config["datasets"])
+    datasets = list(zip(labels, config["datasets"]))
+    cells = []
+    for model, prompt, (label, dataset), sampling in itertools.product(
+            config["models"], config["prompts"], datasets, sampling_options):
+        cells.append({
+            "model": model["name"],
+            "provider": model["provider"],
+            "model_id": model.get("model", model["name"]),
+            "prompt": prompt,
+            "dataset": label,
+            "sampling": {**DEFAULT_SAMPLING, **sampling},
+            "dataset_spec": dataset,
+        })
+    return cells
+
+def interleave(cells: List[Dict[str, object]], datasets: Dict[str, List[Dict[str, str]]]) -> Iterable[tuple]:
+    """Yield (cell, example) round-robin over cells so no cell waits for another to finish."""
+    queues = [iter(datasets[cell["dataset"]]) for cell in cells]
+    for row in itertools.zip_longest(*queues):
+        for cell, item in zip(cells, row):
+            if item is not None:
+                yield cell, item
+
+def score_response(response: str, expected: str) -> Dict[str, object]:
+    format_check = check_format(response)
+    return {
+        **evaluate_response(response.strip(), expected.strip()),
+        "format_ok": all(format_check.values()),
+    }
+
+def summarize_rows(rows: pd.DataFrame) -> pd.DataFrame:
+    """One row per cell: sample count, errors, mean metrics, format accuracy and latency."""
+    keys = ["model", "provider", "prompt", "dataset", "sampling"]
+    if rows.empty:
+        return pd.DataFrame(columns=keys + ["examples", "errors", "cached", "format_accuracy", "latency_p50"]
+                            + [f"{metric}_avg" for metric in METRIC_COLUMNS])
+    summary = []
+    for values, group in rows.groupby(keys, sort=False):
+        ok = group[group["error"].isna()]
+        row = dict(zip(keys, values))
+        row.update({
+            "examples": len(group),
+            "errors": int(group["error"].notna().sum()),
+            "cached": int(group["cached"].sum()),
+            "format_accuracy": ok["format_ok"].mean() if len(ok) else None,
+            "latency_p50": ok["latency"].median() if len(ok) else None,
+        })
+        for metric in METRIC_COLUMNS:
+            row[f"{metric}_avg"] = ok[metric].mean() if len(ok) else None
+        summary.append(row)
+    return pd.DataFrame(summary)
+
+def run_matrix(config: Dict[str, object], call_metrics: Optional[CallMetrics] = None) -> pd.DataFrame:
+    """Run every cell of the matrix on one global queue and return the summary table."""
+    cells = build_cells(config)
+    datasets = {cell["dataset"]: None for cell in cells}
+    for cell in cells:
+        if datasets[cell["dataset"]] is None:
+            datasets[cell["dataset"]] = load_dataset(cell["dataset_spec"])
+
+    limiters = build_limiters(config)
+    cache = ResponseCache(config.get("cache"))
+    call_metrics = call_metrics or CallMetrics(config.get("call_metrics"))
+    retry_budget = RetryBudget(config.get("retry_budget", 0.2))
+    retry_policy = RetryPolicy(max_attempts=config.get("max_retries", 3), budget=retry_budget)
+
+    def new_row(cell, item, error=None):
+        row = {key: cell[key] for key in ("model", "provider", "prompt", "dataset")}
+        row.update({"sampling": json.dumps(cell["sampling"], sort_keys=True), "item_prompt": item["prompt"],
+                    "error": error, "cached": False})
+        return row
+
+    def run_one(cell, item):
+        row = new_row(cell, item)
+        messages = build_messages(cell["prompt"], item["prompt"])
+        key = ResponseCache.key(cell["provider"], cell["model_id"], messages, cell["sampling"])
+        start = time.monotonic()
+        response = cache.get(key)
+        row["cached"] = response is not None
+        if response is None:
+            limiter = limiters[cell["provider"]]
+            try:
+                with call_metrics.call(cell["provider"], cell["model_id"], evaluator="evaluation_matrix",
+                                       prompt=cell["prompt"], dataset=cell["dataset"]) as call:
+                    def attempt():
+                        call.rate_limit_wait += limiter.acquire()
+                        try:
+                            return request_completion(cell["provider"], cell["model_id"], cell["prompt"],
+                                                      item["prompt"], cell["sampling"], call)
+                        finally:
+                            limiter.release()
+
+                    response = retry_policy.call(attempt)
+                    call.responded()
+            except Exception as e:
+                row["error"] = str(e)
+                return row
+        if not response or not response.strip():
+            row["error"] = "empty completion"
+            return row
+        if not row["cached"]:
+            cache.put(key, response)
+        row["latency"] = time.monotonic() - start
+        row["response"] = response
+        try:
+            row.update(score_response(response, item["completion"]))
+        except Exception as e:
+            row["error"] = f"scoring failed: {e}"
+        return row
+
+    jobs = list(interleave(cells, datasets))
+    print(f"Evaluating {len(cells)} cells, {len(jobs)} requests")
+    rows = []
+    with ThreadPoolExecutor(max_workers=config.get("concurrency", 16)) as executor:
+        futures = {executor.submit(run_one, cell, item): (cell, item) for cell, item in jobs}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Evaluation matrix"):
+            try:
+                rows.append(future.result())
+            except Exception as e:  # one bad example must not abort the whole matrix
+                rows.append(new_row(*futures[future], error=str(e)))
+
+    details = pd.DataFrame(rows)
+    for column in METRIC_COLUMNS + ["format_ok", "latency"]:
+        if column not in details:
+            details[column] = None
+    if config.get("details"):
+        details.to_json(config["details"], orient="records", lines=True)
+    summary = summarize_rows(details)
+    if config.get("output"):
+        summary.to_csv(config["output"], index=False)
+        print(f"Results saved to {config['output']}")
+    print(f"{cache.hits} responses served from the cache")
+    budget = retry_budget.summary()
+    print(f"{budget['retries']} retries, {budget['denied']} refused by the retry budget")
+    return summary
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run an evaluation matrix from a JSON config.")
+    parser.add_argument("config", help="Matrix config, see src/evaluation/matrix_config.example.json")
+    args = parser.parse_args()
+
+    summary = run_matrix(load_config(args.config))
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(summary.to_string(index=False))
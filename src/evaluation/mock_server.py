@@ -0,0 +1,361 @@
+"""Local stand-in for the model providers, for offline and load-test evaluation runs.
+
+Speaks enough of the OpenAI chat-completions (/v1/chat/completions) and
+Anthropic messages (/v1/messages) protocols for the evaluators, including
+server-sent-event streaming. Answers are deterministic: a request whose last
+user message (or its final paragraph) matches a dataset prompt gets that
+example's expected completion, anything else gets a stable placeholder.
+Latency, 5xx errors, 429s (with Retry-After) and a requests-per-minute cap can
+be injected to exercise the concurrency, retry and caching layers.
+
+Point every runner at it with MODEL_BASE_URL, see src/evaluation/clients.py:
+
+    python -m src.evaluation.mock_server --dataset standardized_training_data.jsonl --latency lognormal:0.4,0.5
+    MODEL_BASE_URL=http://127.0.0.1:8765 python -m src evaluate matrix
+"""
+import collections
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.utils.completion_format import HEADER, SPRITE_PREFIX
+from src.utils.prompt_templates import count_tokens
+
+DEFAULT_PORT = 8765
+
+def parse_latency(spec: Optional[str]) -> Callable[[random.Random], float]:
+    """Parse a latency distribution in seconds.
+
+    Accepts a fixed value ("0.3"), "uniform:LOW,HIGH", "normal:MEAN,SD" or
+    "lognormal:MEDIAN,SIGMA". Samples are never negative.
+    """
+    if not spec:
+        return lambda rng: 0.0
+    kind, _, args = spec.partition(':')
+    if not args:
+        value = float(kind)
+        return lambda rng: value
+    params = [float(p) for p in args.split(',')]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(*params)
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(*params))
+    if kind == 'lognormal':
+        mu = math.log(params[0])
+        return lambda rng: rng.lognormvariate(mu, params[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+def load_completions(path: str) -> Dict[str, str]:
+    """Map prompt -> expected completion from prompt/completion or chat-format JSONL/JSON."""
+    with open(path, 'r') as f:
+        items = [json.loads(line) for line in f if line.strip()] if path.endswith('.jsonl') else json.load(f)
+    completions = {}
+    for item in items:
+        if 'messages' in item:
+            user = [m['content'] for m in item['messages'] if m['role'] == 'user']
+            assistant = [m['content'] for m in item['messages'] if m['role'] == 'assistant']
+            if user and assistant:
+                completions[user[-1]] = assistant[-1]
+        else:
+            completions[item['prompt']] = item['completion']
+    return completions
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class MockModel:
+    """Deterministic answers plus the configured latency and failure injection."""
+
+    def __init__(self, completions: Optional[Dict[str, str]] = None, latency: Optional[str] = None,
+                 tokens_per_second: Optional[float] = None, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: float = 1.0,
+                 requests_per_minute: Optional[int] = None, corrupt_rate: float = 0.0, seed: int = 0):
+        self.completions = completions or {}
+        self.latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.requests_per_minute = requests_per_minute
+        self.corrupt_rate = corrupt_rate
+        self.stats = collections.Counter()
+        self._rng = random.Random(seed)
+        self._window = collections.deque()
+        self._lock = threading.Lock()
+
+    def completion_for(self, prompt: str) -> str:
+        """Expected completion for `prompt`, also matching a dataset prompt after a system preamble."""
+        completion = self.completions.get(prompt)
+        position = prompt.find('\n\n')
+        while completion is None and position != -1:
+            completion = self.completions.get(prompt[position + 2:])
+            position = prompt.find('\n\n', position + 2)
+        if completion is None:
+            self.count('unknown_prompts')
+            completion = f"{HEADER}\n{SPRITE_PREFIX}Sprite{_digest(prompt) % 10 + 1}"
+        if self.corrupt_rate and _digest('corrupt' + prompt) % 10000 < self.corrupt_rate * 10000:
+            # A reproducible subset of answers misses the leading space and the last line
+            completion = completion.lstrip().rsplit('\n', 1)[0]
+        return completion
+
+    def admit(self) -> Optional[float]:
+        """Count a request and return a Retry-After in seconds when it should get a 429."""
+        with self._lock:
+            self.stats['requests'] += 1
+            now = time.monotonic()
+            if self.requests_per_minute:
+                while self._window and now - self._window[0] >= 60:
+                    self._window.popleft()
+                if len(self._window) >= self.requests_per_minute:
+                    self.stats['rate_limited'] += 1
+                    return 60 - (now - self._window[0])
+                self._window.append(now)
+            if self._rng.random() < self.rate_limit_rate:
+                self.stats['rate_limited'] += 1
+                return self.retry_after
+        return None
+
+    def sample(self) -> Tuple[float, bool]:
+        """Draw this request's latency and whether it fails with a server error."""
+        with self._lock:
+            latency = self.latency(self._rng)
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.stats['errors'] += 1
+        return latency, failed
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+def _chunks(text: str, size: int = 16) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or ['']
+
+def _last_user_message(messages: List[Dict[str, object]]) -> str:
+    for message in reversed(messages):
+        if message.get('role') == 'user':
+            content = message.get('content', '')
+            if isinstance(content, list):
+                content = ''.join(part.get('text', '') for part in content if isinstance(part, dict))
+            return content
+    return ''
+
+class MockHandler(BaseHTTPRequestHandler):
+    model: MockModel = None
+    server_version = 'KetoMock/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, object], headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error(self, anthropic: bool, status: int, kind: str, message: str,
+                    headers: Optional[Dict[str, str]] = None):
+        if anthropic:
+            body = {'type': 'error', 'error': {'type': kind, 'message': message}}
+        else:
+            body = {'error': {'message': message, 'type': kind, 'code': None}}
+        self._send_json(status, body, headers)
+
+    def _start_events(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+    def _event(self, data: Dict[str, object], event: Optional[str] = None):
+        prefix = f'event: {event}\n' if event else ''
+        self.wfile.write(f'{prefix}data: {json.dumps(data)}\n\n'.encode('utf-8'))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip('/') in ('/health', '/v1/health'):
+            self._send_json(200, {'status': 'ok'})
+        elif self.path.rstrip('/') == '/stats':
+            self._send_json(200, dict(self.model.stats))
+        else:
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+
+    def do_POST(self):
+        anthropic = self.path.rstrip('/').endswith('/messages')
+        if not anthropic and not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+        retry_after = self.model.admit()
+        if retry_after is not None:
+            headers = {'Retry-After': f'{retry_after:.0f}' if retry_after >= 1 else f'{retry_after:.3f}',
+                       'x-ratelimit-reset-requests': f'{retry_after:.3f}s'}
+            self._send_error(anthropic, 429, 'rate_limit_error', 'Rate limit reached (mock)', headers)
+            return
+        latency, failed = self.model.sample()
+        time.sleep(latency)
+        if failed:
+            self._send_error(anthropic, 500, 'api_error' if anthropic else 'server_error',
+                             'Injected server error (mock)')
+            return
+
+        messages = request.get('messages', [])
+        prompt = _last_user_message(messages)
+        text = self.model.completion_for(prompt)
+        system = request.get('system') or ''
+        input_tokens = count_tokens(''.join(str(m.get('content', '')) for m in messages) + str(system))
+        output_tokens = count_tokens(text)
+        model = request.get('model', 'mock')
+        self.model.count('streamed' if request.get('stream') else 'completed')
+        if anthropic:
+            self._anthropic(request, model, text, input_tokens, output_tokens)
+        else:
+            self._openai(request, model, text, input_tokens, output_tokens)
+
+    def _openai(self, request, model, text, input_tokens, output_tokens):
+        completion_id = f'chatcmpl-mock-{uuid.uuid4().hex[:12]}'
+        created = int(time.time())
+        usage = {'prompt_tokens': input_tokens, 'completion_tokens': output_tokens,
+                 'total_tokens': input_tokens + output_tokens,
+                 'prompt_tokens_details': {'cached_tokens': 0}}
+        if not request.get('stream'):
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                             'finish_reason': 'stop'}],
+                'usage': usage,
+            })
+            return
+
+        def chunk(delta, finish_reason=None, **extra):
+            return {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}], **extra}
+
+        delay = self.model.token_delay()
+        try:
+            self._start_events()
+            self._event(chunk({'role': 'assistant', 'content': ''}))
+            for piece in _chunks(text):
+                time.sleep(delay * count_tokens(piece))
+                self._event(chunk({'content': piece}))
+            self._event(chunk({}, 'stop'))
+            if (request.get('stream_options') or {}).get('include_usage'):
+                self._event({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                             'model': model, 'choices': [], 'usage': usage})
+            self.wfile.write(b'data: [DONE]\n\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the stream, e.g. after an early format failure
+            self.model.count('cancelled')
+
+    def _anthropic(self, request, model, text, input_tokens, output_tokens):
+        message_id = f'msg_mock_{uuid.uuid4().hex[:12]}'
+        usage = {'input_tokens': input_tokens, 'output_tokens': output_tokens,
+                 'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0}
+        message = {'id': message_id, 'type': 'message', 'role': 'assistant', 'model': model,
+                   'content': [{'type': 'text', 'text': text}], 'stop_reason': 'end_turn',
+                   'stop_sequence': None, 'usage': usage}
+        if not request.get('stream'):
+            self._send_json(200, message)
+            return
+
+        delay = self.model.token_delay()
+        try:
+            self._start_events()
+            self._event({'type': 'message_start',
+                         'message': {**message, 'content': [], 'stop_reason': None,
+                                     'usage': {**usage, 'output_tokens': 0}}}, 'message_start')
+            self._event({'type': 'content_block_start', 'index': 0,
+                         'content_block': {'type': 'text', 'text': ''}}, 'content_block_start')
+            for piece in _chunks(text):
+                time.sleep(delay * count_tokens(piece))
+                self._event({'type': 'content_block_delta', 'index': 0,
+                             'delta': {'type': 'text_delta', 'text': piece}}, 'content_block_delta')
+            self._event({'type': 'content_block_stop', 'index': 0}, 'content_block_stop')
+            self._event({'type': 'message_delta', 'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                         'usage': {'output_tokens': output_tokens}}, 'message_delta')
+            self._event({'type': 'message_stop'}, 'message_stop')
+        except (BrokenPipeError, ConnectionResetError):
+            self.model.count('cancelled')
+
+def make_server(model: MockModel, host: str = '127.0.0.1', port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    handler = type('BoundMockHandler', (MockHandler,), {'model': model})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+@contextmanager
+def running_mock_server(model: Optional[MockModel] = None, host: str = '127.0.0.1',
+                        port: int = 0) -> Iterator[str]:
+    """Serve `model` on a background thread and yield its base URL (port 0 picks a free port)."""
+    server = make_server(model or MockModel(), host, port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def add_mock_arguments(parser) -> None:
+    """Add the mock-server options to an argparse parser."""
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--dataset', action='append', default=[],
+                        help='JSONL/JSON with prompt/completion pairs or chat messages (repeatable)')
+    parser.add_argument('--latency', default=None,
+                        help='Seconds before the first token: 0.3, uniform:LOW,HIGH, normal:MEAN,SD '
+                             'or lognormal:MEDIAN,SIGMA')
+    parser.add_argument('--tokens-per-second', type=float, default=None, help='Streaming speed (default: instant)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with a 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds on injected 429s')
+    parser.add_argument('--rpm', type=int, default=None, help='Answer 429 above this many requests per minute')
+    parser.add_argument('--corrupt-rate', type=float, default=0.0,
+                        help='Fraction of prompts whose answer breaks the completion format')
+    parser.add_argument('--seed', type=int, default=0)
+
+def model_from_args(args) -> MockModel:
+    completions = {}
+    for path in args.dataset:
+        completions.update(load_completions(path))
+    return MockModel(completions, args.latency, args.tokens_per_second, args.error_rate, args.rate_limit_rate,
+                     args.retry_after, args.rpm, args.corrupt_rate, args.seed)
+
+def serve(args) -> None:
+    model = model_from_args(args)
+    server = make_server(model, args.host, args.port)
+    url = f'http://{args.host}:{server.server_address[1]}'
+    print(f"Mock model server on {url} with {len(model.completions)} canned completions")
+    print(f"Use it with: MODEL_BASE_URL={url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served: {dict(model.stats)}")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve mock OpenAI and Anthropic endpoints for offline evaluation.')
+    add_mock_arguments(parser)
+    serve(parser.parse_args())
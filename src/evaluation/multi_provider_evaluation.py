@@ -1,19 +1,23 @@
 import os
 import json
 import pandas as pd
-from openai import OpenAI
-from anthropic import Anthropic
 import requests
 from pathlib import Path
 import numpy as np
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer, util
-import torch
-import backoff
 import time
 import traceback
 import argparse
 
+from src.evaluation.clients import get_anthropic_client, get_openai_client, provider_base_url
+from src.evaluation.embedding_backends import embedding_info
+from src.evaluation.similarity_tiers import TieredSimilarity, similarity_averages
+from src.utils.call_metrics import CallMetrics, current_call
+from src.utils.completion_format import parse_completion
+from src.utils.prompt_templates import FORMAT_TASKS, build_messages, get_system_prompt
+from src.utils.retry_policy import DEFAULT_RETRY_POLICY
+from src.utils.streaming import stream_anthropic_message, stream_openai_chat, summarize_streams
+
 def load_evaluation_data(file_path):
     """Load evaluation dataset from CSV file and convert to required format."""
     df = pd.read_csv(file_path)
@@ -26,16 +30,7 @@ def load_evaluation_data(file_path):
         })
     return evaluation_data
 
-def calculate_semantic_similarity(str1, str2):
-    """Calculate semantic similarity between two strings using sentence transformers."""
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    embeddings = model.encode([str1, str2])
-    return util.pytorch_cos_sim(embeddings[0], embeddings[1]).item()
-
-@backoff.on_exception(backoff.expo,
-                     Exception,
-                     max_tries=5,
-                     max_time=300)
+@DEFAULT_RETRY_POLICY
 def make_openai_call(client, model_name, messages):
     """Make OpenAI API call with retry logic."""
     try:
@@ -45,15 +40,14 @@ def make_openai_call(client, model_name, messages):
             temperature=0.7,
             max_tokens=150
         )
+        if current_call() is not None:
+            current_call().set_usage(response.usage)
         return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"Error in OpenAI API call: {str(e)}")
         raise
 
-@backoff.on_exception(backoff.expo,
-                     Exception,
-                     max_tries=5,
-                     max_time=300)
+@DEFAULT_RETRY_POLICY
 def make_anthropic_call(client, model_name, prompt):
     """Make Anthropic API call with retry logic."""
     try:
@@ -68,15 +62,14 @@ def make_anthropic_call(client, model_name, prompt):
                 }
             ]
         )
+        if current_call() is not None:
+            current_call().set_usage(message.usage)
         return message.content[0].text.strip()
     except Exception as e:
         print(f"Error in Anthropic API call: {str(e)}")
         raise
 
-@backoff.on_exception(backoff.expo,
-                     Exception,
-                     max_tries=5,
-                     max_time=300)
+@DEFAULT_RETRY_POLICY
 def make_deepseek_call(api_key, prompt):
     """Make DeepSeek API call with retry logic."""
     try:
@@ -96,22 +89,52 @@ def make_deepseek_call(api_key, prompt):
             "max_tokens": 150
         }
         response = requests.post(
-            "https://api.deepseek.com/v1/chat/completions",
+            f"{provider_base_url('deepseek')}/chat/completions",
             headers=headers,
             json=data
         )
         response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"].strip()
+        body = response.json()
+        if current_call() is not None:
+            current_call().status = response.status_code
+            current_call().set_usage(body.get("usage"))
+        return body["choices"][0]["message"]["content"].strip()
     except Exception as e:
         print(f"Error in DeepSeek API call: {str(e)}")
         raise
 
-def evaluate_model(model_provider, client, model_name, evaluation_data, api_key=None):
-    """Evaluate a model's performance on the test data."""
+@DEFAULT_RETRY_POLICY
+def make_streaming_call(model_provider, client, model_name, prompt, task='scratch_describe'):
+    """Stream a completion, cancelling it at the first format error when `task` asks for the format."""
+    abort_on_invalid = task in FORMAT_TASKS
+    if model_provider == "openai":
+        return stream_openai_chat(client, model_name, build_messages(task, prompt), abort_on_invalid,
+                                  temperature=0.7, max_tokens=150)
+    if model_provider == "anthropic":
+        full_prompt = f"{get_system_prompt(task)}\n\n{prompt}"
+        return stream_anthropic_message(client, model_name, [{"role": "user", "content": full_prompt}],
+                                        abort_on_invalid, temperature=0.7, max_tokens=150)
+    raise ValueError(f"Streaming is not supported for provider: {model_provider}")
+
+def evaluate_model(model_provider, client, model_name, evaluation_data, api_key=None, stream=False,
+                   call_metrics=None):
+    """Evaluate a model's performance on the test data.
+
+    With `stream`, OpenAI and Anthropic completions are streamed. The
+    'scratch_describe' prompt does not ask for the " blocks:" format, so streams
+    run to completion and score like unstreamed calls; a stream cut off on a
+    format error counts as a format failure and gets no content scores. Each
+    call, with its retries, is recorded in `call_metrics`; scoring happens after
+    the record is closed, so a scoring error is not logged as a failed call.
+    """
+    call_metrics = call_metrics or CallMetrics()
+    similarity = TieredSimilarity()
     results = []
+    streams = []
     format_accuracy = 0
     sprite_accuracy = 0
-    semantic_similarity_sum = 0
+    matches = []
+    aborted_examples = 0
     total_examples = len(evaluation_data)
 
     for example in tqdm(evaluation_data, desc=f"Evaluating {model_name}"):
@@ -119,42 +142,63 @@ def evaluate_model(model_provider, client, model_name, evaluation_data, api_key=
         expected_completion = example['completion']
 
         try:
-            if model_provider == "openai":
-                messages = [
-                    {"role": "system", "content": "You are a helpful assistant that describes Scratch projects."},
-                    {"role": "user", "content": prompt}
-                ]
-                model_completion = make_openai_call(client, model_name, messages)
-            elif model_provider == "anthropic":
-                system_prompt = "You are a helpful assistant that describes Scratch projects."
-                full_prompt = f"{system_prompt}\n\n{prompt}"
-                model_completion = make_anthropic_call(client, model_name, full_prompt)
-            elif model_provider == "deepseek":
-                system_prompt = "You are a helpful assistant that describes Scratch projects."
-                full_prompt = f"{system_prompt}\n\n{prompt}"
-                model_completion = make_deepseek_call(api_key, full_prompt)
-            else:
-                raise ValueError(f"Unsupported model provider: {model_provider}")
+            with call_metrics.call(model_provider, model_name, evaluator='multi_provider_evaluation',
+                                   stream=bool(stream)) as call:
+                streamed = None
+                if stream and model_provider in ("openai", "anthropic"):
+                    streamed = make_streaming_call(model_provider, client, model_name, prompt)
+                    streams.append(streamed)
+                    model_completion = streamed['text'].strip()
+                elif model_provider == "openai":
+                    messages = build_messages('scratch_describe', prompt)
+                    model_completion = make_openai_call(client, model_name, messages)
+                elif model_provider == "anthropic":
+                    system_prompt = get_system_prompt('scratch_describe')
+                    full_prompt = f"{system_prompt}\n\n{prompt}"
+                    model_completion = make_anthropic_call(client, model_name, full_prompt)
+                elif model_provider == "deepseek":
+                    system_prompt = get_system_prompt('scratch_describe')
+                    full_prompt = f"{system_prompt}\n\n{prompt}"
+                    model_completion = make_deepseek_call(api_key, full_prompt)
+                else:
+                    raise ValueError(f"Unsupported model provider: {model_provider}")
+                if streamed:
+                    call.set_stream(streamed)
+                call.responded()
 
             # Format accuracy
-            if model_completion.startswith(" blocks:") and "sprite:" in model_completion:
+            parsed = streamed['parser'] if streamed else parse_completion(model_completion)
+            aborted = bool(streamed and streamed['aborted'])
+            if parsed.space_prefix and parsed.sprite_names and not aborted:
                 format_accuracy += 1
 
-            # Sprite accuracy
-            expected_sprite = expected_completion.split("sprite: ")[1].strip()
-            if expected_sprite in model_completion:
-                sprite_accuracy += 1
+            match = None
+            if aborted:
+                # Truncated text would understate the model's content scores
+                aborted_examples += 1
+            else:
+                # Sprite accuracy
+                expected_sprite = expected_completion.split("sprite: ")[1].strip()
+                if expected_sprite in model_completion:
+                    sprite_accuracy += 1
 
-            # Semantic similarity
-            semantic_similarity = calculate_semantic_similarity(expected_completion, model_completion)
-            semantic_similarity_sum += semantic_similarity
+                # Semantic similarity; pairs a lexical tier settled only get a lexical score
+                match = similarity.score(expected_completion, model_completion)
+                matches.append(match)
 
             results.append({
                 "prompt": prompt,
                 "expected": expected_completion,
                 "generated": model_completion,
-                "semantic_similarity": semantic_similarity
+                "similarity": match.score if match else None,
+                "semantic_similarity": match.semantic if match else None,
+                "lexical_similarity": match.lexical if match else None,
+                "similarity_tier": match.tier if match else None
             })
+            if streamed:
+                results[-1]["stream"] = {key: streamed[key] for key in
+                                         ("aborted", "format_error", "ttft", "elapsed",
+                                          "output_tokens", "tokens_per_second")}
 
             # Add a small delay to avoid rate limiting
             time.sleep(1)
@@ -164,11 +208,24 @@ def evaluate_model(model_provider, client, model_name, evaluation_data, api_key=
             traceback.print_exc()
             continue
 
+    scored_examples = total_examples - aborted_examples
     metrics = {
         "format_accuracy": (format_accuracy / total_examples) * 100,
-        "sprite_accuracy": (sprite_accuracy / total_examples) * 100,
-        "semantic_similarity": semantic_similarity_sum / total_examples
+        "sprite_accuracy": (sprite_accuracy / scored_examples) * 100 if scored_examples else None,
+        # Over all scored pairs; the semantic and lexical means cover only the pairs that have them
+        **similarity_averages(matches),
+        **{f"similarity_{key}": value for key, value in similarity.summary().items()},
+        **embedding_info(similarity.backend)
     }
+    similarity.report()
+    if streams:
+        summary = summarize_streams(streams)
+        metrics.update({
+            "aborted_on_format": summary["aborted"],
+            "ttft_avg": summary["ttft_avg"],
+            "tokens_per_second_avg": summary["tokens_per_second_avg"],
+            "output_tokens": summary["output_tokens"],
+        })
 
     return metrics, results
 
@@ -186,10 +243,14 @@ def save_results(metrics, results, model_name, output_dir):
 
     print(f"\nResults for {model_name}:")
     print(f"Format Accuracy: {metrics['format_accuracy']:.2f}%")
-    print(f"Sprite Accuracy: {metrics['sprite_accuracy']:.2f}%")
-    print(f"Semantic Similarity: {metrics['semantic_similarity']:.4f}")
-
-def main():
+    if metrics['sprite_accuracy'] is not None:
+        print(f"Sprite Accuracy: {metrics['sprite_accuracy']:.2f}%")
+    if metrics['similarity'] is not None:
+        print(f"Similarity: {metrics['similarity']:.4f}")
+    if metrics['semantic_similarity'] is not None:
+        print(f"Semantic Similarity: {metrics['semantic_similarity']:.4f} (pairs not settled lexically)")
+
+def main(stream=False):
     """Run evaluation on all specified models."""
     # Create results directory
     output_dir = Path(__file__).parent / "results"
@@ -203,6 +264,8 @@ def main():
     }
 
     missing_vars = [name for name, desc in required_vars.items() if not os.environ.get(name)]
+    if os.environ.get('MODEL_BASE_URL'):
+        missing_vars = []
     if missing_vars:
         print("Missing required environment variables:")
         for var in missing_vars:
@@ -210,11 +273,8 @@ def main():
         return
 
     # Initialize clients with environment variables
-    openai_client = OpenAI(
-        api_key=os.environ.get('OAI_key'),
-        organization=os.environ.get('OAI_organization_id')
-    )
-    anthropic_client = Anthropic(api_key=os.environ.get('anthropic_api'))
+    openai_client = get_openai_client()
+    anthropic_client = get_anthropic_client()
     deepseek_api_key = os.environ.get('deepseek_api')
 
     # Load evaluation data
@@ -237,9 +297,9 @@ def main():
 
         try:
             if provider == "openai":
-                metrics, results = evaluate_model(provider, openai_client, model_name, evaluation_data)
+                metrics, results = evaluate_model(provider, openai_client, model_name, evaluation_data, stream=stream)
             elif provider == "anthropic":
-                metrics, results = evaluate_model(provider, anthropic_client, model_name, evaluation_data)
+                metrics, results = evaluate_model(provider, anthropic_client, model_name, evaluation_data, stream=stream)
             elif provider == "deepseek":
                 print(f"Skipping {model_name} due to persistent API issues.")
                 continue
@@ -265,4 +325,8 @@ def main():
         print("\nNo models were successfully evaluated. Please check the errors and try again.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Evaluate models from several providers.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream completions (recording TTFT and decode rate)")
+    args = parser.parse_args()
+    main(stream=args.stream)
@@ -4,67 +4,126 @@ from pathlib import Path
 import numpy as np
 from tqdm import tqdm
 import os
+from concurrent.futures import ProcessPoolExecutor
 
-def process_blocks_in_chunks(chunk_size=10000):
-    """Process allBlocks.csv in chunks to identify medium complexity projects."""
-    projects_data = {}
-    chunk_iterator = pd.read_csv(
-        "src/data/dataset_raw/allBlocks.csv",
-        names=["ProjectId", "BlockId", "ParentId", "Type", "Target",
-               "OpCode", "NextBlock", "Comment", "Input"],
-        dtype={
-            "ProjectId": str,
-            "BlockId": str,
-            "ParentId": str,
-            "Type": str,
-            "Target": str,
-            "OpCode": str,
-            "NextBlock": str,
-            "Comment": str,
-            "Input": str
-        },
-        chunksize=chunk_size,
-        on_bad_lines="skip"
-    )
+from src.utils.pipeline_profiler import PipelineProfiler, add_profiler_arguments, profiler_from_args
+from src.utils.scoring_models import get_model
+from src.utils.scratch_csv import iter_scratch_csv, new_read_stats, report_read_stats
+
+BLOCKS_PATH = "src/data/dataset_raw/allBlocks.csv"
+OUTPUT_PATH = "src/data/medium_complexity_projects.csv"
+
+# Inclusive ComplexityScore range kept as "medium complexity"
+SCORE_BAND = (100, 200)
+
+COUNT_COLUMNS = ["TotalBlocks", "ControlBlocks", "CustomBlocks"]
+
+# Number of chunk aggregates held before folding them into one
+MERGE_EVERY = 64
+
+def aggregate_chunk(chunk):
+    """Count blocks per project and collect (project, target) pairs for one chunk."""
+    block_type = chunk["Type"].astype("string")
+    counts = pd.DataFrame({
+        "ProjectId": chunk["ProjectId"],
+        "TotalBlocks": 1,
+        "ControlBlocks": block_type.str.contains("control", regex=False).fillna(False).astype(int),
+        "CustomBlocks": block_type.str.contains("custom", regex=False).fillna(False).astype(int),
+    }).groupby("ProjectId", sort=False).sum()
+    targets = chunk[["ProjectId", "Target"]].drop_duplicates()
+    return counts, targets
+
+def merge_partials(partials):
+    """Merge per-chunk aggregates so projects split across chunks are counted whole."""
+    counts = pd.concat([c for c, _ in partials]).groupby(level=0, sort=False).sum()
+    targets = pd.concat([t for _, t in partials]).drop_duplicates()
+    return counts, targets
+
+def combine_aggregates(partials):
+    """Reduce all partial aggregates to one row of counts per project."""
+    if not partials:
+        return pd.DataFrame(columns=COUNT_COLUMNS + ["UniqueTargets"])
+    counts, targets = merge_partials(partials)
+    counts["UniqueTargets"] = targets.groupby("ProjectId", sort=False, dropna=False).size()
+    counts["UniqueTargets"] = counts["UniqueTargets"].fillna(0).astype(int)
+    return counts
+
+def score_projects(aggregates, score_band=SCORE_BAND, model="linked_linear"):
+    """Score every project at once and keep those inside the inclusive score band."""
+    projects_df = aggregates.copy()
+    projects_df["ComplexityScore"] = get_model(model)(projects_df)
+    low, high = score_band
+    projects_df = projects_df[projects_df["ComplexityScore"].between(low, high)]
+    projects_df = projects_df.rename_axis("ProjectId").reset_index()
+    projects_df = projects_df[["ProjectId", "ComplexityScore", "TotalBlocks",
+                               "UniqueTargets", "ControlBlocks", "CustomBlocks"]]
+    return projects_df.sort_values("ComplexityScore", ascending=False)
+
+def process_blocks_in_chunks(chunk_size=10000, score_band=SCORE_BAND, workers=None,
+                             blocks_path=BLOCKS_PATH, output_path=OUTPUT_PATH, profiler=None):
+    """Process allBlocks.csv in chunks to identify medium complexity projects.
+
+    Chunks are aggregated in a process pool and combined before scoring, so a
+    project that spans several chunks is scored on all of its blocks. Pass a
+    PipelineProfiler to time the read, aggregate, merge, score and write stages.
+    """
+    profiler = profiler or PipelineProfiler(enabled=False)
+    stats = new_read_stats(blocks_path)
+    chunks = profiler.iterate("read_csv", iter_scratch_csv(blocks_path, kind="allBlocks_linked",
+                                                           chunk_size=chunk_size, stats=stats))
+    workers = workers or os.cpu_count() or 1
 
     print("Processing blocks data in chunks...")
-    for chunk in tqdm(chunk_iterator):
-        for project_id, project_blocks in chunk.groupby("ProjectId"):
-            if project_id not in projects_data:
-                # Calculate complexity metrics
-                total_blocks = len(project_blocks)
-                unique_targets = len(project_blocks["Target"].unique())
-                control_blocks = len(project_blocks[project_blocks["Type"].str.contains("control", na=False)])
-                custom_blocks = len(project_blocks[project_blocks["Type"].str.contains("custom", na=False)])
-
-                # Calculate complexity score
-                complexity_score = (
-                    total_blocks * 0.5 +
-                    unique_targets * 2.0 +
-                    control_blocks * 1.5 +
-                    custom_blocks * 3.0
-                )
-
-                # Store project data if it meets medium complexity criteria
-                if 100 <= complexity_score <= 200:
-                    projects_data[project_id] = {
-                        "ProjectId": project_id,
-                        "ComplexityScore": complexity_score,
-                        "TotalBlocks": total_blocks,
-                        "UniqueTargets": unique_targets,
-                        "ControlBlocks": control_blocks,
-                        "CustomBlocks": custom_blocks
-                    }
-
-    # Convert to DataFrame and sort by complexity
-    projects_df = pd.DataFrame.from_dict(projects_data, orient='index')
-    projects_df = projects_df.sort_values("ComplexityScore", ascending=False)
+    partials = []
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            for chunk in tqdm(chunks):
+                with profiler.stage("submit"):
+                    pending.append(executor.submit(aggregate_chunk, chunk[["ProjectId", "Type", "Target"]]))
+                # Bound the number of chunks held in memory while workers catch up
+                if len(pending) >= workers * 2:
+                    with profiler.stage("aggregate_wait"):
+                        partials.append(pending.pop(0).result())
+                if len(partials) >= MERGE_EVERY:
+                    with profiler.stage("merge"):
+                        partials = [merge_partials(partials)]
+            with profiler.stage("aggregate_wait"):
+                partials.extend(future.result() for future in pending)
+    else:
+        for chunk in tqdm(chunks):
+            with profiler.stage("aggregate"):
+                partials.append(aggregate_chunk(chunk))
+            # Periodically fold partials together to keep memory flat on the full dataset
+            if len(partials) >= MERGE_EVERY:
+                with profiler.stage("merge"):
+                    partials = [merge_partials(partials)]
+    report_read_stats(stats)
+    profiler.stages["read_csv"].add(bytes=stats["bytes_read"])
+
+    with profiler.stage("combine"):
+        aggregates = combine_aggregates(partials)
+    with profiler.stage("score", rows=len(aggregates)):
+        projects_df = score_projects(aggregates, score_band)
 
     # Save medium complexity projects
-    os.makedirs("src/data", exist_ok=True)
-    projects_df.to_csv("src/data/medium_complexity_projects.csv", index=False)
+    with profiler.stage("write", rows=len(projects_df)):
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        projects_df.to_csv(output_path, index=False)
+    profiler.report()
     print(f"Found {len(projects_df)} medium complexity projects")
     return projects_df
 
 if __name__ == "__main__":
-    process_blocks_in_chunks()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Find medium complexity projects in allBlocks.csv.")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--min-score", type=float, default=SCORE_BAND[0])
+    parser.add_argument("--max-score", type=float, default=SCORE_BAND[1])
+    parser.add_argument("--workers", type=int, default=None)
+    add_profiler_arguments(parser)
+    args = parser.parse_args()
+
+    process_blocks_in_chunks(args.chunk_size, (args.min_score, args.max_score), args.workers,
+                             profiler=profiler_from_args(args))
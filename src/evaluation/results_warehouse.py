@@ -0,0 +1,437 @@
+"""SQLite warehouse of every evaluation run, for cross-run comparisons.
+
+Each results file the evaluators write is normalized into four tables:
+
+- runs: one row per distinct file content (source path, kind, timestamp)
+- model_metrics: run x model (x prompt template x dataset) x metric -> value
+- responses: one row per evaluated prompt with expected and actual output
+- response_metrics: response x metric -> value
+
+Recognized formats are the semantic_evaluation, multi-provider, run_model_evaluation,
+format-analysis, model_evaluation_results, o-series and adaptive JSON files,
+the model comparison / evaluation matrix CSVs and the matrix details JSONL.
+Rows may name the model as model, model_name or model_id. Metric names are
+only merged when they are the same computation: semantic_similarity is the
+tiered embedding score (multi-provider, and run_model_evaluation's
+avg_semantic_similarity), semantic_similarity_avg the mean sprite-name
+SequenceMatcher ratio (semantic_evaluation, the matrix, and the adaptive
+runner's semantic_similarity). Per-prompt scores keep each evaluator's names,
+so prompt regressions only compare runs of the same kind.
+Files are tracked by size, mtime and content hash, so re-ingesting is
+incremental and an overwritten file (model_comparison.csv) becomes a new run
+instead of replacing the old one. `watch` polls for new files.
+
+    python -m src.evaluation.results_warehouse ingest
+    python -m src.evaluation.results_warehouse compare --metric semantic_similarity
+    python -m src.evaluation.results_warehouse regressions --metric semantic_similarity
+"""
+import csv
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+WAREHOUSE_PATH = os.environ.get('RESULTS_WAREHOUSE_PATH', 'results_warehouse.sqlite')
+
+DEFAULT_PATTERNS = (
+    'semantic_evaluation_results_*.json',
+    'o_series_evaluation_*.json',
+    'src/evaluation/results/*.json',
+    'src/evaluation/results/*.jsonl',
+    'src/evaluation/results/*.csv',
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, size INTEGER, mtime REAL, sha256 TEXT, run_id INTEGER, status TEXT, ingested_at TEXT);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY, source TEXT, kind TEXT, timestamp TEXT, sha256 TEXT UNIQUE, ingested_at TEXT);
+CREATE TABLE IF NOT EXISTS model_metrics (
+    run_id INTEGER, model TEXT, provider TEXT, prompt_task TEXT, dataset TEXT, metric TEXT, value REAL);
+CREATE TABLE IF NOT EXISTS responses (
+    response_id INTEGER PRIMARY KEY, run_id INTEGER, model TEXT, prompt_task TEXT, prompt TEXT,
+    expected TEXT, response TEXT, error TEXT);
+CREATE TABLE IF NOT EXISTS response_metrics (response_id INTEGER, metric TEXT, value REAL);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+CREATE INDEX IF NOT EXISTS model_metrics_model ON model_metrics (model, metric);
+CREATE INDEX IF NOT EXISTS model_metrics_metric ON model_metrics (metric, run_id);
+CREATE INDEX IF NOT EXISTS model_metrics_run ON model_metrics (run_id);
+CREATE INDEX IF NOT EXISTS responses_model_prompt ON responses (model, prompt);
+CREATE INDEX IF NOT EXISTS responses_prompt ON responses (prompt);
+CREATE INDEX IF NOT EXISTS responses_run ON responses (run_id, model);
+CREATE INDEX IF NOT EXISTS response_metrics_response ON response_metrics (response_id, metric);
+CREATE INDEX IF NOT EXISTS response_metrics_metric ON response_metrics (metric);
+"""
+
+_TIMESTAMP = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?')
+
+# Keys that hold per-prompt rows, and the fields that hold the texts in them
+RESPONSE_LISTS = ('results', 'detailed_results', 'responses')
+RESPONSE_FIELDS = ('response', 'generated', 'prediction')
+EXPECTED_FIELDS = ('expected', 'target', 'completion')
+
+# Columns that name the model in comparison CSVs and details rows, in order of preference
+MODEL_FIELDS = ('model', 'model_name', 'model_id')
+
+# run_model_evaluation's names for the tiered similarity means multi-provider reports
+METRIC_ALIASES = {
+    'avg_similarity': 'similarity',
+    'avg_semantic_similarity': 'semantic_similarity',
+    'avg_lexical_similarity': 'lexical_similarity',
+}
+
+# The adaptive runner's per-example means, named as in the matrix summary (others get '_avg')
+ADAPTIVE_METRICS = {'format_ok': 'format_accuracy'}
+
+def _number(value) -> Optional[float]:
+    """A metric value as float; bools count as 0/1, anything non-numeric is None."""
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value) if not math.isnan(value) else None
+    return None
+
+def _numeric_fields(obj: Dict[str, object], prefix: str = '') -> Iterator[Tuple[str, float]]:
+    """Numeric leaves of `obj`; nested metrics/aggregates/format_check dicts are flattened."""
+    for key, value in obj.items():
+        if isinstance(value, dict) and key in ('metrics', 'aggregates', 'format_check', 'baseline'):
+            nested = '' if key in ('metrics', 'aggregates') else f'{key}.'
+            yield from _numeric_fields(value, prefix + nested)
+        else:
+            number = _number(value)
+            if number is not None:
+                yield prefix + key, number
+
+class Run:
+    """Rows normalized from one results file, before they are written."""
+
+    def __init__(self, kind: str, timestamp: Optional[str] = None):
+        self.kind = kind
+        self.timestamp = timestamp
+        self.metrics: List[Tuple[str, Optional[str], Optional[str], Optional[str], str, float]] = []
+        self.responses: List[Tuple[Tuple[str, Optional[str], str, Optional[str], Optional[str], Optional[str]],
+                                   List[Tuple[str, float]]]] = []
+
+    def add_metrics(self, model: str, values: Iterable[Tuple[str, float]], provider: Optional[str] = None,
+                    prompt_task: Optional[str] = None, dataset: Optional[str] = None) -> None:
+        self.metrics.extend((model, provider, prompt_task, dataset, METRIC_ALIASES.get(metric, metric), value)
+                            for metric, value in values)
+
+    def add_response(self, model: str, row: Dict[str, object], prompt_task: Optional[str] = None) -> None:
+        # Matrix rows keep the prompt template in 'prompt' and the example in 'item_prompt'
+        prompt = row.get('item_prompt') or row.get('prompt')
+        if prompt is None:
+            return
+        response = next((row[key] for key in RESPONSE_FIELDS if row.get(key) is not None), None)
+        expected = next((row[key] for key in EXPECTED_FIELDS if row.get(key) is not None), None)
+        skip = {'prompt', 'item_prompt', *RESPONSE_FIELDS, *EXPECTED_FIELDS}
+        values = [(METRIC_ALIASES.get(metric, metric), value) for metric, value in _numeric_fields(row)
+                  if metric not in skip]
+        self.responses.append(((model, prompt_task, str(prompt), expected, response, row.get('error')), values))
+
+    def add_model(self, model: str, obj: Dict[str, object], provider: Optional[str] = None) -> None:
+        """Model-level numeric fields as metrics and any per-prompt list as responses."""
+        self.add_metrics(model, _numeric_fields(obj), provider)
+        for key in RESPONSE_LISTS:
+            if isinstance(obj.get(key), list):
+                for row in obj[key]:
+                    if isinstance(row, dict):
+                        self.add_response(model, row)
+
+def _model_from_filename(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for prefix in ('evaluation_results_', 'format_analysis_'):
+        if stem.startswith(prefix):
+            return stem[len(prefix):]
+    return stem
+
+def _parse_json(path: str, data) -> Optional[Run]:
+    timestamp = None
+    if isinstance(data, dict):
+        timestamp = data.get('timestamp') or data.get('evaluation_timestamp')
+
+    # semantic_evaluation: {"results": [{"model", "model_id", "aggregates", "results"}]}
+    if isinstance(data, dict) and isinstance(data.get('results'), list) and data['results'] \
+            and isinstance(data['results'][0], dict) and 'aggregates' in data['results'][0]:
+        run = Run('semantic_evaluation', timestamp)
+        for entry in data['results']:
+            run.add_model(entry.get('model_id') or entry['model'], entry)
+        return run
+    # model_evaluation_results: {"baseline", "model_results": {model: {...}}}
+    if isinstance(data, dict) and isinstance(data.get('model_results'), dict):
+        run = Run('model_evaluation', timestamp)
+        if isinstance(data.get('baseline'), dict):
+            run.add_metrics('baseline', _numeric_fields(data['baseline']))
+        for model, entry in data['model_results'].items():
+            run.add_model(model, entry)
+        return run
+    # adaptive_evaluation summary: {"models": {model: {metric: [mean, low, high]}}}
+    if isinstance(data, dict) and isinstance(data.get('models'), dict) and 'stopped_because' in data:
+        run = Run('adaptive_evaluation', timestamp)
+        for model, metrics in data['models'].items():
+            for metric, (mean, low, high) in metrics.items():
+                metric = ADAPTIVE_METRICS.get(metric, f'{metric}_avg')
+                run.add_metrics(model, [(metric, mean), (f'{metric}_ci_low', low), (f'{metric}_ci_high', high)])
+        return run
+    # multi-provider / run_model_evaluation: {"metrics": {...}, "results" | "detailed_results": [...]}
+    if isinstance(data, dict) and isinstance(data.get('metrics'), dict):
+        model = data['metrics'].get('model_name') or _model_from_filename(path)
+        run = Run('model_results', timestamp)
+        run.add_model(model, data)
+        return run
+    # format analysis: {"model", "timestamp", "responses": [...]}
+    if isinstance(data, dict) and 'model' in data and isinstance(data.get('responses'), list):
+        run = Run('format_analysis', timestamp)
+        run.add_model(data['model'], data)
+        return run
+    # o-series and other per-model lists: [{"model", ...}]
+    if isinstance(data, list) and data and all(isinstance(e, dict) and 'model' in e for e in data):
+        run = Run('model_list', timestamp)
+        for entry in data:
+            run.add_model(entry['model'], entry)
+        return run
+    return None
+
+def _parse_rows(rows: List[Dict[str, object]], kind: str) -> Optional[Run]:
+    """Model comparison / matrix summary CSVs and matrix details JSONL."""
+    key = next((key for key in MODEL_FIELDS if rows and key in rows[0]), None)
+    if key is None:
+        return None
+    run = Run(kind)
+    for row in rows:
+        if 'item_prompt' in row:
+            run.add_response(row[key], row, row.get('prompt'))
+        else:
+            run.add_metrics(row[key], _numeric_fields(row), row.get('provider'), row.get('prompt'),
+                            row.get('dataset'))
+    return run
+
+def _read_csv(path: str) -> List[Dict[str, object]]:
+    with open(path, 'r', newline='') as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        for key, value in row.items():
+            try:
+                row[key] = float(value)
+            except (TypeError, ValueError):
+                row[key] = value if value != '' else None
+    return rows
+
+def parse_results_file(path: str) -> Optional[Run]:
+    """Normalize a results file, or None when its format is not recognized."""
+    try:
+        if path.endswith('.csv'):
+            return _parse_rows(_read_csv(path), 'comparison_csv')
+        with open(path, 'r') as f:
+            if path.endswith('.jsonl'):
+                return _parse_rows([json.loads(line) for line in f if line.strip()], 'matrix_details')
+            return _parse_json(path, json.load(f))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ResultsWarehouse:
+    """SQLite store of evaluation runs with the ingestion and comparison queries."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or WAREHOUSE_PATH
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ingest_file(self, path: str) -> Optional[int]:
+        """Ingest one file if it is new or changed; returns the new run id."""
+        path = os.path.normpath(path)
+        stat = os.stat(path)
+        known = self.connection.execute('SELECT size, mtime, sha256 FROM files WHERE path = ?', (path,)).fetchone()
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime:
+            return None
+        sha256 = _file_digest(path)
+        now = datetime.now().isoformat()
+        if known and known[2] == sha256:
+            self.connection.execute('UPDATE files SET size = ?, mtime = ? WHERE path = ?',
+                                    (stat.st_size, stat.st_mtime, path))
+            self.connection.commit()
+            return None
+        duplicate = self.connection.execute('SELECT run_id FROM runs WHERE sha256 = ?', (sha256,)).fetchone()
+        run = None if duplicate else parse_results_file(path)
+        run_id = duplicate[0] if duplicate else None
+        with self.connection:
+            if run is not None:
+                timestamp = run.timestamp
+                if not timestamp:
+                    match = _TIMESTAMP.search(os.path.basename(path))
+                    timestamp = match.group(0) if match else datetime.fromtimestamp(stat.st_mtime).isoformat()
+                run_id = self.connection.execute(
+                    'INSERT INTO runs (source, kind, timestamp, sha256, ingested_at) VALUES (?, ?, ?, ?, ?)',
+                    (path, run.kind, timestamp, sha256, now)).lastrowid
+                self.connection.executemany('INSERT INTO model_metrics VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                            [(run_id, *row) for row in run.metrics])
+                for response, values in run.responses:
+                    response_id = self.connection.execute(
+                        'INSERT INTO responses (run_id, model, prompt_task, prompt, expected, response, error) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)', (run_id, *response)).lastrowid
+                    self.connection.executemany('INSERT INTO response_metrics VALUES (?, ?, ?)',
+                                                [(response_id, metric, value) for metric, value in values])
+            status = 'ingested' if run is not None else ('duplicate' if duplicate else 'unrecognized')
+            self.connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                    (path, stat.st_size, stat.st_mtime, sha256, run_id, status, now))
+        return run_id if run is not None else None
+
+    def ingest(self, patterns: Sequence[str] = DEFAULT_PATTERNS) -> List[int]:
+        """Ingest every new or changed file matching `patterns`."""
+        paths = sorted({p for pattern in patterns for p in glob.glob(pattern, recursive=True)
+                        if os.path.isfile(p) and os.path.abspath(p) != os.path.abspath(self.path)})
+        return [run_id for run_id in map(self.ingest_file, paths) if run_id is not None]
+
+    def watch(self, patterns: Sequence[str] = DEFAULT_PATTERNS, interval: float = 10.0) -> None:
+        """Ingest new files every `interval` seconds until interrupted."""
+        print(f"Watching {', '.join(patterns)} every {interval:g}s (Ctrl-C to stop)")
+        try:
+            while True:
+                added = self.ingest(patterns)
+                if added:
+                    print(f"{datetime.now():%H:%M:%S} ingested {len(added)} new run(s)")
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+    def query(self, sql: str, params: Sequence[object] = ()) -> pd.DataFrame:
+        return pd.read_sql_query(sql, self.connection, params=list(params))
+
+    def runs(self) -> pd.DataFrame:
+        return self.query("""
+            SELECT r.run_id, r.timestamp, r.kind, r.source,
+                   (SELECT COUNT(DISTINCT model) FROM model_metrics m WHERE m.run_id = r.run_id) AS models,
+                   (SELECT COUNT(*) FROM responses s WHERE s.run_id = r.run_id) AS responses
+            FROM runs r ORDER BY r.timestamp""")
+
+    def metric_history(self, metric: str, models: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Every recorded value of `metric`, oldest first."""
+        sql = """SELECT r.timestamp, r.run_id, m.model, m.provider, m.prompt_task, m.dataset, m.value
+                 FROM model_metrics m JOIN runs r USING (run_id) WHERE m.metric = ?"""
+        params: List[object] = [metric]
+        if models:
+            sql += f" AND m.model IN ({', '.join('?' * len(models))})"
+            params.extend(models)
+        return self.query(sql + ' ORDER BY r.timestamp', params)
+
+    def compare(self, metric: str, models: Optional[Sequence[str]] = None, last: Optional[int] = None) -> pd.DataFrame:
+        """Models (x prompt template x dataset) as rows, runs as columns, for one metric."""
+        history = self.metric_history(metric, models)
+        if history.empty:
+            return history
+        history = history.fillna({'prompt_task': '', 'dataset': ''})
+        history['run'] = history['timestamp'].str[:19] + ' #' + history['run_id'].astype(str)
+        table = history.pivot_table(index=['model', 'prompt_task', 'dataset'], columns='run', values='value',
+                                    aggfunc='mean')
+        return table.iloc[:, -last:] if last else table
+
+    def regressions(self, metric: str, threshold: float = 0.0, lower_is_better: bool = False) -> pd.DataFrame:
+        """Models whose latest value of `metric` is worse than their previous run by more than `threshold`."""
+        sign = -1 if lower_is_better else 1
+        return self.query("""
+            WITH ordered AS (
+                SELECT m.model, IFNULL(m.prompt_task, '') AS prompt_task, IFNULL(m.dataset, '') AS dataset,
+                       r.run_id, r.timestamp, AVG(m.value) AS value
+                FROM model_metrics m JOIN runs r USING (run_id)
+                WHERE m.metric = ?
+                GROUP BY m.model, prompt_task, dataset, r.run_id
+            ), paired AS (
+                SELECT *, LAG(value) OVER w AS previous, LAG(run_id) OVER w AS previous_run,
+                       ROW_NUMBER() OVER (PARTITION BY model, prompt_task, dataset ORDER BY timestamp DESC) AS recency
+                FROM ordered
+                WINDOW w AS (PARTITION BY model, prompt_task, dataset ORDER BY timestamp)
+            )
+            SELECT model, prompt_task, dataset, previous_run, run_id, timestamp, previous, value,
+                   value - previous AS change
+            FROM paired
+            WHERE recency = 1 AND previous IS NOT NULL AND ? * (value - previous) < -?
+            ORDER BY ? * (value - previous)""", (metric, sign, threshold, sign))
+
+    def prompt_regressions(self, metric: str, model: str, threshold: float = 0.0,
+                           lower_is_better: bool = False) -> pd.DataFrame:
+        """Prompts whose `metric` for `model` got worse between its two latest runs of the same kind."""
+        runs = self.connection.execute(
+            """SELECT DISTINCT r.run_id, r.timestamp, r.kind FROM responses s JOIN runs r USING (run_id)
+               WHERE s.model = ? ORDER BY r.timestamp DESC""", (model,)).fetchall()
+        # Evaluators score prompts differently under the same name, so only compare like with like
+        run_ids = [run_id for run_id, _, kind in runs if kind == runs[0][2]][:2] if runs else []
+        if len(run_ids) < 2:
+            return pd.DataFrame()
+        sign = -1 if lower_is_better else 1
+        return self.query("""
+            WITH scores AS (
+                SELECT s.run_id, s.prompt, AVG(v.value) AS value, MAX(s.response) AS response
+                FROM responses s JOIN response_metrics v USING (response_id)
+                WHERE s.model = ? AND v.metric = ? AND s.run_id IN (?, ?)
+                GROUP BY s.run_id, s.prompt
+            )
+            SELECT new.prompt, old.value AS previous, new.value, new.value - old.value AS change,
+                   old.response AS previous_response, new.response
+            FROM scores new JOIN scores old ON old.prompt = new.prompt AND old.run_id = ? AND new.run_id = ?
+            WHERE ? * (new.value - old.value) < -?
+            ORDER BY ? * (new.value - old.value)""",
+            (model, metric, run_ids[0], run_ids[1], run_ids[1], run_ids[0], sign, threshold, sign))
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Collect evaluation results into a SQLite warehouse and compare runs.')
+    parser.add_argument('--db', default=WAREHOUSE_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('ingest', 'watch'):
+        command = commands.add_parser(name)
+        command.add_argument('patterns', nargs='*', default=list(DEFAULT_PATTERNS))
+        if name == 'watch':
+            command.add_argument('--interval', type=float, default=10.0)
+    commands.add_parser('runs')
+    compare = commands.add_parser('compare')
+    compare.add_argument('--metric', required=True)
+    compare.add_argument('--model', action='append', default=None)
+    compare.add_argument('--last', type=int, default=None, help='Only the last N runs')
+    regressions = commands.add_parser('regressions')
+    regressions.add_argument('--metric', required=True)
+    regressions.add_argument('--model', default=None, help='Compare per prompt for this model')
+    regressions.add_argument('--threshold', type=float, default=0.0)
+    regressions.add_argument('--lower-is-better', action='store_true')
+    args = parser.parse_args()
+
+    with ResultsWarehouse(args.db) as warehouse, \
+            pd.option_context('display.max_columns', None, 'display.width', 200, 'display.max_colwidth', 60):
+        if args.command == 'ingest':
+            print(f"Ingested {len(warehouse.ingest(args.patterns))} new run(s) into {args.db}")
+        elif args.command == 'watch':
+            warehouse.watch(args.patterns, args.interval)
+        elif args.command == 'runs':
+            print(warehouse.runs().to_string(index=False))
+        elif args.command == 'compare':
+            print(warehouse.compare(args.metric, args.model, args.last).to_string(float_format=lambda v: f'{v:.4f}'))
+        elif args.model:
+            print(warehouse.prompt_regressions(args.metric, args.model, args.threshold,
+                                               args.lower_is_better).to_string(index=False))
+        else:
+            print(warehouse.regressions(args.metric, args.threshold, args.lower_is_better).to_string(index=False))
@@ -1,18 +1,16 @@
 import os
 import json
 import pandas as pd
-from openai import OpenAI
 from pathlib import Path
 import numpy as np
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer, util
-import torch
 
-# Initialize OpenAI client with API key and organization
-client = OpenAI(
-    api_key=os.environ.get('OAI_key'),
-    organization=os.environ.get('OAI_organization_id')
-)
+from src.evaluation.clients import get_openai_client
+from src.evaluation.embedding_backends import embedding_info
+from src.evaluation.similarity_tiers import TieredSimilarity, similarity_averages
+from src.utils.call_metrics import CallMetrics
+from src.utils.prompt_templates import build_messages
+from src.utils.retry_policy import DEFAULT_RETRY_POLICY
 
 def load_evaluation_data():
     """Load the evaluation dataset."""
@@ -22,48 +20,36 @@ def load_evaluation_data():
             data.append(json.loads(line))
     return data
 
-def calculate_semantic_similarity(pred, target):
-    """Calculate semantic similarity between prediction and target."""
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-
-    # Encode texts to get their embeddings
-    embedding1 = model.encode(pred, convert_to_tensor=True)
-    embedding2 = model.encode(target, convert_to_tensor=True)
-
-    # Calculate cosine similarity
-    similarity = util.pytorch_cos_sim(embedding1, embedding2)
-    return float(similarity[0][0])
-
-def evaluate_model(model_name, evaluation_data, output_file):
-    """Evaluate a model on the test data."""
+def evaluate_model(model_name, evaluation_data, output_file, call_metrics=None):
+    """Evaluate a model on the test data, recording each call in `call_metrics`."""
+    call_metrics = call_metrics or CallMetrics()
+    client = get_openai_client()
     results = []
 
     print(f"\nEvaluating model: {model_name}")
     for item in tqdm(evaluation_data):
         try:
-            # Get model completion
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": "You analyze Scratch projects and describe their structure."},
-                    {"role": "user", "content": item["prompt"]}
-                ],
-                temperature=0.7,
-                max_tokens=150
-            )
-
-            prediction = response.choices[0].message.content
-
-            # Calculate metrics
+            with call_metrics.call('openai', model_name, evaluator='run_model_evaluation') as call:
+                # Get model completion
+                response = DEFAULT_RETRY_POLICY.call(
+                    client.chat.completions.create,
+                    model=model_name,
+                    messages=build_messages('scratch_analyze', item["prompt"]),
+                    temperature=0.7,
+                    max_tokens=150
+                )
+
+                prediction = response.choices[0].message.content
+                call.set_usage(response.usage)
+                call.responded()
+
             exact_match = prediction.strip() == item["completion"].strip()
-            semantic_sim = calculate_semantic_similarity(prediction, item["completion"])
 
             results.append({
                 "prompt": item["prompt"],
                 "target": item["completion"],
                 "prediction": prediction,
-                "exact_match": exact_match,
-                "semantic_similarity": semantic_sim
+                "exact_match": exact_match
             })
 
         except Exception as e:
@@ -71,12 +57,25 @@ def evaluate_model(model_name, evaluation_data, output_file):
             print(f"Error: {str(e)}")
             continue
 
+    # Score similarity in one batch; only pairs the lexical tiers cannot settle are embedded
+    scorer = TieredSimilarity()
+    scores = scorer.score_many([(r["prediction"], r["target"]) for r in results])
+    for result, match in zip(results, scores):
+        result["similarity"] = match.score
+        result["semantic_similarity"] = match.semantic
+        result["lexical_similarity"] = match.lexical
+        result["similarity_tier"] = match.tier
+    scorer.report()
+
     # Calculate overall metrics
     metrics = {
         "model_name": model_name,
         "total_evaluated": len(results),
         "exact_match_accuracy": np.mean([r["exact_match"] for r in results]),
-        "avg_semantic_similarity": np.mean([r["semantic_similarity"] for r in results])
+        # Over all scored pairs; the semantic and lexical means cover only the pairs that have them
+        **{f"avg_{key}": value for key, value in similarity_averages(scores).items()},
+        **{f"similarity_{key}": value for key, value in scorer.summary().items()},
+        **embedding_info(scorer.backend)
     }
 
     # Save detailed results
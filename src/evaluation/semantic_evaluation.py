@@ -1,6 +1,5 @@
 import os
 import json
-from openai import OpenAI
 from datetime import datetime
 import random
 import time
@@ -10,6 +9,13 @@ import numpy as np
 from collections import defaultdict
 from tqdm import tqdm
 
+from src.evaluation.clients import get_openai_client
+from src.utils.call_metrics import CallMetrics
+from src.utils.completion_format import check_format, extract_sprites
+from src.utils.prompt_templates import PromptCacheStats, build_messages
+from src.utils.retry_policy import DEFAULT_RETRY_POLICY
+from src.utils.streaming import stream_openai_chat, summarize_streams
+
 def calculate_semantic_similarity(str1, str2):
     """Calculate semantic similarity between two strings using SequenceMatcher."""
     return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
@@ -18,15 +24,6 @@ def normalize_sprite_name(name):
     """Normalize sprite names for comparison."""
     return name.lower().strip().replace('-', ' ').replace('_', ' ')
 
-def extract_sprites(text):
-    """Extract sprite names from the text while handling various formats."""
-    sprites = []
-    for line in text.split('\n'):
-        if 'sprite:' in line.lower():
-            sprite = line.split('sprite:', 1)[1].strip()
-            sprites.append(sprite)
-    return sprites
-
 def evaluate_response(response, expected):
     """Evaluate a model response using multiple semantic similarity metrics."""
     response_sprites = extract_sprites(response)
@@ -73,62 +70,56 @@ def evaluate_response(response, expected):
 
     return metrics
 
-def evaluate_model(client, model_name, model_id, test_data):
-    """Evaluate a model using semantic similarity metrics."""
+def evaluate_model(client, model_name, model_id, test_data, stream=False, call_metrics=None, retry_policy=None):
+    """Evaluate a model using semantic similarity metrics.
+
+    With `stream`, the completion is validated as it streams in and generation is
+    cancelled as soon as the format can no longer be valid; such responses are
+    marked `aborted`, fail the format check and get no content metrics. Every call is recorded in
+    `call_metrics` (a CallMetrics; one writing to CALL_METRICS_PATH by default).
+    Failed requests are retried by `retry_policy` (the shared default policy).
+    """
     print(f'\nEvaluating {model_name} ({model_id})...')
     results = []
+    streams = []
+    call_metrics = call_metrics or CallMetrics()
+    retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+    prompt_cache = PromptCacheStats('scratch_format')
 
     # Add progress bar
     pbar = tqdm(test_data, desc=f'Evaluating {model_name}')
     for test_item in pbar:
         try:
-            messages = [
-                {
-                    'role': 'system',
-                    'content': '''You are an AI assistant that understands Scratch projects and can describe their structure.
-Format Rules:
-1. Start with exactly " blocks:" (note the leading space)
-2. List each sprite on a new line
-3. Each sprite line must start with "sprite: "
-4. No extra text or explanations'''
-                },
-                {
-                    'role': 'user',
-                    'content': test_item['prompt']
-                }
-            ]
-
-            # Retry logic with exponential backoff
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
+            messages = build_messages('scratch_format', test_item['prompt'])
+
+            with call_metrics.call('openai', model_id, evaluator='semantic_evaluation') as call:
+                def request():
+                    if stream:
+                        streamed = stream_openai_chat(client, model_id, messages, temperature=0, timeout=30)
+                        prompt_cache.record(messages, streamed['usage'])
+                        call.set_stream(streamed)
+                        return streamed['text'], streamed
                     completion = client.chat.completions.create(
                         model=model_id,
                         messages=messages,
                         temperature=0,
-                        request_timeout=30  # Add timeout
+                        timeout=30
                     )
-                    response = completion.choices[0].message.content.strip()
-                    break
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        raise
-                    pbar.write(f'Attempt {attempt + 1} failed, retrying...')
-                    time.sleep(2 ** attempt)
+                    prompt_cache.record(messages, getattr(completion, 'usage', None))
+                    call.set_usage(getattr(completion, 'usage', None))
+                    return completion.choices[0].message.content, None
+
+                raw_response, streamed = retry_policy.call(request)
+                response = raw_response.strip()
+                call.responded()
 
             expected = test_item['completion'].strip()
 
-            # Evaluate response using semantic metrics
-            metrics = evaluate_response(response, expected)
+            # Evaluate response using semantic metrics; truncated text would understate them
+            metrics = None if stream and streamed['aborted'] else evaluate_response(response, expected)
 
-            # Format validation
-            format_check = {
-                'space_prefix': response.startswith(' blocks:'),
-                'blocks_header': ' blocks:' in response,
-                'sprite_format': all(line.startswith('sprite: ')
-                                   for line in response.split('\n')[1:] if line.strip()),
-                'newline_after_header': 'blocks:\n' in response
-            }
+            # Format validation (before stripping, so the leading space is checked)
+            format_check = streamed['parser'].format_check() if stream else check_format(raw_response)
 
             result = {
                 'prompt': test_item['prompt'],
@@ -137,10 +128,15 @@ Format Rules:
                 'metrics': metrics,
                 'format_check': format_check
             }
+            if stream:
+                result['stream'] = {key: streamed[key] for key in
+                                    ('aborted', 'format_error', 'ttft', 'elapsed', 'output_tokens', 'tokens_per_second')}
+                streams.append(streamed)
             results.append(result)
 
             # Update progress bar description with current metrics
-            pbar.set_description(f'{model_name} - Semantic Sim: {metrics["semantic_similarity"]:.2%}')
+            if metrics is not None:
+                pbar.set_description(f'{model_name} - Semantic Sim: {metrics["semantic_similarity"]:.2%}')
 
         except Exception as e:
             pbar.write(f'Error evaluating prompt {test_item["prompt"]}: {str(e)}')
@@ -151,34 +147,42 @@ Format Rules:
 
     # Calculate aggregate metrics
     valid_results = [r for r in results if 'error' not in r]
-    if valid_results:
+    scored_results = [r for r in valid_results if r['metrics'] is not None]
+    if scored_results:
         aggregates = {
-            'exact_match_avg': np.mean([r['metrics']['exact_match'] for r in valid_results]),
-            'semantic_similarity_avg': np.mean([r['metrics']['semantic_similarity'] for r in valid_results]),
-            'partial_match_avg': np.mean([r['metrics']['partial_match'] for r in valid_results]),
-            'order_similarity_avg': np.mean([r['metrics']['order_similarity'] for r in valid_results]),
-            'format_accuracy': np.mean([all(r['format_check'].values()) for r in valid_results])
+            'exact_match_avg': np.mean([r['metrics']['exact_match'] for r in scored_results]),
+            'semantic_similarity_avg': np.mean([r['metrics']['semantic_similarity'] for r in scored_results]),
+            'partial_match_avg': np.mean([r['metrics']['partial_match'] for r in scored_results]),
+            'order_similarity_avg': np.mean([r['metrics']['order_similarity'] for r in scored_results]),
+            # Aborted streams count here, as format failures
+            'format_accuracy': np.mean([all(r['format_check'].values()) and not r.get('stream', {}).get('aborted')
+                                        for r in valid_results])
         }
     else:
         aggregates = {metric: 0.0 for metric in ['exact_match_avg', 'semantic_similarity_avg',
                                                 'partial_match_avg', 'order_similarity_avg',
                                                 'format_accuracy']}
+    prompt_cache.report()
 
-    return {
+    evaluation = {
         'model': model_name,
         'model_id': model_id,
         'results': results,
-        'aggregates': aggregates
+        'aggregates': aggregates,
+        'prompt_cache': prompt_cache.summary()
     }
-
-def main():
+    if stream:
+        evaluation['streaming'] = summarize_streams(streams)
+        summary = evaluation['streaming']
+        print(f"Streaming: {summary['aborted']}/{summary['calls']} aborted on format, "
+              f"avg TTFT {summary['ttft_avg'] or 0:.2f}s, {summary['tokens_per_second_avg'] or 0:.1f} tokens/s")
+    return evaluation
+
+def main(stream=False):
     """Main evaluation function with parallel processing."""
     try:
         print('Initializing OpenAI client...')
-        client = OpenAI(
-            api_key=os.environ['OAI_key'],
-            organization=os.environ['OAI_organization_id']
-        )
+        client = get_openai_client()
 
         # Load test data
         print('Loading test data...')
@@ -201,7 +205,7 @@ def main():
         results = []
         for name, model_id in models.items():
             try:
-                result = evaluate_model(client, name, model_id, test_data)
+                result = evaluate_model(client, name, model_id, test_data, stream=stream)
                 results.append(result)
                 print(f'\nCompleted evaluation of {name}')
             except Exception as e:
@@ -232,5 +236,11 @@ def main():
         print(f'Error during evaluation: {str(e)}')
 
 if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Semantic evaluation of fine-tuned models.')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream completions and stop each one at its first format error')
+    args = parser.parse_args()
     print('Starting semantic evaluation of fine-tuned models...')
-    main()
+    main(stream=args.stream)
@@ -0,0 +1,134 @@
+"""Tiered similarity scoring: cheap checks first, embeddings only when unsure.
+
+Each pair goes through the tiers in order and stops at the first that decides:
+
+1. exact: identical after stripping surrounding whitespace (semantic 1.0)
+2. normalized: identical after lowercasing and collapsing whitespace (1.0)
+3. lexical: the character n-gram cosine is below `low` (clearly different) or
+   at least `high` (near-identical)
+4. embedding: everything in between gets the MiniLM embedding similarity
+   (src.evaluation.embedding_backends)
+
+The n-gram cosine is on a different scale from the embedding cosine, so a pair
+settled by a lexical tier has no semantic score: its cosine is reported as
+`lexical` and the tier names the decision. An average of `semantic` alone
+would drop the clearly different and near-identical pairs and be biased, so
+`Similarity.score` gives every pair one value (the semantic score, else the
+lexical cosine) and `similarity_averages` reports that combined mean over all
+pairs next to the separate semantic and lexical means.
+
+The scorer counts how many pairs each tier settled, so the share of pairs that
+needed the transformer is visible in every run.
+"""
+import collections
+import math
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+TIERS = ('exact', 'normalized', 'lexical_low', 'lexical_high', 'embedding')
+
+class Similarity(NamedTuple):
+    """Outcome for one pair: `semantic` is None when a lexical tier decided it."""
+
+    semantic: Optional[float]
+    tier: str
+    lexical: Optional[float] = None
+
+    @property
+    def score(self) -> float:
+        """The semantic score, or the lexical cosine for a lexically settled pair."""
+        return self.semantic if self.semantic is not None else self.lexical
+
+def normalize(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+def char_ngrams(text: str, n: int = 3) -> collections.Counter:
+    padded = f' {text} '
+    return collections.Counter(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+
+def ngram_cosine(a: str, b: str, n: int = 3) -> float:
+    """Cosine similarity of character n-gram counts."""
+    grams_a, grams_b = char_ngrams(a, n), char_ngrams(b, n)
+    if len(grams_a) > len(grams_b):
+        grams_a, grams_b = grams_b, grams_a
+    dot = sum(count * grams_b[gram] for gram, count in grams_a.items())
+    norm = math.sqrt(sum(c * c for c in grams_a.values())) * math.sqrt(sum(c * c for c in grams_b.values()))
+    return dot / norm if norm else 0.0
+
+def _mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+def similarity_averages(results: Sequence[Similarity]) -> Dict[str, Optional[float]]:
+    """Combined mean over all pairs, and the semantic and lexical means over the pairs that have them."""
+    return {'similarity': _mean([r.score for r in results]),
+            'semantic_similarity': _mean([r.semantic for r in results if r.semantic is not None]),
+            'lexical_similarity': _mean([r.lexical for r in results if r.lexical is not None])}
+
+class TieredSimilarity:
+    """Similarity scorer that reaches for the embedding model only in the uncertain band.
+
+    Thread-safe. `score` handles one pair; `score_many` settles what it can
+    lexically and embeds the remaining pairs in one batch.
+    """
+
+    def __init__(self, low: float = 0.2, high: float = 0.9, n: int = 3, backend: Optional[str] = None):
+        self.low = low
+        self.high = high
+        self.n = n
+        self.backend = backend
+        self.counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _lexical(self, a: str, b: str) -> Optional[Similarity]:
+        """The result when a cheap tier decides, None when the pair needs embedding."""
+        if a.strip() == b.strip():
+            return Similarity(1.0, 'exact')
+        a, b = normalize(a), normalize(b)
+        if a == b:
+            return Similarity(1.0, 'normalized')
+        cosine = ngram_cosine(a, b, self.n)
+        if cosine < self.low:
+            return Similarity(None, 'lexical_low', cosine)
+        if cosine >= self.high:
+            return Similarity(None, 'lexical_high', cosine)
+        return None
+
+    def _count(self, tiers: Sequence[str]) -> None:
+        with self._lock:
+            self.counts.update(tiers)
+
+    def score(self, a: str, b: str) -> Similarity:
+        """Score one pair."""
+        result = self._lexical(a, b)
+        if result is None:
+            from src.evaluation.embedding_backends import semantic_similarity
+            result = Similarity(semantic_similarity(a, b, self.backend), 'embedding')
+        self._count([result.tier])
+        return result
+
+    def score_many(self, pairs: Sequence[Tuple[str, str]]) -> List[Similarity]:
+        """Score all pairs, embedding the undecided ones in a single batch."""
+        results = [self._lexical(a, b) for a, b in pairs]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            from src.evaluation.embedding_backends import pairwise_similarity
+            scores = pairwise_similarity([pairs[i][0] for i in pending], [pairs[i][1] for i in pending],
+                                         self.backend)
+            for i, score in zip(pending, scores):
+                results[i] = Similarity(float(score), 'embedding')
+        self._count([result.tier for result in results])
+        return results
+
+    def summary(self) -> Dict[str, object]:
+        """Pairs scored and the share settled by each tier."""
+        with self._lock:
+            total = sum(self.counts.values())
+            return {'pairs': total,
+                    **{f'{tier}_rate': self.counts[tier] / total if total else 0.0 for tier in TIERS}}
+
+    def report(self) -> None:
+        summary = self.summary()
+        if not summary['pairs']:
+            return
+        rates = ', '.join(f"{tier} {summary[f'{tier}_rate']:.0%}" for tier in TIERS)
+        print(f"Similarity tiers over {summary['pairs']} pairs: {rates}")
@@ -2,6 +2,9 @@ import json
 import openai
 from openai import OpenAI
 
+from src.utils.completion_format import format_project_completion
+from src.utils.prompt_templates import build_messages
+
 # Load the sampled projects
 with open('sampled_projects.json', 'r') as f:
     sampled_projects = json.load(f)
@@ -10,14 +13,12 @@ with open('sampled_projects.json', 'r') as f:
 def prepare_dataset(projects):
     conversations = []
     for project in projects:
-        messages = [
-            {"role": "system", "content": "You are a helpful assistant that understands Scratch projects and can describe their structure."},
-            {"role": "user", "content": f"Describe the structure of this Scratch project with ID {project['project_id']}."},
-            {"role": "assistant", "content": f"This Scratch project with ID {project['project_id']} contains the following blocks:\n"}
-        ]
-        for block in project['blocks']:
-            block_description = f"- Block: {block['name']} (Type: {block['type']}, Position: x={block['x']}, y={block['y']}, z={block['z']})\n"
-            messages[-1]["content"] += block_description
+        # Block lines use the compact completion grammar, grouped by sprite
+        messages = build_messages(
+            'scratch_structure',
+            f"Describe the structure of this Scratch project with ID {project['project_id']}.",
+            format_project_completion(project['blocks']),
+        )
         conversations.append({"messages": messages})
     return conversations
 
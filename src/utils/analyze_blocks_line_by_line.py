@@ -1,67 +1,57 @@
-import csv
+from array import array
 from collections import Counter
 import json
 
-# Increase the field size limit
-csv.field_size_limit(1000000)  # Set to a larger value, e.g., 1 million
+from src.utils.block_records import ROW_WIDTH, OpcodeVocabulary, StructureHistogram, iter_projects
+from src.utils.scratch_csv import iter_csv_rows, new_read_stats, report_read_stats
 
-def read_csv_line_by_line(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        csv_reader = csv.reader(file)
-        for row in csv_reader:
-            yield row
+STRUCTURE_REPORT_LIMIT = 1000
 
 def analyze_blocks(file_path):
-    block_types = Counter()
-    project_structures = Counter()
-    current_project = None
-    current_project_blocks = set()
+    vocabulary = OpcodeVocabulary()
+    opcode_totals = array('Q')
+    project_structures = StructureHistogram()
+    stats = new_read_stats(file_path)
 
-    for row in read_csv_line_by_line(file_path):
-        try:
-            project_id, _, _, _, _, _, _, opcode, *params = row + [None] * (11 - len(row))
+    rows = iter_csv_rows(file_path, ROW_WIDTH, stats)
+    for project in iter_projects(rows, vocabulary, opcode_totals=opcode_totals):
+        if project.opcode_bits:
+            project_structures.add(project.opcode_bits)
+    report_read_stats(stats)
 
-            if current_project != project_id:
-                if current_project is not None:
-                    project_structures[tuple(sorted(current_project_blocks))] += 1
-                current_project = project_id
-                current_project_blocks = set()
-
-            if opcode:
-                block_types[opcode] += 1
-                current_project_blocks.add(opcode)
-
-        except Exception as e:
-            print(f"Error processing row: {e}")
-            continue
-
-    # Add the last project's structure
-    if current_project_blocks:
-        project_structures[tuple(sorted(current_project_blocks))] += 1
-
-    return block_types, project_structures
+    block_types = Counter({vocabulary.opcodes[i]: count for i, count in enumerate(opcode_totals) if count})
+    return block_types, project_structures, vocabulary
 
 def print_top_n(counter, n=10):
     for item, count in counter.most_common(n):
         print(f"{item}: {count}")
 
-if __name__ == "__main__":
-    file_path = "/home/ubuntu/keto_app_clone/keto_app/allBlocks.csv"
+def print_top_structures(project_structures, vocabulary, n=10):
+    for _, opcodes, count in project_structures.most_common(vocabulary, n):
+        print(f"{tuple(opcodes)}: {count}")
 
+def main(file_path, output_path="block_analysis_results.json"):
     print("Analyzing blocks...")
-    block_types, project_structures = analyze_blocks(file_path)
+    block_types, project_structures, vocabulary = analyze_blocks(file_path)
 
     print("\nTop 10 most common block types:")
     print_top_n(block_types)
 
     print("\nTop 10 most common project structures:")
-    print_top_n(project_structures)
+    print_top_structures(project_structures, vocabulary)
 
     # Save results to a file
-    with open("block_analysis_results.json", "w") as f:
+    with open(output_path, "w") as f:
         json.dump({
             "block_types": dict(block_types),
-            "project_structures": {str(k): v for k, v in project_structures.items()}
+            "opcode_vocabulary": vocabulary.opcodes,
+            # Only the most common structures are decoded and written out
+            "project_structures": project_structures.to_json(vocabulary, STRUCTURE_REPORT_LIMIT)
         }, f, indent=2)
 
-    print("\nAnalysis complete. Results saved to block_analysis_results.json")
+    print(f"\nAnalysis complete. Results saved to {output_path}")
+
+if __name__ == "__main__":
+    import sys
+
+    main(sys.argv[1] if len(sys.argv) > 1 else "/home/ubuntu/keto_app_clone/keto_app/allBlocks.csv")
@@ -3,12 +3,16 @@ import gc
 import sys
 import json
 import traceback
-from typing import Dict, Generator, List, Tuple
+from typing import Dict, Generator, List, Optional, Tuple
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import requests
 from tqdm import tqdm
 
+from src.utils.pipeline_profiler import PipelineProfiler, add_profiler_arguments, profiler_from_args
+from src.utils.scoring_models import count_matrix, get_model, score_record, to_scratch3
+
 def download_file(url: str, file_path: Path, chunk_size: int = 8192) -> bool:
     """Download a file in chunks with progress indication."""
     try:
@@ -32,12 +36,12 @@ def download_file(url: str, file_path: Path, chunk_size: int = 8192) -> bool:
         print(f"Error downloading file: {e}")
         return False
 
-def process_csv_in_chunks(file_path: Path) -> Generator[pd.DataFrame, None, None]:
-    """Process CSV file in chunks, yielding one project at a time."""
-    chunk_size = 1000
-    current_project_rows = []
-    current_project_id = None
+def read_project_chunks(file_path: Path, chunk_size: int = 1000) -> Generator[pd.DataFrame, None, None]:
+    """Read allBlocks.csv in chunks of whole projects.
 
+    The rows of the last project in a chunk are held back and prepended to the next
+    chunk, so a project that straddles a chunk boundary is scored once, in full.
+    """
     csv_params = {
         'chunksize': chunk_size,
         'on_bad_lines': 'skip',
@@ -60,135 +64,75 @@ def process_csv_in_chunks(file_path: Path) -> Generator[pd.DataFrame, None, None
     }
 
     total_rows = 0
+    carry = None
     try:
         for chunk in pd.read_csv(file_path, **csv_params):
             total_rows += len(chunk)
             print(f"\rProcessing row {total_rows:,}", end='')
 
-            # Process each project
-            for project_id, project_group in chunk.groupby('ProjectId'):
-                if pd.notna(project_id):
-                    yield project_group.copy()
+            chunk = chunk[chunk['ProjectId'].notna()]
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            if chunk.empty:
+                continue
+            last_project = chunk['ProjectId'].iloc[-1]
+            is_last = (chunk['ProjectId'] == last_project).to_numpy()
+            carry = chunk[is_last]
+            if not is_last.all():
+                yield chunk[~is_last]
 
             # Clear memory
             del chunk
             gc.collect()
+        if carry is not None and not carry.empty:
+            yield carry
     except Exception as e:
         print(f"\nError processing CSV: {e}")
         traceback.print_exc()
 
+def process_csv_in_chunks(file_path: Path) -> Generator[pd.DataFrame, None, None]:
+    """Process CSV file in chunks, yielding one project at a time."""
+    for chunk in read_project_chunks(file_path):
+        for _, project_group in chunk.groupby('ProjectId', sort=False):
+            yield project_group.copy()
+
+def _opcode_total(matrix: pd.DataFrame, opcodes: List[str]) -> pd.Series:
+    present = [opcode for opcode in opcodes if opcode in matrix.columns]
+    return matrix[present].sum(axis=1) if present else pd.Series(0, index=matrix.index)
+
+def score_chunk(chunk: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+    """Count matrix (opcode counts plus `sprites`) and 'weighted_blocks' score per project."""
+    matrix = count_matrix(chunk)
+    if matrix.empty:
+        return matrix, pd.Series(dtype=int)
+    if 'sprites' not in matrix.columns:
+        matrix['sprites'] = 0
+    scores = pd.Series(np.trunc(get_model('weighted_blocks')(matrix)).astype(int), index=matrix.index)
+    return matrix, scores
+
 def calculate_complexity_score(project_data: pd.DataFrame) -> Tuple[int, Dict[str, int], int]:
     """Calculate complexity score for a project."""
-    block_counts = {}
-    sprite_names = set()
-
-    # Define block weights with higher emphasis on sophisticated features
-    weights = {
-        # Custom blocks (highest weight)
-        'procDef': 50,           # Custom block definition
-        'call': 20,              # Custom block call
-
-        # Control structures
-        'doForever': 15,         # Forever loop
-        'doRepeat': 15,          # Repeat loop
-        'doIf': 15,             # If condition
-        'doIfElse': 15,         # If-else condition
-        'doUntil': 15,          # Repeat until
-
-        # Variables and Lists
-        'setVar:to:': 15,       # Set variable
-        'changeVar:by:': 15,    # Change variable
-        'append:toList:': 15,   # Add to list
-        'deleteLine:ofList:': 15, # Delete from list
-        'insert:at:ofList:': 15,  # Insert into list
-
-        # Events and Broadcasting
-        'broadcast:': 15,        # Send broadcast
-        'whenIReceive': 15,      # Receive broadcast
-
-        # Sensing and Interactions
-        'touching:': 10,         # Touch detection
-        'touchingColor:': 10,    # Color touch detection
-        'keyPressed:': 10,       # Key press detection
-        'mousePressed': 10,      # Mouse click detection
-
-        # Motion and Looks (lower weights)
-        'forward:': 5,
-        'turnRight:': 5,
-        'turnLeft:': 5,
-        'heading:': 5,
-        'pointTowards:': 5,
-        'gotoX:y:': 5,
-        'changeXposBy:': 5,
-        'changeYposBy:': 5,
-        'xpos:': 5,
-        'ypos:': 5
-    }
-
     # Count blocks and sprites
-    for _, row in project_data.iterrows():
-        block_type = row['Block']
-        sprite_name = row['SpriteName']
+    block_counts = {str(k): int(v) for k, v in project_data['Block'].dropna().value_counts().items()}
+    sprite_count = project_data['SpriteName'].dropna().nunique()
 
-        if pd.notna(sprite_name):
-            sprite_names.add(sprite_name)
-
-        if pd.notna(block_type):
-            block_counts[block_type] = block_counts.get(block_type, 0) + 1
-
-    # Calculate base score from weighted blocks
-    score = sum(count * weights.get(block_type, 1)
-               for block_type, count in block_counts.items())
-
-    # Add bonuses for project characteristics
-    sprite_count = len(sprite_names)
-    total_blocks = sum(block_counts.values())
-
-    # Bonus for custom blocks and procedure calls
-    custom_block_count = block_counts.get('procDef', 0)
-    procedure_calls = block_counts.get('call', 0)
-    if custom_block_count > 0:
-        score += custom_block_count * 100  # Major bonus for custom blocks
-        score += procedure_calls * 30      # Bonus for using custom blocks
-
-    # Bonus for varied control structures
-    control_blocks = sum(block_counts.get(block, 0) for block in
-                        ['doForever', 'doRepeat', 'doIf', 'doIfElse', 'doUntil'])
-    if control_blocks > 0:
-        score += control_blocks * 15
-
-    # Bonus for broadcasts and events
-    broadcast_count = (block_counts.get('broadcast:', 0) +
-                      block_counts.get('whenIReceive', 0))
-    if broadcast_count > 0:
-        score += broadcast_count * 20
-
-    # Bonus for sprite interactions
-    interaction_blocks = sum(block_counts.get(block, 0) for block in
-                           ['touching:', 'touchingColor:', 'keyPressed:'])
-    if interaction_blocks > 0:
-        score += interaction_blocks * 15
-
-    # Bonus for multiple sprites
-    if sprite_count > 1:
-        score += sprite_count * 25
-
-    # Bonus for project size and complexity
-    if total_blocks > 50:
-        score += int((total_blocks - 50) * 1.5)
+    # Block weights and bonuses live in the 'weighted_blocks' scoring model
+    score = int(score_record({**block_counts, 'sprites': sprite_count}, 'weighted_blocks'))
 
     return score, block_counts, sprite_count
 
 def format_project_description(project_id: int, complexity_data: Tuple[int, Dict[str, int], int]) -> Dict[str, str]:
     """Format project data for the fine-tuning dataset."""
     score, block_counts, sprite_count = complexity_data
+    # The dataset uses Scratch 2 opcodes; the metrics below are named in Scratch 3
+    block_counts = to_scratch3(block_counts)
 
     # Calculate specific metrics
     custom_blocks = block_counts.get('procedures_definition', 0)
     control_blocks = sum(block_counts.get(block, 0) for block in
                         ['control_if', 'control_if_else', 'control_repeat', 'control_repeat_until', 'control_forever'])
     variables = block_counts.get('data_variable', 0)
-    lists = block_counts.get('data_list', 0)
+    lists = block_counts.get('data_listcontents', 0)
     broadcasts = block_counts.get('event_broadcast', 0)
     stage_interactions = sum(block_counts.get(block, 0) for block in
                            ['sensing_touchingobject', 'sensing_touchingcolor', 'sensing_coloristouchingcolor'])
@@ -204,8 +148,9 @@ def save_project(project_data: Dict[str, str], output_file: Path) -> None:
     with open(output_file, 'a') as f:
         f.write(json.dumps(project_data) + '\n')
 
-def main():
+def main(profiler: Optional[PipelineProfiler] = None):
     """Main function to process the dataset and save complex projects."""
+    profiler = profiler or PipelineProfiler(enabled=False)
     try:
         # Create output directory if it doesn't exist
         os.makedirs('dataset_raw', exist_ok=True)
@@ -228,67 +173,84 @@ def main():
         complex_projects = []
         project_analysis = []
 
-        # Process CSV in chunks
-        for project_id, project_data in process_csv_in_chunks('dataset_raw/allBlocks.csv'):
-            # Calculate complexity score and get block information
-            score, block_counts, sprite_count = calculate_complexity_score(project_data)
+        # Score each chunk's projects in one pass over its count matrix
+        chunks = profiler.iterate('read_and_group', read_project_chunks('dataset_raw/allBlocks.csv'))
+        for chunk in chunks:
+            with profiler.stage('score', rows=len(chunk)):
+                matrix, scores = score_chunk(chunk)
+            if matrix.empty:
+                continue
 
             # Get important metrics
-            custom_block_count = block_counts.get('procDef', 0)
-            procedure_calls = block_counts.get('call', 0)
-            control_blocks = sum(block_counts.get(block, 0) for block in
-                               ['doRepeat', 'doForever', 'doIf', 'doIfElse'])
-            broadcast_count = (block_counts.get('broadcast:', 0) +
-                             block_counts.get('whenIReceive', 0))
-            interaction_blocks = sum(block_counts.get(block, 0) for block in
-                                   ['touching:', 'touchingColor:'])
-            total_blocks = sum(block_counts.values())
+            opcodes = matrix.drop(columns='sprites')
+            custom_blocks = _opcode_total(opcodes, ['procDef'])
+            procedure_calls = _opcode_total(opcodes, ['call'])
+            control_blocks = _opcode_total(opcodes, ['doRepeat', 'doForever', 'doIf', 'doIfElse'])
+            broadcasts = _opcode_total(opcodes, ['broadcast:', 'whenIReceive'])
+            interactions = _opcode_total(opcodes, ['touching:', 'touchingColor:'])
+            total_blocks = opcodes.sum(axis=1)
+            sprite_counts = matrix['sprites']
 
             # Project must meet ALL of these criteria:
-            if (custom_block_count > 0 and          # Must have custom blocks
-                score >= 500 and                    # Minimum complexity score
-                total_blocks >= 100 and             # Minimum block count
-                sprite_count >= 3 and               # Multiple sprites
-                control_blocks >= 5 and             # Must use control structures
-                (broadcast_count > 0 or             # Must have either broadcasts
-                 interaction_blocks > 0)):          # or sprite interactions
+            selected = ((custom_blocks > 0) &          # Must have custom blocks
+                        (scores >= 500) &              # Minimum complexity score
+                        (total_blocks >= 100) &        # Minimum block count
+                        (sprite_counts >= 3) &         # Multiple sprites
+                        (control_blocks >= 5) &        # Must use control structures
+                        ((broadcasts > 0) |            # Must have either broadcasts
+                         (interactions > 0)))          # or sprite interactions
+
+            for project_id in matrix.index[selected.to_numpy()]:
+                score = int(scores[project_id])
+                sprite_count = int(sprite_counts[project_id])
+                counts = opcodes.loc[project_id]
+                block_counts = {opcode: int(count) for opcode, count in counts[counts > 0].items()}
+                custom_block_count = int(custom_blocks[project_id])
+                control_count = int(control_blocks[project_id])
+                broadcast_count = int(broadcasts[project_id])
+                interaction_blocks = int(interactions[project_id])
+                project_total = int(total_blocks[project_id])
 
                 # Format project for the dataset
-                formatted_project = format_project_description(
-                    project_id, (score, block_counts, sprite_count))
+                with profiler.stage('format'):
+                    formatted_project = format_project_description(
+                        project_id, (score, block_counts, sprite_count))
                 complex_projects.append(formatted_project)
 
                 # Save analysis data
                 project_analysis.append({
                     "project_id": project_id,
                     "score": score,
-                    "total_blocks": total_blocks,
+                    "total_blocks": project_total,
                     "sprite_count": sprite_count,
                     "custom_blocks": custom_block_count,
-                    "control_blocks": control_blocks,
+                    "control_blocks": control_count,
                     "broadcasts": broadcast_count,
                     "interactions": interaction_blocks,
-                    "procedure_calls": procedure_calls
+                    "procedure_calls": int(procedure_calls[project_id])
                 })
 
                 # Print progress for significant finds
                 print(f"\nFound complex project {project_id}:")
                 print(f"Score: {score}")
                 print(f"Custom blocks: {custom_block_count}")
-                print(f"Total blocks: {total_blocks}")
+                print(f"Total blocks: {project_total}")
                 print(f"Sprites: {sprite_count}")
-                print(f"Control blocks: {control_blocks}")
+                print(f"Control blocks: {control_count}")
                 print(f"Broadcasts: {broadcast_count}")
                 print(f"Interactions: {interaction_blocks}")
                 print("-" * 50)
 
         # Save results
         print(f"\nSaving {len(complex_projects)} complex projects...")
-        save_project(complex_projects, 'complex_projects_formatted.json')
+        with profiler.stage('write', rows=len(complex_projects) + len(project_analysis)):
+            save_project(complex_projects, 'complex_projects_formatted.json')
 
-        print("Saving project analysis...")
-        with open('project_complexity_analysis.json', 'w') as f:
-            json.dump(project_analysis, f, indent=2)
+            print("Saving project analysis...")
+            with open('project_complexity_analysis.json', 'w') as f:
+                json.dump(project_analysis, f, indent=2)
+        if os.path.exists('dataset_raw/allBlocks.csv'):
+            profiler.stages['read_and_group'].add(bytes=os.path.getsize('dataset_raw/allBlocks.csv'))
 
         print("\nAnalysis complete!")
         print(f"Found {len(complex_projects)} complex projects")
@@ -299,9 +261,12 @@ def main():
     except Exception as e:
         print(f"Error: {str(e)}")
         traceback.print_exc()
+    finally:
+        profiler.report()
 
 if __name__ == "__main__":
-    main()
+    import argparse
 
-if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Find complex projects in the Scratch dataset.")
+    add_profiler_arguments(parser)
+    main(profiler_from_args(parser.parse_args()))
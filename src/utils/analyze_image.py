@@ -1,36 +1,62 @@
 import os
-import openai
-from openai import OpenAI
+import io
+import glob
+import json
+import math
+import hashlib
 import sys
 import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 
-# Set up the OpenAI client
-client = OpenAI()
+from tqdm import tqdm
 
-# Set the API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from src.utils.call_metrics import CallMetrics, current_call
+from src.utils.image_cache import BKTree, ImageAnalysisCache, dhash
+from src.utils.rate_limiter import RateLimiter
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is only needed to downscale images in batch mode
+    Image = None
 
 # Fine-tuned model name
 model_name = "gpt-4o"  # Changed to use the model from the example
 
+PROMPT = "Analyze these Scratch blocks and provide programming advice:"
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+
+_clients = {}
+
+def get_client(base_url=None):
+    """Return a shared OpenAI client, optionally pointed at another endpoint."""
+    if base_url not in _clients:
+        from openai import OpenAI
+
+        from src.evaluation.clients import provider_base_url
+
+        _clients[base_url] = OpenAI(base_url=base_url or provider_base_url('openai'))
+    return _clients[base_url]
+
 def encode_image(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
-def analyze_image(image_path):
-    base64_image = encode_image(image_path)
-
+def request_analysis(image_url, client=None, model=None):
+    """Send one image (as a data URL) to the vision model and return its analysis."""
+    client = client or get_client()
     response = client.chat.completions.create(
-        model=model_name,
+        model=model or model_name,
         messages=[
             {
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": "Analyze these Scratch blocks and provide programming advice:"},
+                    {"type": "text", "text": PROMPT},
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}"
+                            "url": image_url
                         }
                     },
                 ],
@@ -38,17 +64,238 @@ def analyze_image(image_path):
         ],
     )
 
+    if current_call() is not None:
+        current_call().set_usage(response.usage)
     return response.choices[0].message.content
 
-if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        image_path = sys.argv[1]
+def analyze_image(image_path, cache=None):
+    """Analyze one screenshot, reusing a cached analysis of a near-identical image."""
+    if cache is not None:
+        with open(image_path, "rb") as f:
+            phash = dhash(f.read())
+        hit = cache.lookup(phash)
+        if hit is not None:
+            return hit["analysis"]
+    base64_image = encode_image(image_path)
+    analysis = request_analysis(f"data:image/png;base64,{base64_image}")
+    if cache is not None:
+        cache.add(phash, analysis, path=str(image_path))
+    return analysis
+
+def estimate_image_tokens(width, height):
+    """Estimate vision input tokens for a high-detail image (85 + 170 per 512px tile)."""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+def prepare_image(image_path, token_budget=765, image_format="JPEG", quality=85):
+    """Hash an image and re-encode it small enough to fit `token_budget`.
+
+    Returns a dict with the content hash of the original file, a data URL and the
+    estimated token cost. Without Pillow the original bytes are sent unchanged.
+    """
+    with open(image_path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+
+    if Image is None:
+        return {"sha256": digest, "url": f"data:image/png;base64,{base64.b64encode(raw).decode('utf-8')}",
+                "tokens": None, "phash": None}
+
+    with Image.open(io.BytesIO(raw)) as image:
+        image = image.convert("RGB")
+        width, height = image.size
+        # Shrink until the tile count fits the budget (or the image is one tile)
+        while estimate_image_tokens(width, height) > token_budget and max(width, height) > 512:
+            width, height = max(1, int(width * 0.85)), max(1, int(height * 0.85))
+        if (width, height) != image.size:
+            image = image.resize((width, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=quality, optimize=True)
+
+    mime = "jpeg" if image_format.upper() == "JPEG" else image_format.lower()
+    encoded = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    return {"sha256": digest, "url": f"data:image/{mime};base64,{encoded}",
+            "tokens": estimate_image_tokens(width, height), "phash": dhash(raw)}
+
+def find_images(pattern):
+    """Expand a directory, glob pattern or single file into a sorted list of images."""
+    path = Path(pattern)
+    if path.is_dir():
+        return sorted(str(p) for p in path.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    if path.is_file():
+        return [str(path)]
+    return sorted(p for p in glob.glob(pattern, recursive=True) if Path(p).suffix.lower() in IMAGE_SUFFIXES)
+
+def load_finished(output_file):
+    """Analyses already in `output_file`, by content hash, for resuming a batch."""
+    finished = {}
+    if not os.path.exists(output_file):
+        return finished
+    with open(output_file, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:  # a line cut off when the previous run was killed
+                continue
+            if record.get("sha256") and "analysis" in record and "error" not in record:
+                finished[record["sha256"]] = {"analysis": record["analysis"]}
+    return finished
+
+def _record(path, info, analyses, unique):
+    digest = info.get("sha256")
+    record = {"path": path, "sha256": digest, "tokens": info.get("tokens")}
+    if "error" in info:
+        record["error"] = info["error"]
+    else:
+        record.update(analyses[digest])
+        if unique[digest] != path:
+            record["duplicate_of"] = unique[digest]
+    return record
+
+def analyze_batch(pattern, output_file, token_budget=765, prep_workers=None, max_concurrency=8,
+                  requests_per_minute=None, base_url=None, model=None, cache=None, call_metrics=None,
+                  resume=True):
+    """Analyze a directory or glob of screenshots, writing one JSON line per image.
+
+    Images are downscaled in a thread pool, identical files are sent once, and
+    requests run concurrently under the rate limit. With an ImageAnalysisCache,
+    images close to a cached or already-queued image reuse that analysis.
+    Each request, with its rate-limit wait, is recorded in `call_metrics`.
+    Records are appended to `output_file` as analyses finish, and with `resume`
+    images already analyzed there are not sent again; the finished file is
+    rewritten in path order. Returns the number of API calls.
+    """
+    paths = find_images(pattern)
+    if not paths:
+        print(f"No images found for {pattern}")
+        return 0
+    client = get_client(base_url)
+    call_metrics = call_metrics or CallMetrics()
+    limiter = RateLimiter(requests_per_minute, max_concurrency)
+
+    prepared = {}
+    with ThreadPoolExecutor(max_workers=prep_workers) as executor:
+        futures = {executor.submit(prepare_image, path, token_budget): path for path in paths}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Preparing images"):
+            path = futures[future]
+            try:
+                prepared[path] = future.result()
+            except Exception as e:
+                prepared[path] = {"error": str(e)}
+
+    # The first path with a given hash is analyzed; later copies reuse its result
+    unique = {}
+    for path in paths:
+        digest = prepared[path].get("sha256")
+        if digest and digest not in unique:
+            unique[digest] = path
+    print(f"{len(paths)} images, {len(unique)} unique")
+
+    # Skip what a previous run already wrote, then serve near-duplicates from the
+    # cache or from an image already queued in this batch
+    analyses = load_finished(output_file) if resume else {}
+    pending = {digest: path for digest, path in unique.items() if digest not in analyses}
+    if len(pending) < len(unique):
+        print(f"{len(unique) - len(pending)} images already analyzed in {output_file}")
+    to_send = {}
+    if cache is not None:
+        queued = BKTree()
+        for digest, path in pending.items():
+            phash = prepared[path].get("phash")
+            if phash is None:
+                to_send[digest] = path
+                continue
+            hit = cache.lookup(phash)
+            if hit is not None:
+                analyses[digest] = {"analysis": hit["analysis"], "cached_from": hit.get("path"),
+                                    "distance": hit["distance"]}
+                continue
+            near = queued.search(phash, cache.max_distance)
+            if near:
+                analyses[digest] = {"same_as": near[0][1]}
+                continue
+            queued.add(phash, digest)
+            to_send[digest] = path
+        print(f"{len(pending) - len(to_send)} served from the image cache or batch near-duplicates")
     else:
-        print("Please provide an image path as an argument.")
-        sys.exit(1)
+        to_send = pending
+    paths_by_digest = {}
+    for path in paths:
+        paths_by_digest.setdefault(prepared[path].get("sha256"), []).append(path)
+
+    def analyze(path):
+        with call_metrics.call("openai", model or model_name, evaluator="analyze_image",
+                               image_tokens=prepared[path].get("tokens")) as call:
+            call.rate_limit_wait = limiter.acquire()
+            try:
+                analysis = request_analysis(prepared[path]["url"], client, model)
+            finally:
+                limiter.release()
+            call.responded()
+            return analysis
+
+    mode = "a" if resume else "w"
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor, open(output_file, mode) as progress:
+        futures = {executor.submit(analyze, path): digest for digest, path in to_send.items()}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Analyzing images"):
+            digest = futures[future]
+            try:
+                analyses[digest] = {"analysis": future.result()}
+            except Exception as e:
+                analyses[digest] = {"error": str(e)}
+                continue
+            for path in paths_by_digest[digest]:
+                progress.write(json.dumps(_record(path, prepared[path], analyses, unique)) + "\n")
+            progress.flush()
+            if cache is not None and prepared[to_send[digest]].get("phash") is not None:
+                cache.add(prepared[to_send[digest]]["phash"], analyses[digest]["analysis"],
+                          path=to_send[digest], sha256=digest)
+
+    for digest, result in list(analyses.items()):
+        if "same_as" in result:
+            source = result["same_as"]
+            analyses[digest] = {**analyses[source], "near_duplicate_of": unique[source]}
+    if cache is not None:
+        cache.report()
+
+    temporary = f"{output_file}.tmp"
+    with open(temporary, "w") as f:
+        for path in paths:
+            f.write(json.dumps(_record(path, prepared[path], analyses, unique)) + "\n")
+    os.replace(temporary, output_file)
+    print(f"Results saved to {output_file}")
+    return len(to_send)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyze Scratch block screenshots with a vision model.")
+    parser.add_argument("image_path", help="An image, a directory or a glob pattern (with --batch)")
+    parser.add_argument("--batch", action="store_true", help="Analyze every matching image and write JSONL")
+    parser.add_argument("--output", default="image_analysis.jsonl")
+    parser.add_argument("--token-budget", type=int, default=765, help="Target input tokens per image")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=float, default=None, help="Maximum requests per minute")
+    parser.add_argument("--base-url", default=None, help="Alternative API endpoint, e.g. a local stub")
+    parser.add_argument("--cache", default=None, help="JSONL perceptual-hash cache of previous analyses")
+    parser.add_argument("--max-distance", type=int, default=4,
+                        help="Maximum Hamming distance (of 64 bits) for a cache hit")
+    parser.add_argument("--restart", action="store_true",
+                        help="Analyze every image again instead of resuming from --output")
+    args = parser.parse_args()
+    cache = ImageAnalysisCache(args.cache, args.max_distance) if args.cache else None
+
+    if args.batch:
+        analyze_batch(args.image_path, args.output, args.token_budget,
+                      max_concurrency=args.concurrency, requests_per_minute=args.rpm,
+                      base_url=args.base_url, cache=cache, resume=not args.restart)
+        sys.exit(0)
 
     # Analyze the image using the OpenAI API
-    analysis = analyze_image(image_path)
+    analysis = analyze_image(args.image_path, cache)
 
     print("\nAPI Response for Scratch Block Analysis:")
     print(analysis)
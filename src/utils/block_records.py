@@ -0,0 +1,188 @@
+import ast
+import hashlib
+import sys
+from array import array
+from collections import Counter
+from typing import Dict, Generator, Iterable, List, Optional, Tuple
+
+# Column positions in the Scratch 2 allBlocks.csv export
+PROJECT_ID_INDEX = 0
+SPRITE_NAME_INDEX = 4
+SCRIPT_ID_INDEX = 5
+BLOCK_INDEX_INDEX = 6
+OPCODE_INDEX = 7
+ROW_WIDTH = 11
+
+class OpcodeVocabulary:
+    """Maps interned opcode strings to dense integer ids and bitsets."""
+
+    __slots__ = ('_ids', 'opcodes')
+
+    def __init__(self, opcodes: Iterable[str] = ()):
+        self._ids: Dict[str, int] = {}
+        self.opcodes: List[str] = []
+        for opcode in opcodes:
+            self.id_for(opcode)
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def __contains__(self, opcode: str) -> bool:
+        return opcode in self._ids
+
+    def id_for(self, opcode: str) -> int:
+        """Return the id of `opcode`, assigning the next free id if it is new."""
+        opcode_id = self._ids.get(opcode)
+        if opcode_id is None:
+            opcode = sys.intern(opcode)
+            opcode_id = len(self.opcodes)
+            self._ids[opcode] = opcode_id
+            self.opcodes.append(opcode)
+        return opcode_id
+
+    def get(self, opcode: str) -> Optional[int]:
+        """Return the id of `opcode` without growing the vocabulary."""
+        return self._ids.get(opcode)
+
+    def bitset(self, opcodes: Iterable[str]) -> int:
+        """Encode known opcodes as a bitset; unknown opcodes are ignored."""
+        bits = 0
+        for opcode in opcodes:
+            opcode_id = self._ids.get(opcode)
+            if opcode_id is not None:
+                bits |= 1 << opcode_id
+        return bits
+
+    def decode(self, bits: int) -> List[str]:
+        """Return the opcodes set in `bits`, in vocabulary order."""
+        opcodes = []
+        while bits:
+            low = bits & -bits
+            opcodes.append(self.opcodes[low.bit_length() - 1])
+            bits ^= low
+        return opcodes
+
+class Block:
+    """One row of allBlocks.csv with interned strings and an opcode id."""
+
+    __slots__ = ('sprite', 'script_id', 'block_index', 'opcode_id', 'params')
+
+    def __init__(self, sprite, script_id, block_index, opcode_id, params):
+        self.sprite = sprite
+        self.script_id = script_id
+        self.block_index = block_index
+        self.opcode_id = opcode_id
+        self.params = params
+
+class Project:
+    """Per-project aggregate: opcode bitset, block count and sprite names."""
+
+    __slots__ = ('project_id', 'opcode_bits', 'block_count', 'sprites', 'blocks')
+
+    def __init__(self, project_id: str):
+        self.project_id = project_id
+        self.opcode_bits = 0
+        self.block_count = 0
+        self.sprites = set()
+        self.blocks: Optional[List[Block]] = None
+
+    def common_opcode_count(self, bits: int) -> int:
+        """Count distinct opcodes shared with another bitset."""
+        return (self.opcode_bits & bits).bit_count()
+
+def structure_key(bits: int) -> int:
+    """Hash an opcode bitset to a stable 64-bit structure key."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+class StructureHistogram:
+    """Counts project structures by 64-bit key without sorting opcode sets.
+
+    Each distinct key keeps its bitset in a side table; opcode names are only
+    decoded for the structures that end up in a report.
+    """
+
+    __slots__ = ('counts', '_bits')
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self._bits: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, bits: int, count: int = 1) -> int:
+        key = structure_key(bits)
+        if key not in self._bits:
+            self._bits[key] = bits
+        self.counts[key] += count
+        return key
+
+    def bits_for(self, key: int) -> int:
+        return self._bits[key]
+
+    def most_common(self, vocabulary: OpcodeVocabulary, n: Optional[int] = None) -> List[Tuple[int, List[str], int]]:
+        """Return (key, sorted opcodes, count) for the `n` most common structures."""
+        return [(key, sorted(vocabulary.decode(self._bits[key])), count)
+                for key, count in self.counts.most_common(n)]
+
+    def to_json(self, vocabulary: OpcodeVocabulary, n: Optional[int] = None) -> Dict[str, Dict[str, object]]:
+        return {f"{key:016x}": {"count": count, "opcodes": opcodes}
+                for key, opcodes, count in self.most_common(vocabulary, n)}
+
+def iter_reported_structures(analysis_results: Dict[str, object]) -> Generator[Tuple[List[str], int], None, None]:
+    """Yield (opcodes, count) from block_analysis_results.json.
+
+    Accepts the keyed format written by analyze_blocks_line_by_line as well as the
+    older format whose keys are stringified opcode tuples.
+    """
+    for key, value in analysis_results['project_structures'].items():
+        if isinstance(value, dict):
+            yield value['opcodes'], value['count']
+        else:
+            yield list(ast.literal_eval(key)), int(value)
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else None
+
+def iter_projects(rows: Iterable[List[Optional[str]]], vocabulary: OpcodeVocabulary,
+                  keep_blocks: bool = False, opcode_totals: Optional[array] = None) -> Generator[Project, None, None]:
+    """Group consecutive allBlocks.csv rows into Project records.
+
+    Rows for a project are contiguous in the export, so a project is yielded as soon
+    as the next project id appears. Set `keep_blocks` to retain the Block records,
+    and pass an `array('Q')` as `opcode_totals` to count blocks per opcode id.
+    """
+    project = None
+    for row in rows:
+        if len(row) <= OPCODE_INDEX:
+            row = list(row) + [None] * (ROW_WIDTH - len(row))
+        project_id = row[PROJECT_ID_INDEX]
+        if project is None or project.project_id != project_id:
+            if project is not None:
+                yield project
+            project = Project(sys.intern(project_id) if project_id else project_id)
+            if keep_blocks:
+                project.blocks = []
+
+        opcode = row[OPCODE_INDEX]
+        sprite = row[SPRITE_NAME_INDEX]
+        if sprite:
+            project.sprites.add(sys.intern(sprite))
+        if not opcode:
+            continue
+
+        opcode_id = vocabulary.id_for(opcode)
+        project.opcode_bits |= 1 << opcode_id
+        project.block_count += 1
+        if opcode_totals is not None:
+            if opcode_id >= len(opcode_totals):
+                opcode_totals.extend([0] * (opcode_id + 1 - len(opcode_totals)))
+            opcode_totals[opcode_id] += 1
+        if keep_blocks:
+            project.blocks.append(Block(_intern(sprite), row[SCRIPT_ID_INDEX],
+                                        row[BLOCK_INDEX_INDEX], opcode_id,
+                                        tuple(row[OPCODE_INDEX + 1:])))
+
+    if project is not None:
+        yield project
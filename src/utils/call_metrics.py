@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+CALL_METRICS_PATH = os.environ.get('CALL_METRICS_PATH', 'call_metrics.jsonl')
+
+PERCENTILES = (50, 95, 99)
+
+_local = threading.local()
+
+class CallRecord:
+    """Timing and token counts of one model call, including its retries."""
+
+    __slots__ = ('provider', 'model', 'started_at', 'wall_time', 'ttft', 'retries', 'backoff_sleep',
+                 'rate_limit_wait', 'post_process_time', 'input_tokens', 'output_tokens',
+                 'cached_tokens', 'status', 'error', 'extra', '_start', '_responded')
+
+    def __init__(self, provider: str, model: str, **extra):
+        self.provider = provider
+        self.model = model
+        self.started_at = time.time()
+        self.wall_time = None
+        self.ttft = None
+        self.retries = 0
+        self.backoff_sleep = 0.0
+        self.rate_limit_wait = 0.0
+        self.post_process_time = None
+        self.input_tokens = None
+        self.output_tokens = None
+        self.cached_tokens = None
+        self.status = None
+        self.error = None
+        self.extra = extra
+        self._start = time.monotonic()
+        self._responded = None
+
+    def retry(self, sleep: float = 0.0, status: Optional[int] = None) -> None:
+        """Count a failed attempt and the backoff sleep that follows it."""
+        self.retries += 1
+        self.backoff_sleep += sleep
+        if status is not None:
+            self.status = status
+
+    def responded(self) -> None:
+        """Mark the response as complete; time after this counts as post-processing."""
+        self._responded = time.monotonic()
+        if self.status is None:
+            self.status = 200
+
+    def set_usage(self, usage) -> None:
+        """Copy token counts from an OpenAI or Anthropic usage object (or dict)."""
+        if usage is None:
+            return
+        get = usage.get if isinstance(usage, dict) else lambda key: getattr(usage, key, None)
+        self.input_tokens = get('prompt_tokens') or get('input_tokens') or self.input_tokens
+        self.output_tokens = get('completion_tokens') or get('output_tokens') or self.output_tokens
+        details = get('prompt_tokens_details')
+        cached = (details.get('cached_tokens') if isinstance(details, dict)
+                  else getattr(details, 'cached_tokens', None)) if details is not None else None
+        self.cached_tokens = cached or get('cache_read_input_tokens') or self.cached_tokens
+
+    def set_stream(self, result: Dict[str, object]) -> None:
+        """Copy TTFT and token counts from a src.utils.streaming result."""
+        self.ttft = result.get('ttft')
+        self.output_tokens = result.get('output_tokens') or self.output_tokens
+        self.set_usage(result.get('usage'))
+        if result.get('aborted'):
+            self.extra['aborted'] = True
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        end = time.monotonic()
+        responded = self._responded or end
+        self.wall_time = responded - self._start
+        self.post_process_time = end - responded if self._responded else None
+        if error is not None:
+            self.error = f'{type(error).__name__}: {error}'
+            self.status = error_status(error) or self.status
+
+    def to_dict(self) -> Dict[str, object]:
+        record = {key: getattr(self, key) for key in self.__slots__ if not key.startswith('_') and key != 'extra'}
+        record.update(self.extra)
+        return record
+
+def error_status(error: BaseException) -> Optional[int]:
+    """HTTP status carried by an SDK or requests exception, if any."""
+    status = getattr(error, 'status_code', None)
+    if status is None and getattr(error, 'response', None) is not None:
+        status = getattr(error.response, 'status_code', None)
+    return status
+
+def current_call() -> Optional[CallRecord]:
+    """The CallRecord open in this thread, so retry helpers can report into it."""
+    return getattr(_local, 'record', None)
+
+class CallMetrics:
+    """Appends one JSON line per model call to `path`; safe to share across threads."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or CALL_METRICS_PATH
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def call(self, provider: str, model: str, **extra) -> Iterator[CallRecord]:
+        record = CallRecord(provider, model, **extra)
+        previous = current_call()
+        _local.record = record
+        try:
+            yield record
+        except BaseException as e:
+            record.finish(e)
+            raise
+        else:
+            record.finish()
+        finally:
+            _local.record = previous
+            self.write(record)
+
+    def write(self, record: CallRecord) -> None:
+        line = json.dumps(record.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+def load_call_metrics(path: Optional[str] = None) -> pd.DataFrame:
+    path = path or CALL_METRICS_PATH
+    with open(path, 'r') as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+def summarize_call_metrics(metrics: Union[str, pd.DataFrame, None] = None,
+                           percentiles: Iterable[int] = PERCENTILES) -> pd.DataFrame:
+    """Per provider/model call counts, error rate, retries and latency percentiles."""
+    df = metrics if isinstance(metrics, pd.DataFrame) else load_call_metrics(metrics)
+    rows: List[Dict[str, object]] = []
+    for (provider, model), group in df.groupby(['provider', 'model'], sort=True):
+        row = {
+            'provider': provider,
+            'model': model,
+            'calls': len(group),
+            'error_rate': group['error'].notna().mean(),
+            'retries': int(group['retries'].sum()),
+            'backoff_sleep': group['backoff_sleep'].sum(),
+            'rate_limit_wait': group['rate_limit_wait'].sum(),
+            'input_tokens': group['input_tokens'].sum(),
+            'output_tokens': group['output_tokens'].sum(),
+        }
+        for column in ('wall_time', 'ttft', 'post_process_time'):
+            values = group[column].dropna().to_numpy(dtype=float) if column in group else np.array([])
+            for p in percentiles:
+                row[f'{column}_p{p}'] = np.percentile(values, p) if len(values) else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Summarize recorded model-call metrics.')
+    parser.add_argument('path', nargs='?', default=CALL_METRICS_PATH)
+    parser.add_argument('--output', default=None, help='Also save the summary as CSV')
+    args = parser.parse_args()
+
+    summary = summarize_call_metrics(args.path)
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(summary.to_string(index=False, float_format=lambda v: f'{v:.3f}'))
+    if args.output:
+        summary.to_csv(args.output, index=False)
+        print(f'Summary saved to {args.output}')
@@ -0,0 +1,251 @@
+"""Compact completion format for describing a project's sprites and blocks.
+
+Grammar (one item per line):
+
+    completion  := HEADER NL ( block_line | section )*
+    section     := "sprite: " NAME NL ( type_line | block_line )*
+    type_line   := "  #" [ " " TYPE ] NL             sets the type of the blocks below it;
+                                                     a bare "  #" clears it
+    block_line  := "  " NAME [ " @" POS ] [ "*" COUNT ] NL
+    POS         := X "," Y [ "," Z ]
+
+HEADER is " blocks:" with its leading space. A block line repeated COUNT times
+in a row is written once with "*COUNT". Block lines before the first sprite
+belong to the project rather than a sprite.
+"""
+from typing import Dict, Iterable, List, Mapping, Optional
+
+HEADER = ' blocks:'
+SPRITE_PREFIX = 'sprite: '
+BLOCK_INDENT = '  '
+TYPE_PREFIX = '# '
+POSITION_MARK = ' @'
+
+def _number(value) -> str:
+    """Format a coordinate without a trailing '.0' and with missing values left empty."""
+    if value is None or value != value:  # None or NaN
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _block_line(block: Mapping[str, object]) -> str:
+    line = BLOCK_INDENT + str(block['name'])
+    position = [_number(block.get(axis)) for axis in ('x', 'y', 'z')]
+    while position and not position[-1]:
+        position.pop()
+    if position:
+        line += POSITION_MARK + ','.join(position)
+    return line
+
+def _append_blocks(lines: List[str], blocks: Iterable[Mapping[str, object]]) -> None:
+    current_type = None
+    previous, repeat = None, 0
+    for block in blocks:
+        block_type = block.get('type')
+        if block_type != block_type:  # NaN from a DataFrame row
+            block_type = None
+        if block_type != current_type:
+            if previous is not None:
+                lines.append(previous if repeat == 1 else f'{previous}*{repeat}')
+                previous, repeat = None, 0
+            # An untyped block after typed ones clears the type instead of inheriting it
+            lines.append(f'{BLOCK_INDENT}{TYPE_PREFIX}{block_type}' if block_type is not None
+                         else BLOCK_INDENT + TYPE_PREFIX.strip())
+            current_type = block_type
+        line = _block_line(block)
+        if line == previous:
+            repeat += 1
+            continue
+        if previous is not None:
+            lines.append(previous if repeat == 1 else f'{previous}*{repeat}')
+        previous, repeat = line, 1
+    if previous is not None:
+        lines.append(previous if repeat == 1 else f'{previous}*{repeat}')
+
+def format_completion(sprites: Mapping[Optional[str], Iterable[Mapping[str, object]]]) -> str:
+    """Build a completion from {sprite name: blocks}; a None key holds project-level blocks.
+
+    Each block is a mapping with 'name' and optional 'type', 'x', 'y' and 'z'.
+    Lines are collected in a list and joined once, so cost is linear in the blocks.
+    """
+    lines = [HEADER]
+    if None in sprites:
+        _append_blocks(lines, sprites[None])
+    for sprite, blocks in sprites.items():
+        if sprite is None:
+            continue
+        lines.append(SPRITE_PREFIX + str(sprite))
+        _append_blocks(lines, blocks)
+    return '\n'.join(lines)
+
+def format_project_completion(blocks: Iterable[Mapping[str, object]], sprite_key: str = 'sprite_id') -> str:
+    """Group a flat block list by `sprite_key` (in first-seen order) and format it."""
+    sprites: Dict[Optional[str], List[Mapping[str, object]]] = {}
+    for block in blocks:
+        sprite = block.get(sprite_key)
+        if sprite is not None and sprite == sprite:
+            sprite = _number(sprite)
+        else:
+            sprite = None
+        sprites.setdefault(sprite, []).append(block)
+    return format_completion(sprites)
+
+class CompletionParser:
+    """Incremental parser for the completion format.
+
+    Feed text as it streams in; complete lines are parsed immediately and an
+    unfinished line is checked against the possible prefixes, so `error` is set
+    as soon as the output can no longer be valid and a caller can stop reading. Sprite lines are recognised case-insensitively even after
+    an error, which keeps sprite extraction lenient for scoring.
+
+    The evaluators' earlier, looser reading of outputs is tracked alongside the
+    grammar, so scores of outputs written before this format stay comparable:
+    `legacy_sprites` takes the text after "sprite:" anywhere in a line, and
+    `format_check` keeps the original definitions of its checks.
+    """
+
+    def __init__(self):
+        self.sprites: List[str] = []
+        self.legacy_sprites: List[str] = []
+        self.blocks: Dict[Optional[str], List[Dict[str, object]]] = {}
+        self.error: Optional[str] = None
+        self.space_prefix = False
+        self.blocks_header = False
+        self.body_valid = True
+        self.sprite_lines_only = True
+        self.newline_after_header = False
+        self.lines = 0
+        self._buffer = ''
+        self._sprite: Optional[str] = None
+        self._type: Optional[str] = None
+
+    @property
+    def valid(self) -> bool:
+        return self.error is None and self.space_prefix
+
+    @property
+    def sprite_names(self) -> List[str]:
+        """Sprites found by the grammar, or by the legacy reading when it found none."""
+        return self.sprites or self.legacy_sprites
+
+    def feed(self, text: str) -> 'CompletionParser':
+        self._buffer += text
+        if '\n' not in self._buffer:
+            self._check_partial()
+            return self
+        *complete, self._buffer = self._buffer.split('\n')
+        for line in complete:
+            self._parse_line(line, terminated=True)
+        self._check_partial()
+        return self
+
+    def _check_partial(self) -> None:
+        """Fail on an unfinished line that can no longer become valid."""
+        if self.error is not None or not self._buffer:
+            return
+        if self.lines == 0:
+            if not (HEADER.startswith(self._buffer) or self._buffer.startswith(HEADER)):
+                self.error = f'line 1: expected {HEADER!r}, got {self._buffer[:40]!r}'
+            return
+        head = self._buffer[:len(SPRITE_PREFIX)]
+        if not (SPRITE_PREFIX.startswith(head) or BLOCK_INDENT.startswith(self._buffer[:len(BLOCK_INDENT)])):
+            self.error = f'line {self.lines + 1}: unexpected line {self._buffer[:40]!r}'
+
+    def close(self) -> 'CompletionParser':
+        if self._buffer or not self.lines:
+            self._parse_line(self._buffer, terminated=False)
+            self._buffer = ''
+        return self
+
+    def _fail(self, message: str) -> None:
+        if self.lines > 1:
+            self.body_valid = False
+        if self.error is None:
+            self.error = f'line {self.lines}: {message}'
+
+    def _track_legacy(self, line: str, terminated: bool) -> None:
+        """Legacy checks: a ' blocks:' header anywhere, 'blocks:' ending a line, only sprite lines after it."""
+        lowered = line.lower()
+        if 'sprite:' in lowered:
+            self.legacy_sprites.append(line[lowered.index('sprite:') + len('sprite:'):].strip())
+        if HEADER in line:
+            self.blocks_header = True
+        if terminated and line.endswith(HEADER.strip()):
+            self.newline_after_header = True
+        if self.lines > 1 and line.strip() and not line.startswith(SPRITE_PREFIX):
+            self.sprite_lines_only = False
+
+    def _parse_line(self, line: str, terminated: bool) -> None:
+        self.lines += 1
+        self._track_legacy(line, terminated)
+        if self.lines == 1:
+            self.space_prefix = line.startswith(HEADER)
+            if line.rstrip() != HEADER:
+                self._fail(f'expected {HEADER!r}, got {line[:40]!r}')
+            if line.strip() == HEADER.strip():
+                return
+
+        stripped = line.strip()
+        if stripped.lower().startswith('sprite:'):
+            self._sprite = stripped[len('sprite:'):].strip()
+            self._type = None
+            self.sprites.append(self._sprite)
+            if not line.startswith(SPRITE_PREFIX):
+                self._fail('sprite lines must start with "sprite: "')
+            return
+        if not stripped:
+            return
+        if not line.startswith(BLOCK_INDENT):
+            self._fail(f'unexpected line {line[:40]!r}')
+            return
+        if self.error is not None:
+            return
+        if stripped.startswith(TYPE_PREFIX):
+            self._type = stripped[len(TYPE_PREFIX):]
+            return
+        if stripped == TYPE_PREFIX.strip():
+            self._type = None
+            return
+        self._parse_block(stripped)
+
+    def _parse_block(self, text: str) -> None:
+        count = 1
+        head, mark, repeat = text.rpartition('*')
+        if mark and repeat.isdigit():
+            text, count = head, int(repeat)
+        name, _, position = text.partition(POSITION_MARK)
+        block: Dict[str, object] = {'name': name}
+        if self._type is not None:
+            block['type'] = self._type
+        if position:
+            for axis, value in zip(('x', 'y', 'z'), position.split(',')):
+                if value:
+                    try:
+                        block[axis] = float(value) if '.' in value else int(value)
+                    except ValueError:
+                        self._fail(f'bad coordinate {value!r}')
+                        return
+        self.blocks.setdefault(self._sprite, []).extend(dict(block) for _ in range(count))
+
+    def format_check(self) -> Dict[str, bool]:
+        """The per-response checks reported by the evaluators.
+
+        These keep their original meaning; `sprite_format` additionally accepts
+        the indented block lines of this grammar.
+        """
+        return {
+            'space_prefix': self.space_prefix,
+            'blocks_header': self.blocks_header,
+            'sprite_format': self.sprite_lines_only or self.body_valid,
+            'newline_after_header': self.newline_after_header,
+        }
+
+def parse_completion(text: str) -> CompletionParser:
+    return CompletionParser().feed(text).close()
+
+def extract_sprites(text: str) -> List[str]:
+    return parse_completion(text).sprite_names
+
+def check_format(text: str) -> Dict[str, bool]:
+    return parse_completion(text).format_check()
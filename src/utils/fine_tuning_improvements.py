@@ -1,15 +1,15 @@
 import os
 import json
-from openai import OpenAI
 from datetime import datetime
 import time
 
+from src.evaluation.clients import get_openai_client
+from src.utils.prompt_templates import build_messages, count_tokens, get_system_prompt
+from src.utils.retry_policy import CREATE_RETRY_POLICY, DEFAULT_RETRY_POLICY
+
 def create_improved_fine_tuning_job():
     try:
-        client = OpenAI(
-            api_key=os.environ['OAI_key'],
-            organization=os.environ['OAI_organization_id']
-        )
+        client = get_openai_client()
 
         print('Starting fine-tuning process...')
 
@@ -23,23 +23,16 @@ def create_improved_fine_tuning_job():
         improved_data = []
         for item in current_data:
             improved_item = {
-                'messages': [
-                    {
-                        'role': 'system',
-                        'content': 'You are an AI assistant that understands Scratch projects and can describe their structure.\n\nFormat Rules:\n1. Start with exactly " blocks:" (note the leading space)\n2. List each sprite on a new line\n3. Each sprite line must start with "sprite: "\n4. No extra text or explanations'
-                    },
-                    {
-                        'role': 'user',
-                        'content': item['prompt']
-                    },
-                    {
-                        'role': 'assistant',
-                        'content': item['completion']
-                    }
-                ]
+                'messages': build_messages('scratch_format', item['prompt'], item['completion'])
             }
             improved_data.append(improved_item)
 
+        prefix_tokens = count_tokens(get_system_prompt('scratch_format'))
+        total_tokens = sum(count_tokens(m['content']) for item in improved_data for m in item['messages'])
+        if total_tokens:
+            print(f'System prefix: {prefix_tokens} tokens per row, '
+                  f'{prefix_tokens * len(improved_data) / total_tokens:.1%} of training tokens')
+
         # Save improved training data
         print('Saving improved training data...')
         output_file = 'improved_training_data.jsonl'
@@ -47,28 +40,18 @@ def create_improved_fine_tuning_job():
             for item in improved_data:
                 f.write(json.dumps(item) + '\n')
 
-        # Upload with retry logic
+        # Upload, retrying only failures that cannot have created a file
         print('Uploading training file...')
-        max_attempts = 3
-        file_id = None
 
-        for attempt in range(max_attempts):
-            try:
-                with open(output_file, 'rb') as f:
-                    response = client.files.create(
-                        file=f,
-                        purpose='fine-tune'
-                    )
-                file_id = response.id
-                print(f'File uploaded successfully. ID: {file_id}')
-                break
-            except Exception as e:
-                print(f'Upload attempt {attempt + 1} failed: {str(e)}')
-                if attempt < max_attempts - 1:
-                    print('Retrying upload...')
-                    time.sleep(5)
-                else:
-                    raise Exception('Failed to upload file after multiple attempts')
+        def upload():
+            with open(output_file, 'rb') as f:
+                return client.files.create(
+                    file=f,
+                    purpose='fine-tune'
+                )
+
+        file_id = CREATE_RETRY_POLICY.call(upload).id
+        print(f'File uploaded successfully. ID: {file_id}')
 
         # Verify file processing
         print('Waiting for file processing...')
@@ -77,7 +60,7 @@ def create_improved_fine_tuning_job():
 
         while True:
             try:
-                file_status = client.files.retrieve(file_id)
+                file_status = DEFAULT_RETRY_POLICY.call(client.files.retrieve, file_id)
                 print(f'File status: {file_status.status}')
 
                 if file_status.status == 'processed':
@@ -100,7 +83,9 @@ def create_improved_fine_tuning_job():
         for model in models:
             try:
                 print(f'Creating job for model: {model}')
-                job = client.fine_tuning.jobs.create(
+                # Not idempotent: a retry after a timeout or 5xx could start a second job
+                job = CREATE_RETRY_POLICY.call(
+                    client.fine_tuning.jobs.create,
                     training_file=file_id,
                     model=model,
                     hyperparameters={
@@ -121,7 +106,6 @@ def create_improved_fine_tuning_job():
                     }
                 })
                 print(f'Job created successfully. ID: {job.id}')
-                time.sleep(5)  # Wait between job creations
             except Exception as e:
                 print(f'Error creating job for {model}: {str(e)}')
 
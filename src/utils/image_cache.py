@@ -0,0 +1,120 @@
+import io
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is required to compute perceptual hashes
+    Image = None
+
+def dhash(image_bytes: bytes, hash_size: int = 8) -> int:
+    """Compute a difference hash: one bit per horizontally adjacent pixel pair."""
+    if Image is None:
+        raise ImportError("Pillow is required to compute perceptual hashes")
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes under Hamming distance.
+
+    Each node is [hash, values, children-by-distance]; searches prune subtrees
+    with the triangle inequality, so lookups visit a small part of the tree.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: int, value) -> None:
+        self._size += 1
+        if self._root is None:
+            self._root = [key, [value], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(key, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, [value], {}]
+                return
+            node = child
+
+    def search(self, key: int, max_distance: int) -> List[Tuple[int, object]]:
+        """Return (distance, value) pairs within `max_distance`, nearest first."""
+        if self._root is None:
+            return []
+        matches = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, value) for value in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for d, child in node[2].items() if low <= d <= high)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+class ImageAnalysisCache:
+    """Persistent cache of image analyses keyed by perceptual hash.
+
+    Entries are appended to a JSONL file and indexed in a BK-tree on load, so an
+    image within `max_distance` bits of a previously analyzed one reuses its result.
+    """
+
+    def __init__(self, path: str, max_distance: int = 4):
+        self.path = path
+        self.max_distance = max_distance
+        self.tree = BKTree()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.tree.add(int(entry["phash"], 16), entry)
+
+    def __len__(self) -> int:
+        return len(self.tree)
+
+    def lookup(self, phash: int) -> Optional[Dict[str, object]]:
+        """Return the nearest cached entry within range, with its `distance`."""
+        with self._lock:
+            matches = self.tree.search(phash, self.max_distance)
+            if not matches:
+                self.misses += 1
+                return None
+            self.hits += 1
+        distance, entry = matches[0]
+        return {**entry, "distance": distance}
+
+    def add(self, phash: int, analysis: str, **fields) -> None:
+        entry = {"phash": f"{phash:016x}", "analysis": analysis, **fields}
+        with self._lock:
+            self.tree.add(phash, entry)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def report(self) -> None:
+        total = self.hits + self.misses
+        if total:
+            print(f"Image cache: {self.hits}/{total} hits ({self.hits / total:.1%}), {len(self)} entries")
@@ -0,0 +1,205 @@
+import cProfile
+import gc
+import json
+import math
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, TypeVar
+
+try:
+    import psutil
+except ImportError:  # RSS falls back to /proc or the peak from getrusage
+    psutil = None
+
+T = TypeVar('T')
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class StageStats:
+    """Accumulated measurements of one named pipeline stage."""
+
+    __slots__ = ('name', 'calls', 'seconds', 'gc_seconds', 'rows', 'bytes', 'rss_before', 'rss_after',
+                 'alloc_peak')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.gc_seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.rss_before = None
+        self.rss_after = None
+        self.alloc_peak = None
+
+    def add(self, rows: int = 0, bytes: int = 0) -> None:
+        self.rows += rows
+        self.bytes += bytes
+
+    def to_dict(self) -> Dict[str, object]:
+        rss_delta = self.rss_after - self.rss_before if self.rss_before is not None and self.rss_after is not None else math.nan
+        return {
+            'stage': self.name,
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'gc_seconds': self.gc_seconds,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'rows_per_second': self.rows / self.seconds if self.rows and self.seconds else math.nan,
+            'mb_per_second': self.bytes / 1e6 / self.seconds if self.bytes and self.seconds else math.nan,
+            'rss_mb': self.rss_after / 1e6 if self.rss_after is not None else math.nan,
+            'rss_delta_mb': rss_delta / 1e6 if rss_delta is not None else math.nan,
+            'alloc_peak_mb': self.alloc_peak / 1e6 if self.alloc_peak is not None else math.nan,
+        }
+
+class PipelineProfiler:
+    """Opt-in stage timers for the dataset pipelines.
+
+    Wrap each stage in `with profiler.stage(name) as stage:` (or wrap an
+    iterator with `profiler.iterate`) and call `report()` at the end. Each stage
+    records wall time, time spent in the garbage collector, rows/bytes counters
+    and RSS. With `trace_allocations`, tracemalloc also records each stage's
+    peak allocation; with `profile_dir`, a cProfile file is written per stage.
+    Nested stages are timed on their own but profiled as part of the outermost
+    stage, since only one cProfile profiler can be active at a time.
+    A disabled profiler costs one attribute check per stage.
+    """
+
+    def __init__(self, enabled: bool = True, trace_allocations: bool = False, profile_dir: Optional[str] = None):
+        self.enabled = enabled
+        self.trace_allocations = enabled and trace_allocations
+        self.profile_dir = profile_dir if enabled else None
+        self.stages: Dict[str, StageStats] = {}
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._stack: List[StageStats] = []
+        # [traced bytes at entry, highest peak seen in nested stages] per open stage
+        self._peaks: List[List[int]] = []
+        self._gc_started = None
+        self._started = time.monotonic()
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+        if enabled:
+            gc.callbacks.append(self._on_gc)
+
+    def _on_gc(self, phase: str, info: Dict[str, int]) -> None:
+        if phase == 'start':
+            self._gc_started = time.perf_counter()
+        elif self._gc_started is not None:
+            if self._stack:
+                self._stack[-1].gc_seconds += time.perf_counter() - self._gc_started
+            self._gc_started = None
+
+    def _get(self, name: str) -> StageStats:
+        if name not in self.stages:
+            self.stages[name] = StageStats(name)
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0, bytes: int = 0) -> Iterator[StageStats]:
+        stats = self._get(name)
+        stats.add(rows, bytes)
+        if not self.enabled:
+            yield stats
+            return
+
+        outermost = not self._stack
+        profile = None
+        if outermost and self.profile_dir:
+            profile = self._profiles.setdefault(name, cProfile.Profile())
+        if stats.rss_before is None:
+            stats.rss_before = current_rss()
+        if self.trace_allocations:
+            # reset_peak() is global: fold the peak so far into the enclosing stage first
+            current, peak = tracemalloc.get_traced_memory()
+            if self._peaks:
+                self._peaks[-1][1] = max(self._peaks[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._peaks.append([current, 0])
+        self._stack.append(stats)
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield stats
+        finally:
+            if profile is not None:
+                profile.disable()
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+            self._stack.pop()
+            if self.trace_allocations:
+                alloc_start, nested_peak = self._peaks.pop()
+                peak = max(tracemalloc.get_traced_memory()[1], nested_peak)
+                stats.alloc_peak = max(stats.alloc_peak or 0, peak - alloc_start)
+                if self._peaks:
+                    self._peaks[-1][1] = max(self._peaks[-1][1], peak)
+            stats.rss_after = current_rss()
+
+    def iterate(self, name: str, iterable: Iterable[T], rows=len) -> Iterator[T]:
+        """Yield from `iterable`, timing each step as stage `name`.
+
+        `rows` maps an item to its row count (None to skip counting).
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as stats:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                if rows is not None and self.enabled:
+                    stats.add(rows(item))
+            yield item
+
+    def summary(self) -> 'pd.DataFrame':
+        import pandas as pd  # imported lazily so the CLI can add profiler options without loading pandas
+        return pd.DataFrame([s.to_dict() for s in self.stages.values() if s.calls])
+
+    def report(self, output_path: Optional[str] = None) -> Optional['pd.DataFrame']:
+        """Print the stage table, dump per-stage cProfile files and optionally save JSON."""
+        if not self.enabled:
+            return None
+        gc.callbacks.remove(self._on_gc)
+        total = time.monotonic() - self._started
+        import pandas as pd
+        summary = self.summary()
+        if not summary.empty:
+            summary['share'] = summary['seconds'] / total
+            print(f"\nStage timings (total {total:.2f}s, RSS {current_rss() / 1e6:.0f} MB):")
+            with pd.option_context('display.max_columns', None, 'display.width', 200):
+                print(summary.to_string(index=False, na_rep='-', float_format=lambda v: f'{v:,.2f}'))
+        for name, profile in self._profiles.items():
+            path = os.path.join(self.profile_dir, f"{name.replace(' ', '_')}.prof")
+            profile.dump_stats(path)
+            print(f"cProfile output for '{name}' saved to {path}")
+        if output_path:
+            with open(output_path, 'w') as f:
+                json.dump({'total_seconds': total, 'stages': summary.to_dict('records')}, f, indent=2, default=str)
+        if self.trace_allocations:
+            tracemalloc.stop()
+        return summary
+
+def add_profiler_arguments(parser) -> None:
+    """Add the shared --timings/--trace-malloc/--profile options to an argparse parser."""
+    parser.add_argument('--timings', action='store_true', help='Print a per-stage timing table at the end')
+    parser.add_argument('--trace-malloc', action='store_true',
+                        help='Also record peak allocations per stage (slower)')
+    parser.add_argument('--profile', metavar='DIR', default=None,
+                        help='Write a cProfile file per stage to DIR (implies --timings)')
+
+def profiler_from_args(args) -> PipelineProfiler:
+    return PipelineProfiler(enabled=bool(args.timings or args.trace_malloc or args.profile),
+                            trace_allocations=args.trace_malloc, profile_dir=args.profile)
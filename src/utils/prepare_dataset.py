@@ -1,21 +1,21 @@
 import json
 import os
 
+from src.utils.completion_format import format_project_completion
+from src.utils.prompt_templates import build_messages
+
 def load_json_data(file_path):
     with open(file_path, 'r') as f:
         return json.load(f)
 
 def format_for_chat_model(project):
-    system_message = "You are an AI assistant that understands Scratch projects and can describe their structure."
-    user_message = f"Describe the structure of this Scratch project with ID {project['project_id']}."
-    blocks = [f"{block['type']}: {block['name']}" for block in project['blocks']]
-    assistant_message = f"This Scratch project contains the following blocks:\n" + "\n".join(blocks)
+    # The canonical prompt that configure_model trains on and evaluate_model sends
     return {
-        "messages": [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_message},
-            {"role": "assistant", "content": assistant_message}
-        ]
+        "messages": build_messages(
+            'scratch_structure',
+            f"Describe the structure of this Scratch project with ID {project['project_id']}.",
+            format_project_completion(project['blocks']),
+        )
     }
 
 def prepare_dataset(input_file, output_file):
@@ -0,0 +1,119 @@
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a characters/4 estimate
+    tiktoken = None
+
+# One canonical system prompt per task. Training rows and evaluation requests share
+# the same text so the provider can reuse its cached prefix across calls.
+SYSTEM_PROMPTS = {
+    'scratch_format': (
+        'You are an AI assistant that understands Scratch projects and can describe their structure.\n\n'
+        'Format Rules:\n'
+        '1. Start with exactly " blocks:" (note the leading space)\n'
+        '2. List each sprite on a new line\n'
+        '3. Each sprite line must start with "sprite: "\n'
+        '4. No extra text or explanations'
+    ),
+    'scratch_structure': 'You are a helpful assistant that understands Scratch projects and can describe their structure.',
+    'scratch_describe': 'You are a helpful assistant that describes Scratch projects.',
+    'scratch_analyze': 'You analyze Scratch projects and describe their structure.',
+    'o_series_format': 'Format: " blocks:\nsprite: Name1\nsprite: Name2"',
+}
+
+# Tasks whose system prompt asks for the " blocks:" completion format. Only these
+# outputs can be held to it while streaming; other tasks' outputs are free-form.
+FORMAT_TASKS = frozenset({'scratch_format', 'o_series_format'})
+
+def get_system_prompt(task: str) -> str:
+    if task not in SYSTEM_PROMPTS:
+        raise ValueError(f"Unknown prompt task '{task}', expected one of {sorted(SYSTEM_PROMPTS)}")
+    return SYSTEM_PROMPTS[task]
+
+def build_messages(task: str, user_content: str, assistant_content: Optional[str] = None) -> List[Dict[str, str]]:
+    """Build chat messages with the static system prefix first and per-item content last."""
+    messages = [
+        {'role': 'system', 'content': get_system_prompt(task)},
+        {'role': 'user', 'content': user_content},
+    ]
+    if assistant_content is not None:
+        messages.append({'role': 'assistant', 'content': assistant_content})
+    return messages
+
+def prefix_id(task: str) -> str:
+    """Short stable id of a task's system prompt, for grouping cache statistics."""
+    return hashlib.sha1(get_system_prompt(task).encode('utf-8')).hexdigest()[:12]
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when installed, otherwise estimate ~4 chars per token."""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding('o200k_base')
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+def _cached_tokens(usage) -> int:
+    """Read cached prompt tokens from an OpenAI or Anthropic usage object."""
+    if usage is None:
+        return 0
+    details = getattr(usage, 'prompt_tokens_details', None)
+    if details is not None and getattr(details, 'cached_tokens', None):
+        return details.cached_tokens
+    return getattr(usage, 'cache_read_input_tokens', 0) or 0
+
+def _prompt_tokens(usage) -> int:
+    if usage is None:
+        return 0
+    prompt = getattr(usage, 'prompt_tokens', None)
+    if prompt is None:
+        prompt = (getattr(usage, 'input_tokens', 0) or 0) + (getattr(usage, 'cache_read_input_tokens', 0) or 0)
+    return prompt or 0
+
+class PromptCacheStats:
+    """Tracks how much of each request is shared prefix and how much the provider cached."""
+
+    def __init__(self, task: str):
+        self.task = task
+        self.prefix_tokens = count_tokens(get_system_prompt(task))
+        self.requests = 0
+        self.estimated_prompt_tokens = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+
+    def record(self, messages: List[Dict[str, str]], usage=None) -> None:
+        """Record one request; `usage` is the provider's usage object, if any."""
+        estimate = sum(count_tokens(m['content']) for m in messages if isinstance(m.get('content'), str))
+        cached = _cached_tokens(usage)
+        with self._lock:
+            self.requests += 1
+            self.estimated_prompt_tokens += estimate
+            self.prompt_tokens += _prompt_tokens(usage) or estimate
+            self.cached_tokens += cached
+            self.cache_hits += 1 if cached else 0
+
+    def summary(self) -> Dict[str, float]:
+        estimated = self.estimated_prompt_tokens or 1
+        return {
+            'task': self.task,
+            'prefix_id': prefix_id(self.task),
+            'requests': self.requests,
+            'prefix_tokens': self.prefix_tokens,
+            'prefix_token_share': self.prefix_tokens * self.requests / estimated if self.requests else 0.0,
+            'cache_hit_ratio': self.cache_hits / self.requests if self.requests else 0.0,
+            'cached_token_share': self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+        }
+
+    def report(self) -> None:
+        s = self.summary()
+        print(f"Prompt prefix '{s['task']}' ({s['prefix_tokens']} tokens): "
+              f"{s['prefix_token_share']:.1%} of prompt tokens, "
+              f"cache hits {s['cache_hit_ratio']:.1%} of {s['requests']} requests, "
+              f"{s['cached_token_share']:.1%} of prompt tokens served from cache")
@@ -0,0 +1,43 @@
+import threading
+import time
+from typing import Optional
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls to at most `requests_per_minute`.
+
+    `max_concurrency` additionally caps how many calls may be in flight at once;
+    use the limiter as a context manager around each call.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, max_concurrency: Optional[int] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    def acquire(self) -> float:
+        """Block until the next request slot; returns the seconds spent waiting."""
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def release(self) -> None:
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
@@ -0,0 +1,212 @@
+"""Markdown reports for block analyses and model evaluations.
+
+A report is a list of sections, each rendered from its input files. Rendered
+sections are cached next to the report, keyed on the section's parameters and
+its inputs' size and mtime, so regenerating a report only re-reads the inputs
+that changed.
+
+Block analysis files (block_analysis_results.json) are read with ijson when it
+is installed, one key/value pair at a time, and the top entries are picked with
+heapq.nlargest; opcode tuples are only decoded for the rows that are shown.
+Several analyses can be compared side by side, and model evaluations are
+compared across runs from the results warehouse (src.evaluation.results_warehouse).
+
+    python -m src.utils.report_generator block_analysis_results.json --compare old_results.json
+"""
+import ast
+import hashlib
+import heapq
+import json
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+try:
+    import ijson
+except ImportError:  # ijson is optional; without it result files are loaded whole
+    ijson = None
+
+TOP_N = 10
+
+def iter_json_object(path: str, key: str) -> Iterator[Tuple[str, object]]:
+    """Yield the (name, value) pairs of the top-level object `key` in a JSON file."""
+    if ijson is not None:
+        with open(path, 'rb') as f:
+            yield from ijson.kvitems(f, key, use_float=True)
+        return
+    with open(path, 'r') as f:
+        yield from json.load(f).get(key, {}).items()
+
+def _structure_entries(path: str) -> Iterator[Tuple[int, str, object]]:
+    """(count, key, value) per project structure, in either block_analysis_results format."""
+    for key, value in iter_json_object(path, 'project_structures'):
+        yield (int(value['count']) if isinstance(value, dict) else int(value)), key, value
+
+def _opcodes(key: str, value: object) -> Tuple[str, ...]:
+    # The keyed format stores the opcodes; the older format's key is the stringified tuple
+    return tuple(value['opcodes']) if isinstance(value, dict) else tuple(ast.literal_eval(key))
+
+def top_block_types(path: str, n: int = TOP_N) -> List[Tuple[str, int]]:
+    return heapq.nlargest(n, iter_json_object(path, 'block_types'), key=lambda item: item[1])
+
+def top_structures(path: str, n: int = TOP_N) -> List[Tuple[Tuple[str, ...], int]]:
+    top = heapq.nlargest(n, _structure_entries(path), key=lambda entry: entry[0])
+    return [(_opcodes(key, value), count) for count, key, value in top]
+
+def structure_counts(path: str, wanted: Set[Tuple[str, ...]]) -> Dict[Tuple[str, ...], int]:
+    """Counts of the `wanted` structures in one analysis, without decoding the others."""
+    wanted_keys = {str(opcodes): opcodes for opcodes in wanted}
+    counts = {}
+    for count, key, value in _structure_entries(path):
+        opcodes = tuple(value['opcodes']) if isinstance(value, dict) else wanted_keys.get(key)
+        if opcodes in wanted:
+            counts[opcodes] = counts.get(opcodes, 0) + count
+    return counts
+
+def markdown_table(headers: Sequence[str], rows: Iterable[Sequence[object]]) -> str:
+    lines = ['| ' + ' | '.join(headers) + ' |',
+             '|' + '|'.join('-' * (len(header) + 2) for header in headers) + '|']
+    lines.extend('| ' + ' | '.join('' if cell is None else str(cell) for cell in row) + ' |' for row in rows)
+    return '\n'.join(lines) + '\n'
+
+def run_labels(paths: Sequence[str]) -> List[str]:
+    """Short column names for result files: the file name, or parent/name when names repeat."""
+    names = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    if len(set(names)) == len(names):
+        return names
+    return [os.path.join(os.path.basename(os.path.dirname(os.path.abspath(p))), name) for p, name in zip(paths, names)]
+
+def _change(first: Optional[int], last: Optional[int]) -> str:
+    if not first or last is None:
+        return ''
+    return f'{(last - first) / first:+.1%}'
+
+class Section:
+    """One report section: a heading and a body rendered from input files."""
+
+    def __init__(self, title: str, render: Callable[[], str], inputs: Sequence[str] = (),
+                 params: Optional[Dict[str, object]] = None):
+        self.title = title
+        self.render = render
+        self.inputs = list(inputs)
+        self.params = params or {}
+
+    def fingerprint(self) -> str:
+        stats = []
+        for path in self.inputs:
+            try:
+                stat = os.stat(path)
+                stats.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+            except FileNotFoundError:
+                stats.append([os.path.abspath(path), None, None])
+        payload = json.dumps([self.title, self.params, stats], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def block_types_section(path: str, n: int = TOP_N) -> Section:
+    def render():
+        return markdown_table(['Block Type', 'Count'], top_block_types(path, n))
+    return Section('Top Block Types', render, [path], {'n': n})
+
+def structures_section(path: str, n: int = TOP_N) -> Section:
+    def render():
+        return markdown_table(['Project Structure', 'Count'],
+                              [(opcodes, count) for opcodes, count in top_structures(path, n)])
+    return Section('Top Project Structures', render, [path], {'n': n})
+
+def block_types_comparison_section(paths: Sequence[str], n: int = TOP_N) -> Section:
+    """Top block types of the last run, with their counts in every run."""
+    def render():
+        counts = [dict(iter_json_object(path, 'block_types')) for path in paths]
+        top = heapq.nlargest(n, counts[-1].items(), key=lambda item: item[1])
+        rows = [[block_type] + [run.get(block_type) for run in counts] +
+                [_change(counts[0].get(block_type), count)] for block_type, count in top]
+        return markdown_table(['Block Type'] + run_labels(paths) + ['Change'], rows)
+    return Section('Block Types Across Runs', render, paths, {'n': n})
+
+def structures_comparison_section(paths: Sequence[str], n: int = TOP_N) -> Section:
+    """Top project structures of any run, with their counts in every run."""
+    def render():
+        wanted = set()
+        for path in paths:
+            wanted.update(opcodes for opcodes, _ in top_structures(path, n))
+        counts = [structure_counts(path, wanted) for path in paths]
+        top = heapq.nlargest(n, wanted, key=lambda opcodes: (counts[-1].get(opcodes, 0), counts[0].get(opcodes, 0)))
+        rows = [[opcodes] + [run.get(opcodes) for run in counts] +
+                [_change(counts[0].get(opcodes), counts[-1].get(opcodes))] for opcodes in top]
+        return markdown_table(['Project Structure'] + run_labels(paths) + ['Change'], rows)
+    return Section('Project Structures Across Runs', render, paths, {'n': n})
+
+def model_comparison_section(metric: str, warehouse_path: Optional[str] = None, last: Optional[int] = 5) -> Section:
+    """A metric per model across the last `last` runs recorded in the results warehouse."""
+    from src.evaluation.results_warehouse import WAREHOUSE_PATH
+
+    warehouse_path = warehouse_path or WAREHOUSE_PATH
+
+    def render():
+        from src.evaluation.results_warehouse import ResultsWarehouse
+
+        with ResultsWarehouse(warehouse_path) as warehouse:
+            table = warehouse.compare(metric, last=last)
+        if table.empty:
+            return f'No runs recorded {metric}.\n'
+        rows = []
+        for index, values in table.iterrows():
+            label = ' / '.join(part for part in index if part)
+            rows.append([label] + [f'{v:.4f}' if v == v else '' for v in values])
+        return markdown_table(['Model'] + list(table.columns), rows)
+    # Recent writes may still sit in SQLite's write-ahead log
+    inputs = [warehouse_path, f'{warehouse_path}-wal']
+    return Section(f'{metric} by Model and Run', render, inputs, {'metric': metric, 'last': last})
+
+def generate_report(output_path: str, sections: Sequence[Section], title: str,
+                    cache_path: Optional[str] = None) -> int:
+    """Write the report, re-rendering only sections whose inputs changed; returns how many were rendered."""
+    cache_path = cache_path or f'{output_path}.cache.json'
+    cache = {}
+    if os.path.exists(cache_path) and os.path.exists(output_path):
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+
+    parts, rendered, new_cache = [f'# {title}\n'], 0, {}
+    for section in sections:
+        fingerprint = section.fingerprint()
+        cached = cache.get(section.title)
+        if cached and cached['fingerprint'] == fingerprint:
+            body = cached['body']
+        else:
+            body = section.render()
+            rendered += 1
+        new_cache[section.title] = {'fingerprint': fingerprint, 'body': body}
+        parts.append(f'\n## {section.title}\n\n{body}')
+
+    if rendered or set(new_cache) != set(cache):
+        with open(output_path, 'w') as f:
+            f.write(''.join(parts))
+        with open(cache_path, 'w') as f:
+            json.dump(new_cache, f)
+    return rendered
+
+def block_report_sections(json_file: str, compare: Sequence[str] = (), n: int = TOP_N) -> List[Section]:
+    """Top block types and structures of `json_file`, plus comparisons when older runs are given."""
+    sections = [block_types_section(json_file, n), structures_section(json_file, n)]
+    if compare:
+        runs = list(compare) + [json_file]
+        sections += [block_types_comparison_section(runs, n), structures_comparison_section(runs, n)]
+    return sections
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Render block analysis and model evaluation reports as markdown.')
+    parser.add_argument('input', nargs='?', default='block_analysis_results.json')
+    parser.add_argument('--output', default='block_analysis_results.md')
+    parser.add_argument('--compare', nargs='*', default=[], help='Older block analysis files, oldest first')
+    parser.add_argument('--metric', action='append', default=[],
+                        help='Also add a model comparison table for this metric from the results warehouse')
+    parser.add_argument('--warehouse', default=None)
+    parser.add_argument('--top', type=int, default=TOP_N)
+    args = parser.parse_args()
+
+    sections = block_report_sections(args.input, args.compare, args.top)
+    sections += [model_comparison_section(metric, args.warehouse) for metric in args.metric]
+    rendered = generate_report(args.output, sections, 'Block Analysis Results')
+    print(f"Report saved to {args.output} ({rendered} of {len(sections)} sections regenerated)")
@@ -0,0 +1,221 @@
+"""Shared retry policy for model and API calls.
+
+Errors are classified first: rate limits, timeouts, connection failures and 5xx
+responses are retried, while other 4xx responses (bad requests, auth, exhausted
+quota) and local errors are raised at once. Before each retry the policy waits
+for the longer of the server's hint (Retry-After, retry-after-ms, or the reset
+header of an exhausted rate limit) and a decorrelated-jitter backoff, so
+concurrent workers spread out instead of retrying in lockstep. A RetryBudget
+shared by a run caps retries at a fraction of the calls made, so an outage
+fails fast instead of multiplying the load. Each retry is counted on the open
+CallRecord (src.utils.call_metrics).
+
+Calls that create something (uploading a file, starting a fine-tuning job) are
+not idempotent: after a timeout or a 5xx the server may already have acted, and
+a retry would create a duplicate. Policies built with `idempotent=False` only
+retry 429s and failures to connect, where the request never reached the server.
+"""
+import email.utils
+import functools
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, TypeVar
+
+from src.utils.call_metrics import current_call, error_status
+
+T = TypeVar('T')
+
+RETRYABLE_STATUSES = frozenset({408, 409, 425, 429, 500, 502, 503, 504, 529})
+
+# Exception class names (anywhere in the MRO) for failures without an HTTP status:
+# openai/anthropic, httpx and requests connection errors and timeouts
+RETRYABLE_ERRORS = frozenset({
+    'APIConnectionError', 'APITimeoutError', 'ConnectError', 'ConnectTimeout', 'ConnectionError',
+    'ChunkedEncodingError', 'ReadError', 'ReadTimeout', 'RemoteProtocolError', 'Timeout', 'TimeoutError',
+})
+
+# Failures before the request was sent, safe to retry even for non-idempotent calls
+CONNECT_ERRORS = frozenset({'ConnectError', 'ConnectTimeout', 'NewConnectionError'})
+
+# 429s that will not clear by waiting
+PERMANENT_ERROR_CODES = frozenset({'insufficient_quota', 'billing_hard_limit_reached'})
+
+_DURATION = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+def parse_duration(value: str) -> Optional[float]:
+    """Seconds in an OpenAI reset header such as '20ms', '1s' or '6m0s'."""
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _UNITS[unit] for number, unit in parts)
+
+def _parse_seconds_or_date(value: str) -> Optional[float]:
+    """Seconds until `value`, given as seconds, an HTTP date or an RFC 3339 timestamp."""
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            when = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return parse_duration(value)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def _headers(error: BaseException):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'headers', None)
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait, from the error's response headers."""
+    headers = _headers(error)
+    if headers is None:
+        return None
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    if headers.get('retry-after'):
+        return _parse_seconds_or_date(headers['retry-after'])
+    # Without Retry-After, wait for whichever rate limit is exhausted to reset
+    for prefix in ('x-ratelimit', 'anthropic-ratelimit'):
+        for kind in ('requests', 'tokens', 'input-tokens', 'output-tokens'):
+            remaining = headers.get(f'{prefix}-remaining-{kind}')
+            reset = headers.get(f'{prefix}-reset-{kind}')
+            if reset and remaining is not None and remaining.strip() == '0':
+                return _parse_seconds_or_date(reset)
+    return None
+
+def _failed_to_connect(error: BaseException) -> bool:
+    """Whether `error`, or an error it wraps, happened before the request was sent."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if any(cls.__name__ in CONNECT_ERRORS for cls in type(error).__mro__):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+def is_retryable(error: BaseException, idempotent: bool = True) -> bool:
+    """Whether retrying `error` can succeed (without side effects, for non-idempotent calls)."""
+    status = error_status(error)
+    if status is not None:
+        if status == 429 and getattr(error, 'code', None) in PERMANENT_ERROR_CODES:
+            return False
+        if not idempotent:
+            return status == 429
+        return status in RETRYABLE_STATUSES
+    if not idempotent:
+        return _failed_to_connect(error)
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+class RetryBudget:
+    """Retries allowed across a run: `min_retries` plus `ratio` of the calls made so far.
+
+    Thread-safe; share one budget between every policy used by a run.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, max_retries: Optional[int] = None):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.max_retries = max_retries
+        self.calls = 0
+        self.retries = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def record_call(self) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget; False when it is used up."""
+        with self._lock:
+            allowed = self.min_retries + self.ratio * self.calls
+            if self.max_retries is not None:
+                allowed = min(allowed, self.max_retries)
+            if self.retries + 1 > allowed:
+                self.denied += 1
+                return False
+            self.retries += 1
+            return True
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {'calls': self.calls, 'retries': self.retries, 'denied': self.denied}
+
+class RetryPolicy:
+    """Retry a callable on retryable errors with decorrelated jitter.
+
+    Use `policy.call(fn, *args)` or decorate a function with `@policy`. The
+    delay after each failure is drawn from uniform(base_delay, 3 * previous
+    delay), capped at `max_delay`, and raised to the server's Retry-After hint.
+    Gives up after `max_attempts` attempts, when the next wait would pass
+    `max_elapsed` seconds since the first attempt, or when the budget is spent.
+    With `idempotent=False` only 429s and connect failures are retried.
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 max_elapsed: float = 300.0, budget: Optional[RetryBudget] = None, seed: Optional[int] = None,
+                 idempotent: bool = True):
+        self.max_attempts = max_attempts
+        self.idempotent = idempotent
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+        self.budget = budget
+        self._random = random.Random(seed)
+
+    def next_delay(self, previous: float) -> float:
+        return min(self.max_delay, self._random.uniform(self.base_delay, max(self.base_delay, previous * 3)))
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        if self.budget is not None:
+            self.budget.record_call()
+        start = time.monotonic()
+        delay = self.base_delay
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_attempts or not is_retryable(e, self.idempotent):
+                    raise
+                delay = self.next_delay(delay)
+                hint = retry_after(e)
+                # A little jitter on top of the hint keeps workers that got the same hint apart
+                wait = max(delay, hint * self._random.uniform(1.0, 1.1)) if hint is not None else delay
+                if time.monotonic() - start + wait > self.max_elapsed:
+                    raise
+                record = current_call()
+                if self.budget is not None and not self.budget.try_spend():
+                    if record is not None:
+                        record.extra['retry_budget_exhausted'] = True
+                    raise
+                if record is not None:
+                    record.retry(wait, error_status(e))
+                time.sleep(wait)
+
+    def __call__(self, fn: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.call(fn, *args, **kwargs)
+        return wrapper
+
+# One budget for the whole process, i.e. per CLI run; runners that want their own
+# limits (the evaluation matrix) build a separate policy.
+DEFAULT_RETRY_BUDGET = RetryBudget()
+DEFAULT_RETRY_POLICY = RetryPolicy(budget=DEFAULT_RETRY_BUDGET)
+# For requests that create resources (file uploads, fine-tuning jobs)
+CREATE_RETRY_POLICY = RetryPolicy(budget=DEFAULT_RETRY_BUDGET, idempotent=False)
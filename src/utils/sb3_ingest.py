@@ -0,0 +1,196 @@
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Generator, Iterable, List, Optional
+
+import pandas as pd
+from tqdm import tqdm
+
+from src.utils.scratch_csv import BLOCK_LINK_COLUMNS
+
+try:
+    import ijson
+except ImportError:  # ijson is optional; without it project.json is loaded whole
+    ijson = None
+
+# Top-level reporter primitives are serialized as arrays: [type, name, id, x, y]
+PRIMITIVE_OPCODES = {
+    12: 'data_variable',
+    13: 'data_listcontents',
+}
+
+PROJECT_SUFFIXES = ('.sb3', '.json')
+
+def _block_record(project_id: str, target: Optional[str], block_id: str, block) -> Optional[Dict[str, Optional[str]]]:
+    """Normalize one Scratch 3 block into the allBlocks_linked column layout."""
+    if isinstance(block, list):
+        opcode = PRIMITIVE_OPCODES.get(block[0]) if block else None
+        if opcode is None:
+            return None
+        return {
+            'ProjectId': project_id, 'BlockId': block_id, 'ParentId': None,
+            'Type': 'data', 'Target': target, 'OpCode': opcode,
+            'NextBlock': None, 'Comment': None, 'Input': None,
+        }
+
+    opcode = block.get('opcode')
+    inputs = block.get('inputs')
+    return {
+        'ProjectId': project_id,
+        'BlockId': block_id,
+        'ParentId': block.get('parent'),
+        'Type': opcode.split('_', 1)[0] if opcode else None,
+        'Target': target,
+        'OpCode': opcode,
+        'NextBlock': block.get('next'),
+        'Comment': block.get('comment'),
+        'Input': json.dumps(inputs, separators=(',', ':'), default=float) if inputs else None,
+    }
+
+def _iter_records_streaming(handle, project_id: str) -> Generator[Dict[str, Optional[str]], None, None]:
+    """Walk ijson parse events, building one block object at a time."""
+    target = None
+    pending: List[tuple] = []  # blocks seen before the target's name
+    block_id = None
+    builder = None
+    depth = 0
+
+    for prefix, event, value in ijson.parse(handle):
+        if builder is not None:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+            if depth == 0:
+                if target is None:
+                    pending.append((block_id, builder.value))
+                else:
+                    record = _block_record(project_id, target, block_id, builder.value)
+                    if record:
+                        yield record
+                builder = None
+            continue
+
+        if prefix == 'targets.item' and event == 'start_map':
+            target = None
+            pending = []
+        elif prefix == 'targets.item' and event == 'end_map':
+            for pending_id, block in pending:
+                record = _block_record(project_id, target, pending_id, block)
+                if record:
+                    yield record
+            pending = []
+        elif prefix == 'targets.item.name' and event == 'string':
+            target = value
+            for pending_id, block in pending:
+                record = _block_record(project_id, target, pending_id, block)
+                if record:
+                    yield record
+            pending = []
+        elif prefix == 'targets.item.blocks' and event == 'map_key':
+            block_id = value
+            builder = ijson.ObjectBuilder()
+            depth = 0
+
+def _iter_records_loaded(handle, project_id: str) -> Generator[Dict[str, Optional[str]], None, None]:
+    project = json.load(handle)
+    for target in project.get('targets', []):
+        name = target.get('name')
+        for block_id, block in target.get('blocks', {}).items():
+            record = _block_record(project_id, name, block_id, block)
+            if record:
+                yield record
+
+def _open_project_json(path: Path):
+    """Open project.json directly or from inside an .sb3 archive, as bytes."""
+    if path.suffix == '.sb3':
+        archive = zipfile.ZipFile(path)
+        try:
+            handle = archive.open('project.json')
+        except KeyError:
+            archive.close()
+            raise ValueError(f"{path} does not contain project.json")
+        return archive, handle
+    return None, open(path, 'rb')
+
+def iter_project_records(path, project_id: Optional[str] = None) -> Generator[Dict[str, Optional[str]], None, None]:
+    """Yield normalized block records from an .sb3 archive or project.json file.
+
+    Records use the same columns as `scratch_csv.BLOCK_LINK_COLUMNS`. The project
+    id defaults to the file stem (or the parent directory for a bare project.json).
+    """
+    path = Path(path)
+    if project_id is None:
+        project_id = path.parent.name if path.name == 'project.json' else path.stem
+    archive, handle = _open_project_json(path)
+    try:
+        if ijson is not None:
+            yield from _iter_records_streaming(handle, project_id)
+        else:
+            yield from _iter_records_loaded(handle, project_id)
+    finally:
+        handle.close()
+        if archive is not None:
+            archive.close()
+
+def records_to_dataframe(records: Iterable[Dict[str, Optional[str]]]) -> pd.DataFrame:
+    """Build a DataFrame matching `read_scratch_csv(kind='allBlocks_linked')`."""
+    df = pd.DataFrame.from_records(list(records), columns=BLOCK_LINK_COLUMNS)
+    df['OpCode'] = df['OpCode'].astype('category')
+    return df
+
+def load_project(path, project_id: Optional[str] = None) -> pd.DataFrame:
+    """Load one project into a block DataFrame."""
+    return records_to_dataframe(iter_project_records(path, project_id))
+
+def _load_project_records(path: str) -> List[Dict[str, Optional[str]]]:
+    return list(iter_project_records(path))
+
+def find_project_files(directory) -> List[Path]:
+    """List .sb3 archives and project JSON files under a directory."""
+    return sorted(p for p in Path(directory).rglob('*') if p.suffix in PROJECT_SUFFIXES and p.is_file())
+
+def iter_directory_records(directory, workers: Optional[int] = None) -> Generator[Dict[str, Optional[str]], None, None]:
+    """Parse every project under `directory` in a process pool, yielding records.
+
+    Projects that fail to parse are reported and skipped.
+    """
+    paths = find_project_files(directory)
+    workers = workers or os.cpu_count() or 1
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_load_project_records, str(path)): path for path in paths}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Parsing projects"):
+            try:
+                yield from future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Error parsing {futures[future]}: {e}")
+    if failed:
+        print(f"Skipped {failed} of {len(paths)} projects that could not be parsed")
+
+def load_directory(directory, workers: Optional[int] = None) -> pd.DataFrame:
+    """Load every project under a directory into one block DataFrame."""
+    return records_to_dataframe(iter_directory_records(directory, workers))
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest Scratch 3 .sb3 archives or project.json files.")
+    parser.add_argument("path", help="An .sb3 file, a project.json file or a directory of them")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="Optional CSV path for the normalized block records")
+    args = parser.parse_args()
+
+    if Path(args.path).is_dir():
+        blocks = load_directory(args.path, args.workers)
+    else:
+        blocks = load_project(args.path)
+
+    print(f"Loaded {len(blocks):,} blocks from {blocks['ProjectId'].nunique()} projects")
+    if args.output:
+        blocks.to_csv(args.output, index=False, header=False)
+        print(f"Block records saved to {args.output}")
@@ -0,0 +1,288 @@
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Scratch 2 opcode -> Scratch 3 opcode for the blocks the scorers and reports use
+OPCODE_2_TO_3 = {
+    # Custom blocks
+    'procDef': 'procedures_definition',
+    'call': 'procedures_call',
+    # Control
+    'doForever': 'control_forever',
+    'doRepeat': 'control_repeat',
+    'doIf': 'control_if',
+    'doIfElse': 'control_if_else',
+    'doUntil': 'control_repeat_until',
+    'doWaitUntil': 'control_wait_until',
+    'wait:elapsed:from:': 'control_wait',
+    'stopScripts': 'control_stop',
+    'createCloneOf': 'control_create_clone_of',
+    'deleteClone': 'control_delete_this_clone',
+    'whenCloned': 'control_start_as_clone',
+    # Variables and lists
+    'readVariable': 'data_variable',
+    'setVar:to:': 'data_setvariableto',
+    'changeVar:by:': 'data_changevariableby',
+    'contentsOfList:': 'data_listcontents',
+    'append:toList:': 'data_addtolist',
+    'deleteLine:ofList:': 'data_deleteoflist',
+    'insert:at:ofList:': 'data_insertatlist',
+    # Events
+    'whenGreenFlag': 'event_whenflagclicked',
+    'whenKeyPressed': 'event_whenkeypressed',
+    'broadcast:': 'event_broadcast',
+    'doBroadcastAndWait': 'event_broadcastandwait',
+    'whenIReceive': 'event_whenbroadcastreceived',
+    # Sensing
+    'touching:': 'sensing_touchingobject',
+    'touchingColor:': 'sensing_touchingcolor',
+    'color:sees:': 'sensing_coloristouchingcolor',
+    'keyPressed:': 'sensing_keypressed',
+    'mousePressed': 'sensing_mousedown',
+    # Motion
+    'forward:': 'motion_movesteps',
+    'turnRight:': 'motion_turnright',
+    'turnLeft:': 'motion_turnleft',
+    'heading:': 'motion_pointindirection',
+    'pointTowards:': 'motion_pointtowards',
+    'gotoX:y:': 'motion_gotoxy',
+    'changeXposBy:': 'motion_changexby',
+    'changeYposBy:': 'motion_changeyby',
+    'xpos:': 'motion_setx',
+    'ypos:': 'motion_sety',
+    # Looks and sound
+    'hide': 'looks_hide',
+    'show': 'looks_show',
+    'lookLike:': 'looks_switchcostumeto',
+    'nextCostume': 'looks_nextcostume',
+    'startScene': 'looks_switchbackdropto',
+    'nextScene': 'looks_nextbackdrop',
+    'say:duration:elapsed:from:': 'looks_sayforsecs',
+    'playSound:': 'sound_play',
+    'doPlaySoundAndWait': 'sound_playuntildone',
+}
+
+OPCODE_3_TO_2 = {v: k for k, v in OPCODE_2_TO_3.items()}
+
+# Named opcode groups, written in Scratch 2 opcodes; Scratch 3 names are added on compile
+OPCODE_GROUPS = {
+    'control_opcodes': ['doForever', 'doRepeat', 'doIf', 'doIfElse', 'doUntil'],
+    'broadcast_opcodes': ['broadcast:', 'whenIReceive'],
+    'interaction_opcodes': ['touching:', 'touchingColor:', 'keyPressed:'],
+}
+
+# Columns of a count matrix that hold per-project metrics rather than opcode counts
+METRIC_COLUMNS = {
+    'sprites', 'total_blocks', 'custom_blocks', 'control_blocks', 'variables',
+    'lists', 'broadcasts', 'TotalBlocks', 'UniqueTargets', 'ControlBlocks', 'CustomBlocks',
+}
+
+# Declarative scorers. A model is an optional weighted sum over every opcode column
+# plus a list of terms: weight * (feature + offset), optionally gated by `when`
+# and rounded toward zero with `truncate`. Models scoring opcode count matrices set
+# `opcode_counts`, which lets `total_blocks` be derived from the opcode columns when
+# the matrix has no such column; otherwise a missing metric contributes nothing.
+SCORING_MODELS = {
+    'summary_linear': {
+        'description': 'Linear score over summary metrics (analyze_complexity)',
+        'terms': [
+            {'feature': 'total_blocks', 'weight': 0.5},
+            {'feature': 'custom_blocks', 'weight': 2},
+            {'feature': 'control_blocks', 'weight': 1.5},
+            {'feature': 'variables', 'weight': 1},
+            {'feature': 'lists', 'weight': 1.5},
+            {'feature': 'broadcasts', 'weight': 1},
+            {'feature': 'sprites', 'weight': 0.5},
+        ],
+    },
+    'weighted_blocks': {
+        'description': 'Per-opcode weights plus feature bonuses (analyze_dataset)',
+        'opcode_counts': True,
+        'default_weight': 1,
+        'opcode_weights': {
+            'procDef': 50, 'call': 20,
+            'doForever': 15, 'doRepeat': 15, 'doIf': 15, 'doIfElse': 15, 'doUntil': 15,
+            'setVar:to:': 15, 'changeVar:by:': 15, 'append:toList:': 15,
+            'deleteLine:ofList:': 15, 'insert:at:ofList:': 15,
+            'broadcast:': 15, 'whenIReceive': 15,
+            'touching:': 10, 'touchingColor:': 10, 'keyPressed:': 10, 'mousePressed': 10,
+            'forward:': 5, 'turnRight:': 5, 'turnLeft:': 5, 'heading:': 5, 'pointTowards:': 5,
+            'gotoX:y:': 5, 'changeXposBy:': 5, 'changeYposBy:': 5, 'xpos:': 5, 'ypos:': 5,
+        },
+        'terms': [
+            {'feature': 'procDef', 'weight': 100, 'when': ('procDef', '>', 0)},
+            {'feature': 'call', 'weight': 30, 'when': ('procDef', '>', 0)},
+            {'feature': 'control_opcodes', 'weight': 15},
+            {'feature': 'broadcast_opcodes', 'weight': 20},
+            {'feature': 'interaction_opcodes', 'weight': 15},
+            {'feature': 'sprites', 'weight': 25, 'when': ('sprites', '>', 1)},
+            {'feature': 'total_blocks', 'weight': 1.5, 'offset': -50,
+             'when': ('total_blocks', '>', 50), 'truncate': True},
+        ],
+    },
+    'linked_linear': {
+        'description': 'Linear score over linked-block aggregates (process_blocks)',
+        'terms': [
+            {'feature': 'TotalBlocks', 'weight': 0.5},
+            {'feature': 'UniqueTargets', 'weight': 2.0},
+            {'feature': 'ControlBlocks', 'weight': 1.5},
+            {'feature': 'CustomBlocks', 'weight': 3.0},
+        ],
+    },
+}
+
+_COMPARATORS = {
+    '>': np.greater, '>=': np.greater_equal, '<': np.less,
+    '<=': np.less_equal, '==': np.equal,
+}
+
+def with_scratch3_names(opcodes: Iterable[str]) -> List[str]:
+    """Return opcodes together with their Scratch 3 (or Scratch 2) equivalents."""
+    expanded = []
+    for opcode in opcodes:
+        expanded.append(opcode)
+        other = OPCODE_2_TO_3.get(opcode) or OPCODE_3_TO_2.get(opcode)
+        if other:
+            expanded.append(other)
+    return expanded
+
+def to_scratch3(block_counts: Dict[str, int]) -> Dict[str, int]:
+    """Rename Scratch 2 opcode counts to Scratch 3 names, merging duplicates."""
+    converted: Dict[str, int] = {}
+    for opcode, count in block_counts.items():
+        name = OPCODE_2_TO_3.get(opcode, opcode)
+        converted[name] = converted.get(name, 0) + count
+    return converted
+
+def _opcode_columns(columns) -> List[str]:
+    return [column for column in columns if column not in METRIC_COLUMNS]
+
+def _feature_resolver(feature: str, opcode_counts: bool = False) -> Callable[[pd.DataFrame], np.ndarray]:
+    """Build a function computing one feature column from a count matrix."""
+    if feature in OPCODE_GROUPS:
+        members = with_scratch3_names(OPCODE_GROUPS[feature])
+    elif feature in METRIC_COLUMNS:
+        members = None
+    else:
+        members = with_scratch3_names([feature])
+
+    def resolve(matrix: pd.DataFrame) -> np.ndarray:
+        if members is None:
+            if feature in matrix.columns:
+                return matrix[feature].to_numpy(dtype=float)
+            if feature == 'total_blocks' and opcode_counts:
+                return matrix[_opcode_columns(matrix.columns)].to_numpy(dtype=float).sum(axis=1)
+            return np.zeros(len(matrix))
+        present = [member for member in members if member in matrix.columns]
+        if not present:
+            return np.zeros(len(matrix))
+        return matrix[present].to_numpy(dtype=float).sum(axis=1)
+    return resolve
+
+def compile_model(spec: Dict[str, object]) -> Callable[[pd.DataFrame], np.ndarray]:
+    """Compile a declarative scoring model into a vectorized evaluator."""
+    opcode_weights = spec.get('opcode_weights')
+    opcode_counts = spec.get('opcode_counts', False)
+    default_weight = spec.get('default_weight')
+    expanded_weights = {}
+    if opcode_weights:
+        for opcode, weight in opcode_weights.items():
+            for name in with_scratch3_names([opcode]):
+                expanded_weights[name] = weight
+
+    terms = []
+    for term in spec.get('terms', []):
+        gate = None
+        if 'when' in term:
+            gate_feature, op, threshold = term['when']
+            gate = (_feature_resolver(gate_feature, opcode_counts), _COMPARATORS[op], threshold)
+        terms.append((_feature_resolver(term['feature'], opcode_counts), term['weight'],
+                      term.get('offset', 0), gate, term.get('truncate', False)))
+
+    def evaluate(matrix: pd.DataFrame) -> np.ndarray:
+        scores = np.zeros(len(matrix))
+        if default_weight is not None or expanded_weights:
+            columns = _opcode_columns(matrix.columns)
+            weights = np.array([expanded_weights.get(c, default_weight or 0) for c in columns], dtype=float)
+            scores += matrix[columns].to_numpy(dtype=float) @ weights
+        for resolve, weight, offset, gate, truncate in terms:
+            values = (resolve(matrix) + offset) * weight
+            if truncate:
+                values = np.trunc(values)
+            if gate is not None:
+                gate_resolve, compare, threshold = gate
+                values = np.where(compare(gate_resolve(matrix), threshold), values, 0)
+            scores += values
+        return scores
+    return evaluate
+
+_COMPILED: Dict[str, Callable[[pd.DataFrame], np.ndarray]] = {}
+
+def get_model(name: str) -> Callable[[pd.DataFrame], np.ndarray]:
+    """Return the compiled evaluator for a registered scoring model."""
+    if name not in SCORING_MODELS:
+        raise ValueError(f"Unknown scoring model '{name}', expected one of {sorted(SCORING_MODELS)}")
+    if name not in _COMPILED:
+        _COMPILED[name] = compile_model(SCORING_MODELS[name])
+    return _COMPILED[name]
+
+def register_model(name: str, spec: Dict[str, object]) -> None:
+    """Add or replace a scoring model in the registry."""
+    SCORING_MODELS[name] = spec
+    _COMPILED.pop(name, None)
+
+def score_matrix(matrix: pd.DataFrame, models: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Evaluate several scoring models over one count matrix (one column each)."""
+    models = list(models or SCORING_MODELS)
+    return pd.DataFrame({name: get_model(name)(matrix) for name in models}, index=matrix.index)
+
+def score_record(record: Dict[str, float], model: str) -> float:
+    """Score a single project given as a mapping of opcode counts and metrics."""
+    matrix = pd.DataFrame([record]) if record else pd.DataFrame(index=[0])
+    return float(get_model(model)(matrix)[0])
+
+def count_matrix(blocks: pd.DataFrame, opcode_column: str = 'Block',
+                 project_column: str = 'ProjectId', sprite_column: Optional[str] = 'SpriteName') -> pd.DataFrame:
+    """Build a projects x opcodes count matrix, with a `sprites` column when available."""
+    matrix = blocks.groupby([project_column, opcode_column], observed=True).size().unstack(fill_value=0)
+    matrix.columns = [str(column) for column in matrix.columns]
+    if sprite_column and sprite_column in blocks.columns:
+        matrix['sprites'] = blocks.groupby(project_column)[sprite_column].nunique()
+        matrix['sprites'] = matrix['sprites'].fillna(0).astype(int)
+    return matrix
+
+def count_matrix_from_chunks(chunks: Iterable[pd.DataFrame], opcode_column: str = 'Block',
+                             project_column: str = 'ProjectId',
+                             sprite_column: Optional[str] = 'SpriteName') -> pd.DataFrame:
+    """Accumulate a count matrix over chunked reads, so projects may span chunks."""
+    matrices = []
+    sprite_pairs = []
+    for chunk in chunks:
+        matrices.append(count_matrix(chunk, opcode_column, project_column, None))
+        if sprite_column:
+            sprite_pairs.append(chunk[[project_column, sprite_column]].dropna().drop_duplicates())
+    if not matrices:
+        return pd.DataFrame()
+    matrix = pd.concat(matrices).fillna(0).groupby(level=0).sum().astype(int)
+    if sprite_pairs:
+        sprites = pd.concat(sprite_pairs).drop_duplicates().groupby(project_column).size()
+        matrix['sprites'] = sprites.reindex(matrix.index, fill_value=0)
+    return matrix
+
+if __name__ == "__main__":
+    import argparse
+
+    from src.utils.scratch_csv import iter_scratch_csv
+
+    parser = argparse.ArgumentParser(description="Score every project in allBlocks.csv with several models in one pass.")
+    parser.add_argument("file_path", help="Path to allBlocks.csv (Scratch 2 layout)")
+    parser.add_argument("--models", nargs="+", default=None, choices=sorted(SCORING_MODELS))
+    parser.add_argument("--output", default="project_scores.csv")
+    args = parser.parse_args()
+
+    matrix = count_matrix_from_chunks(iter_scratch_csv(args.file_path, kind='allBlocks'))
+    scores = score_matrix(matrix, args.models)
+    scores.to_csv(args.output)
+    print(scores.describe())
+    print(f"Scores for {len(scores):,} projects saved to {args.output}")
@@ -0,0 +1,400 @@
+import csv
+import io
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Generator, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is optional; fall back to the csv.reader tokenizer
+    pa = None
+    pa_csv = None
+
+# Scratch 2 export layout used by the line-by-line scanners and analyze_dataset
+ALL_BLOCKS_COLUMNS = ['ProjectId', 'Coordinates', 'SpriteIndex', 'Type',
+                      'SpriteName', 'ScriptId', 'BlockIndex', 'Block',
+                      'Param1', 'Param2', 'Param3']
+
+# Linked-block layout used by the evaluation scripts
+BLOCK_LINK_COLUMNS = ['ProjectId', 'BlockId', 'ParentId', 'Type', 'Target',
+                      'OpCode', 'NextBlock', 'Comment', 'Input']
+
+SCRIPTS_COLUMNS = ['project_id', 'block_id', 'sprite_id', 'type', 'name', 'x', 'y', 'z']
+
+# Column layout and the column holding the opcode (stored as a categorical)
+SCHEMAS = {
+    'allBlocks': (ALL_BLOCKS_COLUMNS, 'Block'),
+    'allBlocks_linked': (BLOCK_LINK_COLUMNS, 'OpCode'),
+    'scripts': (SCRIPTS_COLUMNS, 'type'),
+    'properties': (None, None),  # properties.csv carries its own header row
+}
+
+NUMERIC_COLUMNS = {'SpriteIndex', 'ScriptId', 'BlockIndex', 'x', 'y', 'z'}
+
+def new_read_stats(file_path) -> Dict[str, object]:
+    """Create the counters reported by every reader."""
+    return {
+        'file': str(file_path),
+        'rows': 0,
+        'short_rows_padded': 0,
+        'long_rows_skipped': 0,
+        'malformed_rows_skipped': 0,
+        'bytes_read': 0,
+        'skipped_line_numbers': [],
+    }
+
+def report_read_stats(stats: Dict[str, object]) -> None:
+    """Print a summary of the rows that were padded or dropped while reading."""
+    skipped = stats['long_rows_skipped'] + stats['malformed_rows_skipped']
+    print(f"{stats['file']}: {stats['rows']:,} rows read, "
+          f"{stats['short_rows_padded']:,} short rows padded, {skipped:,} rows skipped")
+    if stats['skipped_line_numbers']:
+        sample = ', '.join(str(n) for n in stats['skipped_line_numbers'][:10])
+        print(f"  first skipped lines: {sample}")
+
+def _note_skipped(stats: Dict[str, object], line_number: Optional[int], key: str) -> None:
+    stats[key] += 1
+    if line_number is not None and len(stats['skipped_line_numbers']) < 1000:
+        stats['skipped_line_numbers'].append(line_number)
+
+def _pad_row(fields: List[str], width: int) -> List[Optional[str]]:
+    """Pad a short row with nulls, mirroring `row + [None] * (width - len(row))`."""
+    return [field if field != '' else None for field in fields] + [None] * (width - len(fields))
+
+def _apply_types(df: pd.DataFrame, opcode_column: Optional[str]) -> pd.DataFrame:
+    """Convert numeric index columns and store the opcode column as a categorical."""
+    for column in df.columns:
+        if column in NUMERIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
+    if opcode_column and opcode_column in df.columns and df[opcode_column].dtype != 'category':
+        df[opcode_column] = df[opcode_column].astype('category')
+    return df
+
+def _resolve_schema(kind: str) -> Tuple[Optional[List[str]], Optional[str]]:
+    if kind not in SCHEMAS:
+        raise ValueError(f"Unknown CSV kind '{kind}', expected one of {sorted(SCHEMAS)}")
+    return SCHEMAS[kind]
+
+# An escape consumes the next byte, so an escaped quote does not open or close a field
+_QUOTE_OR_ESCAPE = re.compile(rb'\\.|"', re.S)
+
+def _row_boundary(buffer: bytes) -> int:
+    """Offset just past the last newline in `buffer` that is not inside a quoted field, or 0."""
+    end = buffer.rfind(b'\n')
+    escaped = b'\\' in buffer
+    while end >= 0:
+        if escaped:
+            quotes = _QUOTE_OR_ESCAPE.findall(buffer, 0, end).count(b'"')
+        else:
+            quotes = buffer.count(b'"', 0, end)
+        if quotes % 2 == 0:
+            return end + 1
+        end = buffer.rfind(b'\n', 0, end)
+    return 0
+
+def _iter_row_blocks(handle, block_size: int) -> Generator[bytes, None, None]:
+    """Yield roughly `block_size` bytes at a time, always ending on a row boundary."""
+    leftover = b''
+    while True:
+        data = handle.read(block_size)
+        if not data:
+            if leftover:
+                yield leftover
+            return
+        buffer = leftover + data
+        split = _row_boundary(buffer)
+        # A row longer than the block keeps accumulating until it ends
+        block, leftover = buffer[:split], buffer[split:]
+        if block:
+            yield block
+
+def _read_header(handle, columns: Optional[List[str]]) -> List[str]:
+    """Column names: the schema's, or the file's own header row."""
+    if columns is not None:
+        return columns
+    line = handle.readline().decode('utf-8')
+    return next(csv.reader([line], escapechar='\\'), [])
+
+def _arrow_options(columns, opcode_column, events, use_threads):
+    """Build pyarrow read/parse/convert options with an explicit ragged-row handler."""
+    def handle_invalid_row(row):
+        if row.actual_columns < row.expected_columns and row.text:
+            events.append('short')
+        elif row.actual_columns > row.expected_columns:
+            events.append('long_rows_skipped')
+        else:
+            events.append('malformed_rows_skipped')
+        return 'skip'
+
+    read_options = pa_csv.ReadOptions(use_threads=use_threads, column_names=columns, block_size=1 << 20)
+    parse_options = pa_csv.ParseOptions(
+        escape_char='\\',
+        newlines_in_values=True,
+        invalid_row_handler=handle_invalid_row,
+    )
+    column_types = {name: pa.string() for name in columns if name not in NUMERIC_COLUMNS}
+    if opcode_column:
+        column_types[opcode_column] = pa.dictionary(pa.int32(), pa.string())
+    convert_options = pa_csv.ConvertOptions(
+        column_types=column_types,
+        strings_can_be_null=True,
+        null_values=[''],
+    )
+    return read_options, parse_options, convert_options
+
+def _parse_block_with_arrow(block: bytes, columns, opcode_column, stats, use_threads) -> Optional[pd.DataFrame]:
+    """Parse one block with pyarrow, or return None when it has short rows to pad."""
+    events = []
+    options = _arrow_options(columns, opcode_column, events, use_threads)
+    table = pa_csv.read_csv(io.BytesIO(block), *options)
+    if 'short' in events:
+        return None
+    for key in events:
+        _note_skipped(stats, None, key)
+    stats['rows'] += table.num_rows
+    df = table.to_pandas()
+    for column in df.columns:
+        # pandas 3 maps arrow strings to its str dtype; keep object columns with None
+        # like the csv.reader path so both engines return the same frames
+        if isinstance(df[column].dtype, pd.StringDtype):
+            df[column] = df[column].astype(object).where(df[column].notna(), None)
+    return df
+
+def _split_rows(block: bytes, size: int) -> Generator[bytes, None, None]:
+    """Split a block of whole rows into pieces of about `size` bytes."""
+    start = 0
+    while start < len(block):
+        end = start + _row_boundary(block[start:start + size]) if start + size < len(block) else len(block)
+        if end == start:  # one row longer than `size`
+            end = start + _row_boundary(block[start:]) or len(block)
+        yield block[start:end]
+        start = end
+
+def _parse_block(block: bytes, columns, opcode_column, stats, use_threads,
+                 piece_size: int = 1 << 20) -> List[pd.DataFrame]:
+    """Frames for one block, in order: pyarrow where possible, `csv.reader` around short rows.
+
+    pyarrow can only skip short rows, and does not report where they were, so a
+    block containing any is parsed again in small pieces, and the pieces holding
+    them are re-tokenized with `csv.reader`, which pads them in place.
+    """
+    df = _parse_block_with_arrow(block, columns, opcode_column, stats, use_threads)
+    if df is not None:
+        return [df]
+    frames = []
+    for piece in _split_rows(block, piece_size):
+        df = _parse_block_with_arrow(piece, columns, opcode_column, stats, False)
+        if df is None:
+            frames.extend(_iter_python_chunks(io.BytesIO(piece), columns, stats, len(piece)))
+        else:
+            frames.append(df)
+    return frames
+
+def _iter_arrow_frames(handle, columns, opcode_column, stats, use_threads=True,
+                       block_size=1 << 24) -> Generator[pd.DataFrame, None, None]:
+    """Parse the file block by block with pyarrow, yielding frames in file order."""
+    for block in _iter_row_blocks(handle, block_size):
+        frames = _parse_block(block, columns, opcode_column, stats, use_threads)
+        stats['bytes_read'] = handle.tell()
+        for df in frames:
+            if len(df):
+                yield df
+
+def _rechunk(frames, chunk_size: int) -> Generator[pd.DataFrame, None, None]:
+    """Regroup frames into chunks of exactly `chunk_size` rows (the last may be shorter)."""
+    pending, pending_rows = [], 0
+    for frame in frames:
+        pending.append(frame)
+        pending_rows += len(frame)
+        while pending_rows >= chunk_size:
+            combined = pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+            yield combined.iloc[:chunk_size].reset_index(drop=True)
+            rest = combined.iloc[chunk_size:]
+            pending, pending_rows = ([rest] if len(rest) else []), len(rest)
+    if pending:
+        yield pd.concat(pending, ignore_index=True)
+
+def _read_with_arrow(file_path, columns, opcode_column, stats, use_threads=True,
+                     block_size=1 << 24) -> pd.DataFrame:
+    with open(file_path, 'rb') as handle:
+        columns = _read_header(handle, columns)
+        frames = list(_iter_arrow_frames(handle, columns, opcode_column, stats, use_threads, block_size))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+def _iter_python_chunks(handle, columns, stats, chunk_size) -> Generator[pd.DataFrame, None, None]:
+    """Tokenize with `csv.reader`, padding short rows and counting long ones."""
+    csv.field_size_limit(sys.maxsize)
+    text = io.TextIOWrapper(handle, encoding='utf-8', newline='')
+    reader = csv.reader(text, escapechar='\\')
+    if columns is None:
+        columns = next(reader, [])
+    width = len(columns)
+    rows = []
+    for fields in reader:
+        if len(fields) == width:
+            rows.append([field if field != '' else None for field in fields])
+        elif 0 < len(fields) < width:
+            stats['short_rows_padded'] += 1
+            rows.append(_pad_row(fields, width))
+        elif len(fields) > width:
+            _note_skipped(stats, reader.line_num, 'long_rows_skipped')
+        if len(rows) >= chunk_size:
+            stats['rows'] += len(rows)
+            stats['bytes_read'] = handle.tell()
+            yield pd.DataFrame(rows, columns=columns, dtype=object)
+            rows = []
+    stats['rows'] += len(rows)
+    stats['bytes_read'] = handle.tell()
+    if rows:
+        yield pd.DataFrame(rows, columns=columns, dtype=object)
+
+def _read_with_python(file_path, columns, stats) -> pd.DataFrame:
+    with open(file_path, 'rb') as handle:
+        chunks = list(_iter_python_chunks(handle, columns, stats, 1 << 20))
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(chunks, ignore_index=True)
+
+def read_scratch_csv(file_path, kind: str = 'allBlocks', engine: str = 'auto',
+                     use_threads: bool = True, report: bool = True) -> Tuple[pd.DataFrame, Dict[str, object]]:
+    """Read one of the TUDelft CSV exports into typed columns.
+
+    Short rows are padded with nulls, rows with extra fields are skipped, and every
+    padded or skipped line is counted in the returned stats instead of being dropped
+    silently. `engine` is 'pyarrow' (multithreaded), 'python' (`csv.reader`) or 'auto'.
+    """
+    columns, opcode_column = _resolve_schema(kind)
+    stats = new_read_stats(file_path)
+
+    if engine == 'auto':
+        engine = 'pyarrow' if pa_csv is not None else 'python'
+    if engine == 'pyarrow':
+        if pa_csv is None:
+            raise ImportError("pyarrow is required for engine='pyarrow'")
+        df = _read_with_arrow(file_path, columns, opcode_column, stats, use_threads=use_threads)
+    elif engine == 'python':
+        df = _read_with_python(file_path, columns, stats)
+    else:
+        raise ValueError(f"Unknown engine '{engine}'")
+
+    df = _apply_types(df, opcode_column)
+    if report:
+        report_read_stats(stats)
+    return df, stats
+
+def iter_scratch_csv(file_path, kind: str = 'allBlocks', chunk_size: int = 100000,
+                     engine: str = 'auto', stats: Optional[Dict[str, object]] = None,
+                     block_size: int = 1 << 22) -> Generator[pd.DataFrame, None, None]:
+    """Yield typed chunks of `chunk_size` rows, in file order, with the same ragged-row handling.
+
+    Pass a dict from `new_read_stats` as `stats` to follow the counters (including
+    `bytes_read`, for progress reporting) while the file is being consumed.
+    """
+    columns, opcode_column = _resolve_schema(kind)
+    if stats is None:
+        stats = new_read_stats(file_path)
+
+    if engine == 'auto':
+        engine = 'pyarrow' if pa_csv is not None else 'python'
+
+    with open(file_path, 'rb') as handle:
+        if engine == 'pyarrow':
+            if pa_csv is None:
+                raise ImportError("pyarrow is required for engine='pyarrow'")
+            frames = _iter_arrow_frames(handle, _read_header(handle, columns), opcode_column, stats,
+                                        block_size=block_size)
+        elif engine == 'python':
+            frames = _iter_python_chunks(handle, columns, stats, chunk_size)
+        else:
+            raise ValueError(f"Unknown engine '{engine}'")
+        for chunk in _rechunk(frames, chunk_size):
+            yield _apply_types(chunk, opcode_column)
+
+def iter_csv_rows(file_path, width: Optional[int] = None, stats: Optional[Dict[str, object]] = None) -> Generator[List[Optional[str]], None, None]:
+    """Yield raw rows from `csv.reader`, padded to `width` fields when given.
+
+    This is the low-overhead path for the line-by-line scanners; rows longer than
+    `width` are kept as-is since trailing parameters are optional there.
+    """
+    csv.field_size_limit(sys.maxsize)
+    if stats is None:
+        stats = new_read_stats(file_path)
+    with open(file_path, 'r', encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            stats['rows'] += 1
+            if width is not None and len(row) < width:
+                stats['short_rows_padded'] += 1
+                row = row + [None] * (width - len(row))
+            yield row
+
+def benchmark_readers(file_path, kind: str = 'allBlocks', repeat: int = 1) -> pd.DataFrame:
+    """Compare parse throughput of the legacy readers against this module.
+
+    Without pyarrow only the python engine is timed, and a note says so.
+    """
+    columns, _ = _resolve_schema(kind)
+    size_mb = Path(file_path).stat().st_size / (1024 * 1024)
+
+    def legacy_pandas():
+        kwargs = {'names': columns, 'header': 0 if columns is None else None}
+        return len(pd.read_csv(file_path, on_bad_lines='skip', quoting=csv.QUOTE_ALL,
+                               escapechar='\\', dtype=str, **kwargs))
+
+    def legacy_csv_reader():
+        csv.field_size_limit(sys.maxsize)
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return sum(1 for _ in csv.reader(file))
+
+    candidates = {
+        'pd.read_csv (legacy)': legacy_pandas,
+        'csv.reader (legacy)': legacy_csv_reader,
+        'read_scratch_csv[python]': lambda: len(read_scratch_csv(file_path, kind, engine='python', report=False)[0]),
+    }
+    if pa_csv is not None:
+        candidates['read_scratch_csv[pyarrow]'] = lambda: len(read_scratch_csv(file_path, kind, engine='pyarrow', report=False)[0])
+    else:
+        print("pyarrow is not installed: engine='auto' falls back to the csv.reader path "
+              "(pip install -r requirements.txt for the fast path)")
+
+    results = []
+    for name, reader in candidates.items():
+        timings = []
+        rows = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = reader()
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results.append({
+            'reader': name,
+            'rows': rows,
+            'seconds': best,
+            'rows_per_second': rows / best if best else float('inf'),
+            'mb_per_second': size_mb / best if best else float('inf'),
+        })
+    return pd.DataFrame(results)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Read or benchmark the TUDelft Scratch CSV exports.")
+    parser.add_argument("file_path", help="Path to allBlocks.csv, scripts.csv or properties.csv")
+    parser.add_argument("--kind", default="allBlocks", choices=sorted(SCHEMAS))
+    parser.add_argument("--engine", default="auto", choices=["auto", "pyarrow", "python"])
+    parser.add_argument("--benchmark", action="store_true", help="Compare against the legacy readers")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(benchmark_readers(args.file_path, args.kind, args.repeat).to_string(index=False))
+    else:
+        df, _ = read_scratch_csv(args.file_path, args.kind, engine=args.engine)
+        print(df.dtypes)
+        print(df.head())
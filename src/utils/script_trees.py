@@ -0,0 +1,137 @@
+from typing import Dict, Iterable, List, Optional, Union
+
+import pandas as pd
+
+def _missing(value) -> bool:
+    """Treat None, NaN and empty strings from the CSV readers as absent links."""
+    return value is None or value != value or value == ''
+
+class ScriptNode:
+    """A block in a script tree.
+
+    `next` continues the same stack; `children` are blocks nested inside this one
+    (C-block substacks and reporters plugged into inputs).
+    """
+
+    __slots__ = ('block_id', 'opcode', 'target', 'next_id', 'parent_id', 'next', 'children', 'depth')
+
+    def __init__(self, block_id, opcode, target, next_id, parent_id):
+        self.block_id = block_id
+        self.opcode = opcode
+        self.target = target
+        self.next_id = next_id
+        self.parent_id = parent_id
+        self.next: Optional['ScriptNode'] = None
+        self.children: List['ScriptNode'] = []
+        self.depth = 0
+
+class Script:
+    """A top-level script with its size and nesting summary."""
+
+    __slots__ = ('root', 'length', 'stack_length', 'max_depth')
+
+    def __init__(self, root: ScriptNode, length: int, stack_length: int, max_depth: int):
+        self.root = root
+        self.length = length
+        self.stack_length = stack_length
+        self.max_depth = max_depth
+
+    @property
+    def hat_opcode(self) -> Optional[str]:
+        return self.root.opcode
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'hat': self.hat_opcode,
+            'blocks': self.length,
+            'stack_length': self.stack_length,
+            'max_depth': self.max_depth,
+        }
+
+def _iter_block_rows(blocks) -> Iterable[tuple]:
+    """Yield (BlockId, OpCode, Target, NextBlock, ParentId) from records or a DataFrame."""
+    columns = ['BlockId', 'OpCode', 'Target', 'NextBlock', 'ParentId']
+    if isinstance(blocks, pd.DataFrame):
+        return zip(*(blocks[column].tolist() for column in columns))
+    return ((block.get(column) for column in columns) for block in blocks)
+
+def _walk(root: ScriptNode, visited: set) -> Script:
+    """Assign depths below `root` iteratively and summarize the script."""
+    length = 0
+    max_depth = 0
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if node.block_id in visited:
+            continue
+        visited.add(node.block_id)
+        node.depth = depth
+        length += 1
+        if depth > max_depth:
+            max_depth = depth
+        if node.next is not None:
+            stack.append((node.next, depth))
+        for child in node.children:
+            stack.append((child, depth + 1))
+
+    stack_length = 0
+    node = root
+    while node is not None and stack_length <= length:
+        stack_length += 1
+        node = node.next
+    return Script(root, length, stack_length, max_depth)
+
+def build_script_trees(blocks: Union[pd.DataFrame, Iterable[Dict[str, object]]]) -> Dict[str, List[Script]]:
+    """Rebuild per-sprite script trees from flat block rows.
+
+    Accepts a project's rows as a DataFrame or as records with the BlockId, OpCode,
+    Target, NextBlock and ParentId fields. Links are resolved through a dict index
+    in linear time, so there is no per-sprite or per-block DataFrame filtering.
+    Returns scripts grouped by target, in order of first appearance.
+    """
+    index: Dict[str, ScriptNode] = {}
+    nodes: List[ScriptNode] = []
+    for block_id, opcode, target, next_id, parent_id in _iter_block_rows(blocks):
+        if _missing(block_id):
+            block_id = f"_row{len(nodes)}"
+        node = ScriptNode(block_id, opcode, target,
+                          None if _missing(next_id) else next_id,
+                          None if _missing(parent_id) else parent_id)
+        index[block_id] = node
+        nodes.append(node)
+
+    has_predecessor = set()
+    for node in nodes:
+        if node.next_id is not None:
+            successor = index.get(node.next_id)
+            if successor is not None and successor is not node:
+                node.next = successor
+                has_predecessor.add(successor.block_id)
+    for node in nodes:
+        parent = index.get(node.parent_id) if node.parent_id is not None else None
+        if parent is not None and parent.next_id != node.block_id and parent is not node:
+            parent.children.append(node)
+            has_predecessor.add(node.block_id)
+
+    scripts: Dict[str, List[Script]] = {}
+    visited = set()
+    for node in nodes:
+        if node.block_id not in has_predecessor:
+            scripts.setdefault(node.target, []).append(_walk(node, visited))
+    # Blocks caught in link cycles have no root; report each cycle as its own script
+    for node in nodes:
+        if node.block_id not in visited:
+            scripts.setdefault(node.target, []).append(_walk(node, visited))
+    return scripts
+
+def summarize_scripts(scripts: Dict[str, List[Script]]) -> Dict[str, Dict[str, object]]:
+    """Reduce script trees to per-sprite counts, lengths and nesting depth."""
+    return {
+        target: {
+            'scripts': len(target_scripts),
+            'blocks': sum(script.length for script in target_scripts),
+            'longest_script': max((script.length for script in target_scripts), default=0),
+            'max_depth': max((script.max_depth for script in target_scripts), default=0),
+        }
+        for target, target_scripts in scripts.items()
+    }
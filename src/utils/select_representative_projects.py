@@ -1,84 +1,64 @@
 import json
-import csv
 import time
 from collections import Counter
 
+from src.utils.block_records import ROW_WIDTH, OpcodeVocabulary, iter_projects, iter_reported_structures
+from src.utils.scratch_csv import iter_csv_rows, new_read_stats, report_read_stats
+
 def load_analysis_results(file_path):
     with open(file_path, 'r') as f:
         return json.load(f)
 
-def read_csv_line_by_line(file_path):
-    import sys
-    csv.field_size_limit(sys.maxsize)  # Set field size limit to maximum possible value
-    with open(file_path, 'r', encoding='utf-8') as file:
-        csv_reader = csv.reader(file)
-        for row in csv_reader:
-            yield row
-
 def select_representative_projects(allblocks_path, analysis_results, num_projects=1000):
-    common_block_types = set(analysis_results['block_types'].keys())
-    common_project_structures = [tuple(eval(k)) for k in analysis_results['project_structures'].keys()]
+    # Reuse the saved vocabulary so bit positions match the analysis run
+    vocabulary = OpcodeVocabulary(analysis_results.get('opcode_vocabulary', analysis_results['block_types'].keys()))
+    common_block_bits = vocabulary.bitset(analysis_results['block_types'].keys())
+    common_structure_bits = {vocabulary.bitset(opcodes) for opcodes, _ in iter_reported_structures(analysis_results)}
 
     project_scores = Counter()
-    current_project = None
-    current_project_blocks = set()
 
-    total_rows = sum(1 for _ in read_csv_line_by_line(allblocks_path))
-    processed_rows = 0
+    total_rows = sum(1 for _ in iter_csv_rows(allblocks_path))
+    stats = new_read_stats(allblocks_path)
     last_log_time = time.time()
 
-    for row in read_csv_line_by_line(allblocks_path):
-        try:
-            processed_rows += 1
+    def logged_rows():
+        nonlocal last_log_time
+        for row in iter_csv_rows(allblocks_path, ROW_WIDTH, stats):
             if time.time() - last_log_time > 5:  # Log every 5 seconds
-                print(f"Processed {processed_rows}/{total_rows} rows ({processed_rows/total_rows*100:.2f}%)")
+                print(f"Processed {stats['rows']}/{total_rows} rows ({stats['rows']/total_rows*100:.2f}%)")
                 last_log_time = time.time()
+            yield row
 
-            project_id, _, _, _, _, _, _, opcode, *params = row + [None] * (11 - len(row))
-
-            if current_project != project_id:
-                if current_project is not None:
-                    # Score the project based on common block types and structures
-                    project_scores[current_project] += len(current_project_blocks & common_block_types)
-                    if tuple(sorted(current_project_blocks)) in common_project_structures:
-                        project_scores[current_project] += 10  # Bonus for matching common structure
-
-                current_project = project_id
-                current_project_blocks = set()
-
-            if opcode:
-                current_project_blocks.add(opcode)
-
-        except Exception as e:
-            print(f"Error processing row {processed_rows}: {e}")
-            continue
-
-    # Score the last project
-    if current_project is not None:
-        project_scores[current_project] += len(current_project_blocks & common_block_types)
-        if tuple(sorted(current_project_blocks)) in common_project_structures:
-            project_scores[current_project] += 10
+    for project in iter_projects(logged_rows(), vocabulary):
+        # Score the project based on common block types and structures
+        project_scores[project.project_id] += project.common_opcode_count(common_block_bits)
+        if project.opcode_bits in common_structure_bits:
+            project_scores[project.project_id] += 10  # Bonus for matching common structure
 
-    print(f"Finished processing {processed_rows} rows. Selecting top projects...")
+    report_read_stats(stats)
+    print(f"Finished processing {stats['rows']} rows. Selecting top projects...")
 
     # Select the top scoring projects
     representative_projects = [project for project, _ in project_scores.most_common(num_projects)]
     return representative_projects
 
-if __name__ == "__main__":
-    analysis_results_path = "block_analysis_results.json"
-    allblocks_path = "/home/ubuntu/keto_app_clone/keto_app/allBlocks.csv"
-
+def main(allblocks_path, analysis_results_path="block_analysis_results.json",
+         output_path="representative_projects.json", num_projects=1000):
     print("Loading analysis results...")
     analysis_results = load_analysis_results(analysis_results_path)
 
     print("Selecting representative projects...")
-    representative_projects = select_representative_projects(allblocks_path, analysis_results)
+    representative_projects = select_representative_projects(allblocks_path, analysis_results, num_projects)
 
     print(f"Selected {len(representative_projects)} representative projects.")
 
     # Save the list of representative project IDs
-    with open("representative_projects.json", "w") as f:
+    with open(output_path, "w") as f:
         json.dump(representative_projects, f, indent=2)
 
-    print("Representative project IDs saved to representative_projects.json")
+    print(f"Representative project IDs saved to {output_path}")
+
+if __name__ == "__main__":
+    import sys
+
+    main(sys.argv[1] if len(sys.argv) > 1 else "/home/ubuntu/keto_app_clone/keto_app/allBlocks.csv")
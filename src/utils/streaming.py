@@ -0,0 +1,93 @@
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from src.utils.completion_format import CompletionParser
+from src.utils.prompt_templates import count_tokens
+
+def consume_stream(deltas: Iterable[str], started: float, abort_on_invalid: bool = True,
+                   close: Optional[Callable[[], None]] = None) -> Dict[str, object]:
+    """Read text deltas, validating the completion format as they arrive.
+
+    With `abort_on_invalid`, reading stops (and `close` is called to cancel the
+    generation) at the first delta after which the output can no longer be valid.
+    `started` is the time.monotonic() at which the request was sent.
+    """
+    parser = CompletionParser()
+    parts: List[str] = []
+    first_token_at = None
+    aborted = False
+    try:
+        for delta in deltas:
+            if not delta:
+                continue
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            parts.append(delta)
+            parser.feed(delta)
+            if abort_on_invalid and parser.error is not None:
+                aborted = True
+                break
+    finally:
+        if aborted and close is not None:
+            close()
+    finished = time.monotonic()
+    parser.close()
+
+    text = ''.join(parts)
+    output_tokens = count_tokens(text) if text else 0
+    decode_time = finished - first_token_at if first_token_at is not None else 0.0
+    return {
+        'text': text,
+        'parser': parser,
+        'aborted': aborted,
+        'format_error': parser.error,
+        'ttft': first_token_at - started if first_token_at is not None else None,
+        'elapsed': finished - started,
+        'output_tokens': output_tokens,
+        'tokens_per_second': output_tokens / decode_time if decode_time > 0 else None,
+    }
+
+def stream_openai_chat(client, model: str, messages: List[Dict[str, str]], abort_on_invalid: bool = True,
+                       **kwargs) -> Dict[str, object]:
+    """Stream an OpenAI-compatible chat completion through consume_stream."""
+    started = time.monotonic()
+    stream = client.chat.completions.create(model=model, messages=messages, stream=True,
+                                            stream_options={'include_usage': True}, **kwargs)
+    usage = {}
+
+    def deltas():
+        for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                usage['usage'] = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    result = consume_stream(deltas(), started, abort_on_invalid, close=stream.close)
+    result['usage'] = usage.get('usage')
+    if result['usage'] is not None and getattr(result['usage'], 'completion_tokens', None):
+        result['output_tokens'] = result['usage'].completion_tokens
+    return result
+
+def stream_anthropic_message(client, model: str, messages: List[Dict[str, str]], abort_on_invalid: bool = True,
+                             **kwargs) -> Dict[str, object]:
+    """Stream an Anthropic message; leaving the stream context cancels generation."""
+    started = time.monotonic()
+    with client.messages.stream(model=model, messages=messages, **kwargs) as stream:
+        result = consume_stream(stream.text_stream, started, abort_on_invalid)
+        result['usage'] = None if result['aborted'] else stream.get_final_message().usage
+    if result['usage'] is not None:
+        result['output_tokens'] = result['usage'].output_tokens
+    return result
+
+def summarize_streams(streams: List[Dict[str, object]]) -> Dict[str, object]:
+    """Aggregate TTFT, decode rate and abort counts over streamed calls."""
+    ttfts = [s['ttft'] for s in streams if s.get('ttft') is not None]
+    rates = [s['tokens_per_second'] for s in streams if s.get('tokens_per_second')]
+    return {
+        'calls': len(streams),
+        'aborted': sum(1 for s in streams if s.get('aborted')),
+        'ttft_avg': sum(ttfts) / len(ttfts) if ttfts else None,
+        'tokens_per_second_avg': sum(rates) / len(rates) if rates else None,
+        'output_tokens': sum(s.get('output_tokens') or 0 for s in streams),
+        'elapsed': sum(s.get('elapsed') or 0.0 for s in streams),
+    }
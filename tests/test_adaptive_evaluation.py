@@ -0,0 +1,30 @@
+import pytest
+
+from src.evaluation.adaptive_evaluation import (SPENDING, bootstrap_ci, look_confidences, look_schedule,
+                                                run_adaptive)
+
+def test_looks_are_few_and_end_at_the_sample_size():
+    sizes = look_schedule(13000, min_examples=20, batch_size=10, max_looks=6)
+    assert len(sizes) <= 6
+    assert sizes[0] == 20 and sizes[-1] == 13000
+    assert sizes == sorted(set(sizes))
+    assert all(size % 10 == 0 for size in sizes)
+    assert look_schedule(15, min_examples=20) == [15]
+
+@pytest.mark.parametrize("spending", SPENDING)
+def test_error_spent_over_the_looks_is_at_most_alpha(spending):
+    levels = look_confidences(look_schedule(13000, 20), 0.95, spending)
+    assert sum(1 - level for level in levels) == pytest.approx(0.05)
+    assert all(0.95 <= level <= 1 for level in levels)
+
+def test_bootstrap_stays_cheap_at_per_look_levels():
+    mean, low, high = bootstrap_ci([0.0, 1.0] * 250, confidence=1 - 0.05 / 6)
+    assert low < mean < high
+    assert high - low < 0.2
+
+def test_constant_scores_never_stop_the_run():
+    evaluators = {name: (lambda example: {"semantic_similarity": 0.0}) for name in ("a", "b")}
+    summary = run_adaptive(evaluators, [{"i": i} for i in range(100)], metrics=("semantic_similarity",),
+                           concurrency=1)
+    assert summary["examples_used"] == 100
+    assert summary["stopped_because"] == "examples exhausted"
@@ -0,0 +1,107 @@
+import json
+import random
+import time
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+pytest.importorskip("openai")
+
+from src.evaluation.mock_server import MockModel, running_mock_server
+from src.utils.analyze_image import analyze_batch
+from src.utils.image_cache import ImageAnalysisCache
+
+class TrackingModel(MockModel):
+    """Mock model that records when each request is being served."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.intervals = []
+
+    def sample(self):
+        latency, failed = super().sample()
+        start = time.monotonic()
+        with self._lock:
+            self.intervals.append((start, start + latency))
+        return latency, failed
+
+    def max_overlap(self):
+        events = sorted([(start, 1) for start, _ in self.intervals] + [(end, -1) for _, end in self.intervals],
+                        key=lambda event: (event[0], event[1]))
+        current = peak = 0
+        for _, step in events:
+            current += step
+            peak = max(peak, current)
+        return peak
+
+def noise_image(seed, size=64):
+    rng = random.Random(seed)
+    image = Image.new("L", (size, size))
+    image.putdata([rng.randrange(256) for _ in range(size * size)])
+    return image
+
+def write_images(directory, count):
+    for index in range(count):
+        noise_image(index).save(directory / f"shot_{index:02d}.png")
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+@pytest.fixture(autouse=True)
+def isolated_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "local")
+    monkeypatch.setattr("src.utils.call_metrics.CALL_METRICS_PATH", str(tmp_path / "call_metrics.jsonl"))
+
+def test_identical_and_near_duplicate_images_are_sent_once(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    write_images(images, 3)
+    (images / "shot_copy.png").write_bytes((images / "shot_00.png").read_bytes())
+    near = noise_image(0)
+    near.putpixel((0, 0), (near.getpixel((0, 0)) + 1) % 256)
+    near.save(images / "shot_near.png")
+    output = tmp_path / "analysis.jsonl"
+
+    model = TrackingModel()
+    with running_mock_server(model) as url:
+        calls = analyze_batch(str(images), str(output), base_url=f"{url}/v1",
+                              cache=ImageAnalysisCache(str(tmp_path / "cache.jsonl")))
+
+    assert calls == 3
+    assert model.stats["requests"] == 3
+    records = {record["path"].rsplit("/", 1)[1]: record for record in read_records(output)}
+    assert len(records) == 5
+    assert records["shot_copy.png"]["duplicate_of"].endswith("shot_00.png")
+    assert records["shot_near.png"]["near_duplicate_of"].endswith("shot_00.png")
+    assert records["shot_near.png"]["analysis"] == records["shot_00.png"]["analysis"]
+
+def test_a_second_run_resumes_from_the_output(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    write_images(images, 4)
+    output = tmp_path / "analysis.jsonl"
+
+    with running_mock_server(MockModel()) as url:
+        assert analyze_batch(str(images), str(output), base_url=f"{url}/v1") == 4
+        first = read_records(output)
+        # Simulate a run killed part-way: two finished records and a torn line
+        with open(output, "w") as f:
+            for record in first[:2]:
+                f.write(json.dumps(record) + "\n")
+            f.write('{"path": "cut')
+        assert analyze_batch(str(images), str(output), base_url=f"{url}/v1") == 2
+
+    assert read_records(output) == first
+
+def test_requests_stay_within_the_concurrency_bound(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    write_images(images, 12)
+
+    model = TrackingModel(latency="0.1")
+    with running_mock_server(model) as url:
+        analyze_batch(str(images), str(tmp_path / "analysis.jsonl"), base_url=f"{url}/v1", max_concurrency=3)
+
+    assert len(model.intervals) == 12
+    assert 2 <= model.max_overlap() <= 3
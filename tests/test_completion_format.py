@@ -0,0 +1,76 @@
+import pytest
+
+from src.utils.completion_format import (CompletionParser, check_format, extract_sprites,
+                                         format_completion, parse_completion)
+
+COMPACT = format_completion({
+    None: [{'name': 'stage_backdrop'}],
+    'Cat': [{'name': 'event_whenflagclicked', 'type': 'hat', 'x': 10, 'y': 20},
+            {'name': 'motion_movesteps', 'type': 'stack'},
+            {'name': 'motion_movesteps', 'type': 'stack'}],
+    'Dog': [{'name': 'looks_say'}],
+})
+
+LEGACY = ' blocks:\nsprite: Cat\nsprite: Dog'
+
+def legacy_format_check(response):
+    """The checks semantic_evaluation computed before the compact format."""
+    return {
+        'space_prefix': response.startswith(' blocks:'),
+        'blocks_header': ' blocks:' in response,
+        'sprite_format': all(line.startswith('sprite: ')
+                             for line in response.split('\n')[1:] if line.strip()),
+        'newline_after_header': 'blocks:\n' in response,
+    }
+
+def test_compact_format_round_trips():
+    parser = parse_completion(COMPACT)
+    assert parser.valid
+    assert parser.sprites == ['Cat', 'Dog']
+    assert [block['name'] for block in parser.blocks['Cat']] == [
+        'event_whenflagclicked', 'motion_movesteps', 'motion_movesteps']
+    assert parser.blocks['Cat'][0] == {'name': 'event_whenflagclicked', 'type': 'hat', 'x': 10, 'y': 20}
+    assert parser.blocks[None] == [{'name': 'stage_backdrop'}]
+    assert all(check_format(COMPACT).values())
+
+def test_untyped_block_does_not_inherit_the_previous_type():
+    blocks = [{'name': 'event_whenflagclicked', 'type': 'hat'},
+              {'name': 'motion_movesteps'},
+              {'name': 'looks_say', 'type': 'stack'},
+              {'name': 'looks_say'}]
+    text = format_completion({'Cat': blocks})
+    assert parse_completion(text).blocks['Cat'] == blocks
+    assert all(check_format(text).values())
+
+@pytest.mark.parametrize('text, sprites', [
+    (LEGACY, ['Cat', 'Dog']),
+    (' blocks:\n- sprite: Cat\n- sprite: Dog', ['Cat', 'Dog']),
+    ('The project has sprite: Cat and more', ['Cat and more']),
+    (' blocks:\nSprite: Cat', ['Cat']),
+    ('no sprites here', []),
+])
+def test_extract_sprites_keeps_legacy_forms(text, sprites):
+    assert extract_sprites(text) == sprites
+
+@pytest.mark.parametrize('text', [
+    LEGACY,
+    LEGACY + '\n',
+    'blocks:\nsprite: Cat',
+    ' blocks: 12\nsprites: 2',
+    'Here you go:\n blocks:\nsprite: Cat',
+    ' blocks:\n- sprite: Cat\n',
+    ' blocks:\nsprite: Cat\nsome prose',
+    '',
+])
+def test_format_check_matches_legacy_checks(text):
+    assert check_format(text) == legacy_format_check(text)
+
+def test_streamed_format_check_matches_whole_text():
+    parser = CompletionParser()
+    for i in range(0, len(COMPACT), 3):
+        parser.feed(COMPACT[i:i + 3])
+    assert parser.close().format_check() == check_format(COMPACT)
+
+def test_streaming_parser_flags_invalid_output_early():
+    parser = CompletionParser().feed(' blocks:\nThe project')
+    assert parser.error is not None
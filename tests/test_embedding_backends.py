@@ -0,0 +1,54 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from src.evaluation import embedding_backends
+
+class FakeTorchEmbedder:
+    name = "torch"
+
+    def encode(self, texts):
+        return np.ones((len(texts), 2), dtype=np.float32) / np.sqrt(2)
+
+@pytest.fixture(autouse=True)
+def exported_model(monkeypatch, tmp_path):
+    (tmp_path / "model.onnx").write_bytes(b"")
+    monkeypatch.setattr(embedding_backends, "ONNX_DIR", str(tmp_path))
+    monkeypatch.setattr(embedding_backends, "_embedders", {})
+    monkeypatch.setattr(embedding_backends, "TorchEmbedder", FakeTorchEmbedder)
+    monkeypatch.delenv("EMBEDDING_BACKEND", raising=False)
+    return tmp_path
+
+def without_onnxruntime(monkeypatch):
+    # A None entry makes `import onnxruntime` raise ImportError
+    monkeypatch.setitem(sys.modules, "onnxruntime", None)
+
+def test_auto_falls_back_to_torch_without_onnxruntime(monkeypatch):
+    without_onnxruntime(monkeypatch)
+    assert not embedding_backends.onnx_available()
+    assert embedding_backends.resolve_backend("auto") == "torch"
+    assert embedding_backends.semantic_similarity("a", "b") == pytest.approx(1.0)
+    assert embedding_backends.embedding_info() == {"embedding_backend": "torch",
+                                                   "embedding_model": embedding_backends.MODEL_NAME}
+
+def test_auto_prefers_an_exported_model(monkeypatch, exported_model):
+    for name in ("onnxruntime", "tokenizers"):
+        monkeypatch.setitem(sys.modules, name, types.ModuleType(name))
+    assert embedding_backends.resolve_backend("auto") == "onnx"
+    assert embedding_backends.embedding_info() == {"embedding_backend": "onnx",
+                                                   "embedding_model": embedding_backends.MODEL_NAME,
+                                                   "embedding_model_dir": str(exported_model)}
+
+def test_auto_without_an_export_uses_torch(monkeypatch, exported_model):
+    (exported_model / "model.onnx").unlink()
+    monkeypatch.setenv("EMBEDDING_BACKEND", "auto")
+    assert embedding_backends.embedding_info()["embedding_backend"] == "torch"
+
+def test_forcing_onnx_without_onnxruntime_names_the_requirements(monkeypatch):
+    without_onnxruntime(monkeypatch)
+    monkeypatch.setenv("EMBEDDING_BACKEND", "onnx")
+    with pytest.raises(ImportError, match="requirements-onnx.txt"):
+        embedding_backends.get_embedder()
+    assert embedding_backends.embedding_info()["embedding_backend"] == "onnx"
@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+
+from src.evaluation.evaluation_matrix import build_cells, run_matrix, summarize_rows
+
+def config_for(*datasets):
+    return {"models": [{"name": "m", "provider": "openai"}], "prompts": ["scratch_describe"],
+            "datasets": list(datasets)}
+
+def test_empty_rows_give_an_empty_summary():
+    summary = summarize_rows(pd.DataFrame())
+    assert summary.empty
+    assert {"model", "dataset", "examples", "semantic_similarity_avg"} <= set(summary.columns)
+
+def test_empty_dataset_runs_to_an_empty_summary(tmp_path):
+    path = tmp_path / "empty.jsonl"
+    path.write_text("")
+    assert run_matrix(config_for({"path": str(path)})).empty
+
+def test_datasets_with_the_same_file_name_stay_separate(tmp_path):
+    for split in ("a", "b"):
+        (tmp_path / split).mkdir()
+    cells = build_cells(config_for({"path": str(tmp_path / "a" / "test.jsonl")},
+                                   {"path": str(tmp_path / "b" / "test.jsonl")},
+                                   {"path": str(tmp_path / "other.jsonl")},
+                                   {"path": str(tmp_path / "a" / "test.jsonl"), "name": "named"}))
+    assert [cell["dataset"] for cell in cells] == [
+        str(tmp_path / "a" / "test.jsonl"), str(tmp_path / "b" / "test.jsonl"), "other.jsonl", "named"]
+
+def test_clashing_dataset_names_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="distinct 'name'"):
+        build_cells(config_for({"path": str(tmp_path / "a.jsonl"), "name": "eval"},
+                               {"path": str(tmp_path / "b.jsonl"), "name": "eval"}))
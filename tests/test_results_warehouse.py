@@ -0,0 +1,140 @@
+import csv
+import json
+
+import pytest
+
+from src.evaluation.results_warehouse import ResultsWarehouse
+
+def write_json(path, data):
+    path.write_text(json.dumps(data))
+    return path
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+def write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    return path
+
+FORMATS = {
+    "semantic_evaluation": lambda d: write_json(d / "semantic_evaluation_results_2024-01-01T00:00:00.json", {
+        "timestamp": "2024-01-01T00:00:00",
+        "results": [{"model": "gpt-4o", "model_id": "ft:gpt-4o",
+                     "aggregates": {"semantic_similarity_avg": 0.8, "format_accuracy": 1.0},
+                     "results": [{"prompt": "p1", "expected": "e1", "response": "r1",
+                                  "metrics": {"semantic_similarity": 0.8}}]}]}),
+    "model_evaluation": lambda d: write_json(d / "model_evaluation_results.json", {
+        "baseline": {"accuracy": 0.5},
+        "model_results": {"tuned": {"accuracy": 0.7}}}),
+    "adaptive_evaluation": lambda d: write_json(d / "adaptive.json", {
+        "models": {"a": {"semantic_similarity": [0.6, 0.5, 0.7], "format_ok": [0.9, 0.8, 1.0]}},
+        "differences": {}, "stopped_because": "examples exhausted"}),
+    "model_results": lambda d: write_json(d / "run_model_evaluation.json", {
+        "metrics": {"model_name": "ft:mini", "avg_similarity": 0.85, "avg_semantic_similarity": 0.9,
+                    "avg_lexical_similarity": 0.1, "exact_match_accuracy": 0.5},
+        "detailed_results": [{"prompt": "p2", "target": "t2", "prediction": "x2", "similarity": 0.85,
+                              "semantic_similarity": 0.9, "lexical_similarity": None, "exact_match": False}]}),
+    "format_analysis": lambda d: write_json(d / "format_analysis_fmt.json", {
+        "model": "fmt", "timestamp": "2024-01-02T00:00:00",
+        "responses": [{"prompt": "p3", "response": "r3", "format_check": {"space_prefix": True}}]}),
+    "model_list": lambda d: write_json(d / "o_series_evaluation.json", [{"model": "o1", "format_accuracy": 0.4}]),
+    "comparison_csv": lambda d: write_csv(d / "model_comparison.csv", [
+        {"model_name": "ft:mini", "avg_semantic_similarity": 0.9, "exact_match_accuracy": 0.5}]),
+    "matrix_details": lambda d: write_jsonl(d / "matrix_details.jsonl", [
+        {"model": "m", "provider": "openai", "prompt": "scratch_describe", "dataset": "d.jsonl",
+         "item_prompt": "p4", "response": "r4", "error": None, "semantic_similarity": 0.5}]),
+}
+
+@pytest.fixture
+def warehouse(tmp_path):
+    with ResultsWarehouse(str(tmp_path / "warehouse.sqlite")) as warehouse:
+        yield warehouse
+
+def ingest(warehouse, directory, kind):
+    run_id = warehouse.ingest_file(str(FORMATS[kind](directory)))
+    assert warehouse.connection.execute("SELECT kind FROM runs WHERE run_id = ?", (run_id,)).fetchone() == (kind,)
+    metrics = warehouse.connection.execute(
+        "SELECT model, provider, prompt_task, dataset, metric, value FROM model_metrics WHERE run_id = ?",
+        (run_id,)).fetchall()
+    responses = warehouse.connection.execute(
+        """SELECT s.model, s.prompt_task, s.prompt, s.expected, s.response, v.metric, v.value
+           FROM responses s LEFT JOIN response_metrics v USING (response_id) WHERE s.run_id = ?""",
+        (run_id,)).fetchall()
+    return set(metrics), set(responses)
+
+def test_semantic_evaluation(warehouse, tmp_path):
+    metrics, responses = ingest(warehouse, tmp_path, "semantic_evaluation")
+    assert metrics == {("ft:gpt-4o", None, None, None, "semantic_similarity_avg", 0.8),
+                       ("ft:gpt-4o", None, None, None, "format_accuracy", 1.0)}
+    assert responses == {("ft:gpt-4o", None, "p1", "e1", "r1", "semantic_similarity", 0.8)}
+
+def test_model_evaluation_results(warehouse, tmp_path):
+    metrics, responses = ingest(warehouse, tmp_path, "model_evaluation")
+    assert metrics == {("baseline", None, None, None, "accuracy", 0.5), ("tuned", None, None, None, "accuracy", 0.7)}
+    assert responses == set()
+
+def test_adaptive_summary_uses_the_matrix_names(warehouse, tmp_path):
+    metrics, _ = ingest(warehouse, tmp_path, "adaptive_evaluation")
+    assert {(metric, value) for *_, metric, value in metrics} == {
+        ("semantic_similarity_avg", 0.6), ("semantic_similarity_avg_ci_low", 0.5),
+        ("semantic_similarity_avg_ci_high", 0.7), ("format_accuracy", 0.9), ("format_accuracy_ci_low", 0.8),
+        ("format_accuracy_ci_high", 1.0)}
+
+def test_run_model_evaluation_aliases_the_tiered_means(warehouse, tmp_path):
+    metrics, responses = ingest(warehouse, tmp_path, "model_results")
+    assert metrics == {("ft:mini", None, None, None, "similarity", 0.85),
+                       ("ft:mini", None, None, None, "semantic_similarity", 0.9),
+                       ("ft:mini", None, None, None, "lexical_similarity", 0.1),
+                       ("ft:mini", None, None, None, "exact_match_accuracy", 0.5)}
+    assert responses == {("ft:mini", None, "p2", "t2", "x2", metric, value) for metric, value in
+                         [("similarity", 0.85), ("semantic_similarity", 0.9), ("exact_match", 0.0)]}
+
+def test_format_analysis(warehouse, tmp_path):
+    metrics, responses = ingest(warehouse, tmp_path, "format_analysis")
+    assert metrics == set()
+    assert responses == {("fmt", None, "p3", None, "r3", "format_check.space_prefix", 1.0)}
+
+def test_model_list(warehouse, tmp_path):
+    metrics, responses = ingest(warehouse, tmp_path, "model_list")
+    assert metrics == {("o1", None, None, None, "format_accuracy", 0.4)}
+    assert responses == set()
+
+def test_comparison_csv_names_the_model_by_model_name(warehouse, tmp_path):
+    metrics, responses = ingest(warehouse, tmp_path, "comparison_csv")
+    assert metrics == {("ft:mini", None, None, None, "semantic_similarity", 0.9),
+                       ("ft:mini", None, None, None, "exact_match_accuracy", 0.5)}
+    assert responses == set()
+
+def test_matrix_details(warehouse, tmp_path):
+    metrics, responses = ingest(warehouse, tmp_path, "matrix_details")
+    assert metrics == set()
+    assert responses == {("m", "scratch_describe", "p4", None, "r4", "semantic_similarity", 0.5)}
+
+def test_different_computations_keep_different_names(warehouse, tmp_path):
+    for kind in FORMATS:
+        ingest(warehouse, tmp_path, kind)
+    names = {row[0] for row in warehouse.connection.execute("SELECT DISTINCT metric FROM model_metrics")}
+    assert {"semantic_similarity", "semantic_similarity_avg"} <= names
+    assert not names & {"avg_similarity", "avg_semantic_similarity", "avg_lexical_similarity"}
+    assert set(warehouse.compare("semantic_similarity").index.get_level_values("model")) == {"ft:mini"}
+    assert set(warehouse.compare("semantic_similarity_avg").index.get_level_values("model")) == {"ft:gpt-4o", "a"}
+
+def test_prompt_regressions_compare_runs_of_one_kind(warehouse, tmp_path):
+    def details(day, score):
+        (tmp_path / day).mkdir()
+        return write_jsonl(tmp_path / day / f"details_2024-01-{day}T00:00:00.jsonl", [
+            {"model": "m", "prompt": "scratch_describe", "item_prompt": "p", "response": "r",
+             "semantic_similarity": score}])
+    warehouse.ingest_file(str(details("01", 0.9)))
+    # Another evaluator scores the same prompt on its own scale in between
+    warehouse.ingest_file(str(write_json(tmp_path / "evaluation_results_m.json", {
+        "timestamp": "2024-01-02T00:00:00", "metrics": {"model_name": "m"},
+        "results": [{"prompt": "p", "generated": "r", "semantic_similarity": 0.1}]})))
+    warehouse.ingest_file(str(details("03", 0.4)))
+
+    regressions = warehouse.prompt_regressions("semantic_similarity", "m")
+    assert regressions[["prompt", "previous", "value"]].values.tolist() == [["p", 0.9, 0.4]]
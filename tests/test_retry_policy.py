@@ -0,0 +1,82 @@
+import pytest
+
+openai = pytest.importorskip("openai")
+
+from src.evaluation.mock_server import MockModel, running_mock_server
+from src.utils.call_metrics import CallMetrics, error_status
+from src.utils.retry_policy import RetryBudget, RetryPolicy, is_retryable, retry_after
+
+def client_for(url):
+    return openai.OpenAI(base_url=f"{url}/v1", api_key="local", max_retries=0)
+
+def complete(client):
+    return client.chat.completions.create(model="mock", messages=[{"role": "user", "content": "hi"}])
+
+def failure(model, request=complete):
+    with running_mock_server(model) as url:
+        with pytest.raises(openai.APIError) as info:
+            request(client_for(url))
+    return info.value
+
+def fast_policy(**kwargs):
+    return RetryPolicy(base_delay=0.001, max_delay=0.01, seed=0, **kwargs)
+
+@pytest.fixture
+def call_metrics(tmp_path):
+    return CallMetrics(str(tmp_path / "call_metrics.jsonl"))
+
+def test_rate_limits_and_server_errors_are_retryable():
+    limited = failure(MockModel(rate_limit_rate=1.0, retry_after=2))
+    assert error_status(limited) == 429 and is_retryable(limited)
+    assert retry_after(limited) == pytest.approx(2)
+    server_error = failure(MockModel(error_rate=1.0))
+    assert error_status(server_error) == 500 and is_retryable(server_error)
+
+def test_client_errors_are_not_retryable():
+    # The mock only serves chat completions, so the legacy endpoint answers 404
+    not_found = failure(MockModel(), request=lambda client: client.completions.create(model="mock", prompt="hi"))
+    assert error_status(not_found) == 404
+    assert not is_retryable(not_found)
+
+def test_non_idempotent_calls_only_retry_rate_limits():
+    assert is_retryable(failure(MockModel(rate_limit_rate=1.0)), idempotent=False)
+    assert not is_retryable(failure(MockModel(error_rate=1.0)), idempotent=False)
+
+def test_retry_after_outweighs_the_jittered_backoff(call_metrics):
+    model = MockModel(rate_limit_rate=1.0, retry_after=0.3)
+    with running_mock_server(model) as url:
+        with call_metrics.call("openai", "mock") as record:
+            with pytest.raises(openai.RateLimitError):
+                fast_policy(max_attempts=3).call(complete, client_for(url))
+    assert model.stats["requests"] == 3
+    assert record.retries == 2
+    # Backoff alone would wait at most 2 * 0.01s; the hint adds up to 10% jitter
+    assert 0.6 <= record.backoff_sleep <= 0.66 + 1e-9
+
+def test_retries_stop_when_the_budget_is_spent(call_metrics):
+    model = MockModel(error_rate=1.0)
+    budget = RetryBudget(ratio=0.0, min_retries=2)
+    policy = fast_policy(max_attempts=10, budget=budget)
+    with running_mock_server(model) as url:
+        client = client_for(url)
+        with call_metrics.call("openai", "mock") as record:
+            with pytest.raises(openai.InternalServerError):
+                policy.call(complete, client)
+        assert record.extra.get("retry_budget_exhausted")
+        with pytest.raises(openai.InternalServerError):
+            policy.call(complete, client)
+    assert budget.summary() == {"calls": 2, "retries": 2, "denied": 2}
+    assert model.stats["requests"] == 4
+
+def test_intermittent_faults_are_retried_to_success(call_metrics):
+    model = MockModel(error_rate=0.3, rate_limit_rate=0.3, retry_after=0.01, seed=1)
+    policy = fast_policy(max_attempts=20)
+    retries = 0
+    with running_mock_server(model) as url:
+        client = client_for(url)
+        for _ in range(10):
+            with call_metrics.call("openai", "mock") as record:
+                assert policy.call(complete, client).choices[0].message.content
+            retries += record.retries
+    assert model.stats["requests"] == 10 + retries
+    assert model.stats["errors"] + model.stats["rate_limited"] == retries > 0
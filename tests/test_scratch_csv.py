@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from src.utils import scratch_csv
+from src.utils.scratch_csv import iter_scratch_csv, read_scratch_csv
+
+pytestmark = pytest.mark.skipif(scratch_csv.pa_csv is None, reason="pyarrow is not installed")
+
+def write_ragged_csv(path, projects=40):
+    lines = []
+    for pid in range(projects):
+        for block in range(5):
+            fields = [str(pid), f'b{block}', f'b{block - 1}' if block else '', 'block', 'Sprite1',
+                      'motion_movesteps', f'b{block + 1}', '', f'"[10, ""steps""]"']
+            if block == 4 and pid % 3 == 0:
+                fields = fields[:6]  # short row, padded by both engines
+            if block == 2 and pid % 7 == 0:
+                fields.append('extra')  # long row, skipped by both engines
+            if block == 1 and pid % 5 == 0:
+                fields[7] = '"a comment\nover two lines"'
+            lines.append(','.join(fields))
+    path.write_text('\n'.join(lines) + '\n')
+    return path
+
+def test_engines_agree_on_ragged_file(tmp_path):
+    path = write_ragged_csv(tmp_path / 'allBlocks.csv')
+    arrow, arrow_stats = read_scratch_csv(path, 'allBlocks_linked', engine='pyarrow', report=False)
+    python, python_stats = read_scratch_csv(path, 'allBlocks_linked', engine='python', report=False)
+    pd.testing.assert_frame_equal(arrow, python)
+    assert arrow_stats['short_rows_padded'] == python_stats['short_rows_padded'] == 14
+    assert arrow_stats['long_rows_skipped'] == python_stats['long_rows_skipped'] == 6
+    assert arrow_stats['rows'] == python_stats['rows'] == len(arrow)
+
+def test_chunks_keep_file_order_across_blocks(tmp_path):
+    path = write_ragged_csv(tmp_path / 'allBlocks.csv')
+    # Small blocks mix blocks pyarrow parses with blocks re-tokenized for short rows
+    arrow = list(iter_scratch_csv(path, 'allBlocks_linked', chunk_size=7, engine='pyarrow', block_size=256))
+    python = list(iter_scratch_csv(path, 'allBlocks_linked', chunk_size=7, engine='python'))
+    assert [len(chunk) for chunk in arrow] == [len(chunk) for chunk in python]
+    assert all(len(chunk) == 7 for chunk in arrow[:-1])
+    for a, b in zip(arrow, python):
+        pd.testing.assert_frame_equal(a, b)
+    project_ids = pd.concat(arrow)['ProjectId'].tolist()
+    assert project_ids == sorted(project_ids, key=int)
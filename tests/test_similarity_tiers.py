@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from src.evaluation import embedding_backends
+from src.evaluation.similarity_tiers import TieredSimilarity, similarity_averages
+
+@pytest.fixture(autouse=True)
+def fixed_embeddings(monkeypatch):
+    monkeypatch.setattr(embedding_backends, "pairwise_similarity",
+                        lambda first, second, backend=None: np.full(len(first), 0.5))
+
+def test_every_pair_counts_in_the_combined_average():
+    pairs = [("sprite: Cat", "sprite: Cat "),
+             ("Sprite: CAT", "sprite:  cat"),
+             ("abcdefgh", "zyxwvuts"),
+             ("the cat sat on the mat today", "the cat sat on the mat today!"),
+             ("the cat sat on a mat", "a dog lay under the mat")]
+    scorer = TieredSimilarity()
+    results = scorer.score_many(pairs)
+    assert [r.tier for r in results] == ["exact", "normalized", "lexical_low", "lexical_high", "embedding"]
+    assert all(r.score is not None for r in results)
+
+    averages = similarity_averages(results)
+    low, high = results[2].lexical, results[3].lexical
+    assert averages["similarity"] == pytest.approx((1.0 + 1.0 + low + high + 0.5) / 5)
+    assert averages["semantic_similarity"] == pytest.approx((1.0 + 1.0 + 0.5) / 3)
+    assert averages["lexical_similarity"] == pytest.approx((low + high) / 2)
+    assert scorer.summary()["pairs"] == 5
+
+def test_no_pairs_have_no_averages():
+    assert similarity_averages([]) == {"similarity": None, "semantic_similarity": None,
+                                       "lexical_similarity": None}